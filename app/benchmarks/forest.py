@@ -0,0 +1,71 @@
+"""Сравнение случайного леса scikit-learn и CompiledForest.
+
+Для пачек из 1, 32 и 1024 документов измеряется время predict_proba
+и проверяется совпадение результатов с исходной моделью.
+Запуск из каталога app:
+
+    python -m benchmarks.forest [--model models/random_forest.pkl]
+        [--vectorizer models/vectorizer.pkl] [--docs каталог с .txt] [--repeat 20]
+"""
+import argparse
+import time
+from pathlib import Path
+
+import joblib
+import numpy as np
+
+from benchmarks.vectorizer import _sample_documents
+from utils.compiled_forest import CompiledForest
+
+MODELS_DIR = Path(__file__).resolve().parent.parent / "models"
+
+BATCH_SIZES = (1, 32, 1024)
+
+
+def _seconds_per_call(predict_proba, X, repeat):
+    predict_proba(X)
+    started = time.perf_counter()
+    for _ in range(repeat):
+        predict_proba(X)
+    return (time.perf_counter() - started) / repeat
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model", default=str(MODELS_DIR / "random_forest.pkl"))
+    parser.add_argument("--vectorizer", default=str(MODELS_DIR / "vectorizer.pkl"))
+    parser.add_argument("--docs", default=None)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    forest = joblib.load(args.model)
+    vectorizer = joblib.load(args.vectorizer)
+    started = time.perf_counter()
+    compiled = CompiledForest.from_sklearn(forest)
+    compile_seconds = time.perf_counter() - started
+    X = vectorizer.transform(_sample_documents(vectorizer, args.docs, max(BATCH_SIZES)))
+
+    expected = forest.predict_proba(X)
+    actual = compiled.predict_proba(X)
+    same_predictions = np.array_equal(forest.classes_[expected.argmax(axis=1)], compiled.predict(X))
+    print(
+        f"Деревьев: {compiled.n_estimators}, массивы узлов: {compiled.nbytes / 2 ** 20:.1f} МБ, "
+        f"компиляция {compile_seconds:.2f} с"
+    )
+    print(
+        f"Предсказания совпадают: {same_predictions}; "
+        f"макс. отличие вероятностей: {np.abs(expected - actual).max():.2e}"
+    )
+    print(f"{'пачка':>6} {'sklearn, мс':>12} {'compiled, мс':>13} {'ускорение':>10}")
+    for size in BATCH_SIZES:
+        batch = X[:size]
+        sklearn_seconds = _seconds_per_call(forest.predict_proba, batch, args.repeat)
+        compiled_seconds = _seconds_per_call(compiled.predict_proba, batch, args.repeat)
+        print(
+            f"{size:>6} {sklearn_seconds * 1000:>12.2f} {compiled_seconds * 1000:>13.2f} "
+            f"{sklearn_seconds / compiled_seconds:>9.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,33 @@
+"""Память текущего процесса по данным /proc (Linux)"""
+import resource
+
+
+def _read_kb(path, fields):
+    total = 0
+    try:
+        with open(path) as f:
+            for line in f:
+                name, _, value = line.partition(":")
+                if name in fields:
+                    total += int(value.split()[0])
+    except OSError:
+        return None
+    return total * 1024
+
+
+def rss_bytes():
+    """Резидентная память процесса (RSS)"""
+    value = _read_kb("/proc/self/status", {"VmRSS"})
+    if value is None:
+        # Не Linux: пиковое значение вместо текущего
+        value = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+    return value
+
+
+def uss_bytes(pid="self"):
+    """Уникальная память процесса (USS): страницы, не разделяемые с другими процессами"""
+    return _read_kb(f"/proc/{pid}/smaps_rollup", {"Private_Clean", "Private_Dirty"})
+
+
+def mb(value):
+    return f"{value / 1024 / 1024:.1f} МБ" if value is not None else "н/д"
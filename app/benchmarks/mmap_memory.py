@@ -0,0 +1,75 @@
+"""Уникальная память (USS) процессов-реплик: обычная загрузка моделей против mmap.
+
+Запускается несколько процессов, каждый загружает все модели и векторизатор
+и выполняет предсказание (чтобы страницы массивов были прочитаны), затем
+замеряется USS каждого процесса. При mmap массивы лежат в общем страничном
+кэше и в USS не попадают. Запуск из каталога app (Linux):
+
+    python -m benchmarks.mmap_memory [--replicas 4]
+"""
+import argparse
+import multiprocessing
+import os
+from pathlib import Path
+
+import joblib
+
+from benchmarks.memory import mb, uss_bytes
+from utils.ml_utils import MMAP_DIR, MODELS, MODELS_DIR, export_mmap_artifacts, load_mmap
+
+
+def _replica(paths, mmap, vectorizer_path, ready, done):
+    import sklearn  # noqa: F401
+
+    load = load_mmap if mmap else joblib.load
+    vectorizer = load(vectorizer_path)
+    matrix = vectorizer.transform(["проверка русского текста приказ постановление письмо"])
+    models = [load(path) for path in paths]
+    for model in models:
+        model.predict(matrix)
+    ready.set()
+    done.wait()
+
+
+def _measure(paths, mmap, vectorizer_path, replicas):
+    context = multiprocessing.get_context("spawn")
+    done = context.Event()
+    workers = []
+    for _ in range(replicas):
+        ready = context.Event()
+        process = context.Process(target=_replica, args=(paths, mmap, vectorizer_path, ready, done))
+        process.start()
+        workers.append((process, ready))
+    for _, ready in workers:
+        ready.wait()
+    usage = [uss_bytes(process.pid) for process, _ in workers]
+    done.set()
+    for process, _ in workers:
+        process.join()
+    return usage
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--replicas", type=int, default=4)
+    args = parser.parse_args()
+
+    originals = list(dict.fromkeys(MODELS.values()))
+    vectorizer = str(MODELS_DIR / "vectorizer.pkl")
+    mapped = export_mmap_artifacts(originals + [vectorizer])
+
+    for name, paths, vectorizer_path, mmap in (
+        ("pickle", originals, vectorizer, False),
+        ("mmap", mapped[:-1], mapped[-1], True),
+    ):
+        usage = _measure(paths, mmap, vectorizer_path, args.replicas)
+        if None in usage:
+            print("USS недоступна: нужен Linux с /proc/<pid>/smaps_rollup")
+            return
+        print(f"{name:>7}: USS на процесс {mb(sum(usage) / len(usage))}, всего {mb(sum(usage))} "
+              f"на {args.replicas} процесса(ов)")
+    print(f"Копии для mmap: {os.path.relpath(MMAP_DIR, Path.cwd())}")
+
+
+if __name__ == "__main__":
+    main()
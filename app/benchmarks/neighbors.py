@@ -0,0 +1,94 @@
+"""Сравнение индекса соседей детектора аномалий с полным перебором.
+
+Опорный набор берется из модели соседей детектора аномалий (--model) или
+строится векторизатором из документов; запросы - документы, не вошедшие
+в опорный набор. Выводятся полнота (доля запросов, для которых индекс нашел
+того же ближайшего соседа, что полный перебор), время на запрос и доля
+запросов, которые детектор перепроверил бы полным перебором.
+Запуск из каталога app:
+
+    python -m benchmarks.neighbors [--model детектор.pkl] [--vectorizer models/vectorizer.pkl]
+        [--docs каталог с .txt] [--n-reference 10000] [--n-queries 1000] [--threshold 0.6]
+"""
+import argparse
+import time
+from pathlib import Path
+
+import joblib
+import numpy as np
+from sklearn.neighbors import NearestNeighbors
+
+from benchmarks.vectorizer import _sample_documents
+from config import Config
+from utils.neighbor_index import NeighborIndex
+
+MODELS_DIR = Path(__file__).resolve().parent.parent / "models"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model", default=None)
+    parser.add_argument("--vectorizer", default=str(MODELS_DIR / "vectorizer.pkl"))
+    parser.add_argument("--docs", default=None)
+    parser.add_argument("--n-reference", type=int, default=10000)
+    parser.add_argument("--n-queries", type=int, default=1000)
+    parser.add_argument("--threshold", type=float, default=0.6)
+    args = parser.parse_args()
+
+    vectorizer = joblib.load(args.vectorizer)
+    if args.model:
+        detector = joblib.load(args.model)
+        reference = detector.knn._fit_X
+        queries = vectorizer.transform(_sample_documents(vectorizer, args.docs, args.n_queries))
+        threshold = detector.threshold
+    else:
+        documents = _sample_documents(vectorizer, args.docs, args.n_reference + args.n_queries)
+        matrix = vectorizer.transform(documents)
+        reference, queries = matrix[:args.n_reference], matrix[args.n_reference:]
+        threshold = args.threshold
+
+    brute = NearestNeighbors(n_neighbors=1, algorithm="brute").fit(reference)
+    started = time.perf_counter()
+    index = NeighborIndex(
+        reference, n_components=Config.ANOMALY_INDEX_COMPONENTS, n_candidates=Config.ANOMALY_INDEX_CANDIDATES
+    )
+    build_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    expected_distances, expected_indices = brute.kneighbors(queries, n_neighbors=1)
+    brute_seconds = time.perf_counter() - started
+    started = time.perf_counter()
+    distances, indices = index.query(queries)
+    index_seconds = time.perf_counter() - started
+
+    # Совпадение по расстоянию учитывает опорные документы-дубликаты
+    found = np.isclose(distances, expected_distances[:, 0], rtol=0, atol=1e-9)
+    single = queries[:min(100, queries.shape[0])]
+    started = time.perf_counter()
+    for row in range(single.shape[0]):
+        brute.kneighbors(single[row], n_neighbors=1)
+    brute_single = (time.perf_counter() - started) / single.shape[0]
+    started = time.perf_counter()
+    for row in range(single.shape[0]):
+        index.query(single[row])
+    index_single = (time.perf_counter() - started) / single.shape[0]
+
+    n = queries.shape[0]
+    print(
+        f"Опорных документов: {reference.shape[0]}, запросов: {n}; "
+        f"индекс ({Config.ANOMALY_INDEX_COMPONENTS} компонент, {Config.ANOMALY_INDEX_CANDIDATES} кандидатов) "
+        f"построен за {build_seconds:.2f} с"
+    )
+    print(f"Полнота по ближайшему соседу: {found.mean() * 100:.1f}% (совпали индексы: {(indices == expected_indices[:, 0]).mean() * 100:.1f}%)")
+    print(
+        f"Перепроверка полным перебором при пороге {threshold}: "
+        f"{(distances > threshold).mean() * 100:.1f}% запросов "
+        f"(аномалий по полному перебору: {(expected_distances[:, 0] > threshold).mean() * 100:.1f}%)"
+    )
+    print(f"{'':>16} {'пачка, мс/запрос':>18} {'по одному, мс':>15}")
+    print(f"{'полный перебор':>16} {brute_seconds / n * 1000:>18.3f} {brute_single * 1000:>15.3f}")
+    print(f"{'индекс':>16} {index_seconds / n * 1000:>18.3f} {index_single * 1000:>15.3f}")
+
+
+if __name__ == "__main__":
+    main()
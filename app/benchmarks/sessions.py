@@ -0,0 +1,71 @@
+"""RSS процесса в зависимости от числа сессий: копия векторизатора на сессию
+(как было с st.session_state) против общего VectorizerHandle.
+
+Сессия имитируется словарем, как st.session_state; каждый вариант
+выполняется в отдельном процессе. Оба варианта читают один и тот же файл
+через joblib.load (без компактной версии и экспортов, которые может
+подставить load_vectorizer), различается только совместное использование. Запуск из каталога app:
+
+    python -m benchmarks.sessions [--vectorizer models/vectorizer.pkl] [--sessions 1 5 10 25 50]
+"""
+import argparse
+import gc
+import multiprocessing
+from pathlib import Path
+
+import joblib
+
+from benchmarks.memory import mb, rss_bytes
+
+MODELS_DIR = Path(__file__).resolve().parent.parent / "models"
+
+
+def _measure(mode, path, counts, queue):
+    import sklearn.feature_extraction.text  # noqa: F401 - библиотеки в базовой линии RSS
+    from utils.auth_utils import VectorizerHandle
+    from utils.model_registry import registry
+
+    baseline = rss_bytes()
+    sessions = []
+    results = []
+    for count in counts:
+        while len(sessions) < count:
+            if mode == "per-session":
+                vectorizer = joblib.load(path)
+            else:
+                # Реестр загружает файл тем же joblib.load один раз на процесс
+                vectorizer = VectorizerHandle(registry.get(path), path)
+            vectorizer.transform(["проверка русского текста"])
+            sessions.append({"vectorizer": vectorizer})
+        gc.collect()
+        results.append((count, rss_bytes() - baseline))
+    queue.put(results)
+
+
+def _run_isolated(mode, path, counts):
+    context = multiprocessing.get_context("spawn")
+    queue = context.Queue()
+    process = context.Process(target=_measure, args=(mode, path, counts, queue))
+    process.start()
+    results = queue.get()
+    process.join()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--vectorizer", default=str(MODELS_DIR / "vectorizer.pkl"))
+    parser.add_argument("--sessions", type=int, nargs="+", default=[1, 5, 10, 25, 50])
+    args = parser.parse_args()
+    counts = sorted(args.sessions)
+
+    per_session = _run_isolated("per-session", args.vectorizer, counts)
+    shared = _run_isolated("shared", args.vectorizer, counts)
+
+    print(f"{'сессий':>8} {'копия на сессию':>18} {'общий векторизатор':>20}")
+    for (count, copy_rss), (_, shared_rss) in zip(per_session, shared):
+        print(f"{count:>8} {mb(copy_rss):>18} {mb(shared_rss):>20}")
+
+
+if __name__ == "__main__":
+    main()
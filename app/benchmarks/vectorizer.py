@@ -0,0 +1,103 @@
+"""Сравнение исходного TfidfVectorizer и CompactTfidfVectorizer.
+
+Каждый вариант загружается в отдельном процессе, чтобы прирост RSS после
+загрузки не смешивался. Проверяется совпадение результатов transform.
+Запуск из каталога app:
+
+    python -m benchmarks.vectorizer [--original models/vectorizer.pkl]
+        [--compact models/vectorizer_compact.pkl] [--docs каталог с .txt] [--n 2000]
+"""
+import argparse
+import multiprocessing
+import os
+import random
+import time
+from pathlib import Path
+
+import joblib
+import numpy as np
+
+from benchmarks.memory import mb, rss_bytes
+from utils.compact_vectorizer import convert
+
+MODELS_DIR = Path(__file__).resolve().parent.parent / "models"
+
+
+def _sample_documents(vectorizer, docs_dir, n):
+    if docs_dir:
+        texts = [p.read_text(encoding="utf-8", errors="ignore") for p in sorted(Path(docs_dir).glob("*.txt"))]
+        return (texts * (n // max(len(texts), 1) + 1))[:n]
+    # Синтетические документы из терминов словаря вперемешку со словами вне его
+    rng = random.Random(0)
+    words = [term for term in vectorizer.get_feature_names_out() if " " not in term]
+    noise = ["слово%d" % i for i in range(500)]
+    return [
+        " ".join(rng.choice(words) if rng.random() < 0.7 else rng.choice(noise) for _ in range(rng.randint(50, 400)))
+        for _ in range(n)
+    ]
+
+
+def _measure(path, documents, queue):
+    import sklearn.feature_extraction.text  # noqa: F401 - библиотеки в базовой линии RSS
+    import utils.compact_vectorizer  # noqa: F401
+
+    before = rss_bytes()
+    started = time.perf_counter()
+    vectorizer = joblib.load(path)
+    load_seconds = time.perf_counter() - started
+    loaded = rss_bytes() - before
+
+    vectorizer.transform(documents[:10])
+    started = time.perf_counter()
+    for start in range(0, len(documents), 256):
+        vectorizer.transform(documents[start:start + 256])
+    elapsed = time.perf_counter() - started
+    queue.put({"load_seconds": load_seconds, "rss": loaded, "docs_per_second": len(documents) / elapsed})
+
+
+def _run_isolated(path, documents):
+    context = multiprocessing.get_context("spawn")
+    queue = context.Queue()
+    process = context.Process(target=_measure, args=(path, documents, queue))
+    process.start()
+    result = queue.get()
+    process.join()
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--original", default=str(MODELS_DIR / "vectorizer.pkl"))
+    parser.add_argument("--compact", default=str(MODELS_DIR / "vectorizer_compact.pkl"))
+    parser.add_argument("--docs", default=None)
+    parser.add_argument("--n", type=int, default=2000)
+    args = parser.parse_args()
+
+    if not os.path.exists(args.compact):
+        convert(args.original, args.compact)
+
+    original = joblib.load(args.original)
+    compact = joblib.load(args.compact)
+    documents = _sample_documents(original, args.docs, args.n)
+
+    expected = original.transform(documents)
+    actual = compact.transform(documents)
+    identical = (
+        np.array_equal(expected.indptr, actual.indptr)
+        and np.array_equal(expected.indices, actual.indices)
+        and np.array_equal(expected.data, actual.data)
+    )
+    max_diff = abs(expected - actual).max() if expected.nnz or actual.nnz else 0.0
+
+    print(f"Документов: {len(documents)}; результат совпадает: {identical} (макс. отличие {max_diff:.3g})")
+    print(f"{'':>12} {'загрузка, с':>12} {'прирост RSS':>14} {'док/с':>10}")
+    for name, path in (("исходный", args.original), ("компактный", args.compact)):
+        result = _run_isolated(path, documents)
+        print(
+            f"{name:>12} {result['load_seconds']:>12.3f} {mb(result['rss']):>14} "
+            f"{result['docs_per_second']:>10.0f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,5 @@
 import os
+import tempfile
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -10,6 +11,60 @@ class Config:
     DB_PASS = os.getenv("DB_PASS")
     DB_NAME = os.getenv("DB_NAME")
     ADMIN_SECRET_KEY = os.getenv("ADMIN_SECRET_KEY")
+    # Роль аналитика (администратора) в таблице users
+    ADMIN_ROLE_ID = int(os.getenv("ADMIN_ROLE_ID", "2"))
+
+    # Пул подключений к БД: размер, ожидание свободного подключения и проверка простаивающих
+    DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+    DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+    DB_POOL_HEALTH_CHECK_SECONDS = float(os.getenv("DB_POOL_HEALTH_CHECK_SECONDS", "30"))
+
+    # Асинхронная запись классификаций и оценок через очередь в памяти
+    DB_WRITE_BEHIND = os.getenv("DB_WRITE_BEHIND", "false").lower() in ("1", "true", "yes")
+    WRITE_BEHIND_QUEUE_SIZE = int(os.getenv("WRITE_BEHIND_QUEUE_SIZE", "1000"))
+    WRITE_BEHIND_BATCH_SIZE = int(os.getenv("WRITE_BEHIND_BATCH_SIZE", "100"))
+    WRITE_BEHIND_FLUSH_SECONDS = float(os.getenv("WRITE_BEHIND_FLUSH_SECONDS", "0.5"))
+    # Повторы пачки при недоступности БД; записи, которые не удалось сохранить, пишутся в журнал
+    WRITE_BEHIND_MAX_RETRIES = int(os.getenv("WRITE_BEHIND_MAX_RETRIES", "5"))
+    WRITE_BEHIND_DEAD_LETTER = os.getenv(
+        "WRITE_BEHIND_DEAD_LETTER", os.path.join(tempfile.gettempdir(), "write_behind_dead_letter.jsonl")
+    )
+
+    # Кэш истории классификаций: как часто подтягивать записи других процессов
+    HISTORY_REFRESH_SECONDS = float(os.getenv("HISTORY_REFRESH_SECONDS", "30"))
+    # Окно повторного чтения: строки, зафиксированные позже строк с большим id, и
+    # число пользователей, чья история держится в кэше
+    HISTORY_LAG_SECONDS = float(os.getenv("HISTORY_LAG_SECONDS", "120"))
+    HISTORY_CACHE_USERS = int(os.getenv("HISTORY_CACHE_USERS", "256"))
+
+    # Загружать модели из models/mmap через mmap (если копии выгружены utils.ml_utils)
+    MODEL_MMAP = os.getenv("MODEL_MMAP", "true").lower() in ("1", "true", "yes")
+
+    # Загружать линейные модели из models/linear (.npz, см. utils.linear_export)
+    LINEAR_EXPORT = os.getenv("LINEAR_EXPORT", "true").lower() in ("1", "true", "yes")
+
+    # Загружать случайный лес из models/compiled (массивы узлов, см. utils.compiled_forest)
+    COMPILED_FOREST = os.getenv("COMPILED_FOREST", "true").lower() in ("1", "true", "yes")
+
+    # Кэш результатов классификации по содержимому файла: размер и время жизни записи
+    RESULT_CACHE_SIZE = int(os.getenv("RESULT_CACHE_SIZE", "512"))
+    RESULT_CACHE_TTL_SECONDS = float(os.getenv("RESULT_CACHE_TTL_SECONDS", "3600"))
+
+    # Индекс соседей детектора аномалий: размерность после SVD (0 - полный перебор)
+    # и число кандидатов, расстояние до которых проверяется точно
+    ANOMALY_INDEX_COMPONENTS = int(os.getenv("ANOMALY_INDEX_COMPONENTS", "128"))
+    ANOMALY_INDEX_CANDIDATES = int(os.getenv("ANOMALY_INDEX_CANDIDATES", "32"))
+
+    # Обработка архивов: сколько документов векторизуется и классифицируется за раз
+    ARCHIVE_BATCH_SIZE = int(os.getenv("ARCHIVE_BATCH_SIZE", "256"))
+    # Число процессов для извлечения текста из файлов архива (0 - без пула)
+    ARCHIVE_WORKERS = int(os.getenv("ARCHIVE_WORKERS", str(os.cpu_count() or 1)))
+    # Фоновые задания по архивам: каталог с файлами, число потоков и срок хранения результата
+    ARCHIVE_JOBS_DIR = os.getenv("ARCHIVE_JOBS_DIR", os.path.join(tempfile.gettempdir(), "classify_jobs"))
+    ARCHIVE_JOB_WORKERS = int(os.getenv("ARCHIVE_JOB_WORKERS", "2"))
+    ARCHIVE_JOB_TTL_HOURS = float(os.getenv("ARCHIVE_JOB_TTL_HOURS", "24"))
+    # Каскад моделей: документы с уверенностью дешевой модели ниже порога уходят к более точной
+    CASCADE_THRESHOLD = float(os.getenv("CASCADE_THRESHOLD", "0.8"))
     
     @classmethod
     def validate_config(cls):
@@ -3,39 +3,171 @@ import pandas as pd
 from config import Config
 import streamlit as st
 from typing import Optional
+from .pool import get_pool
+from .history_cache import history_cache
+
+# Постоянные запросы точечных выборок: текст запроса собирается один раз.
+# pymysql не поддерживает серверные prepared statements, параметры
+# экранируются на стороне клиента.
+_USER_COLUMNS = "id, login, email, password_hash, id_role, created_at"
+_SQL_USER_BY_LOGIN = f"SELECT {_USER_COLUMNS} FROM users WHERE login = %s LIMIT 1"
+_SQL_USER_BY_LOGIN_AND_ROLE = f"SELECT {_USER_COLUMNS} FROM users WHERE login = %s AND id_role = %s LIMIT 1"
+_SQL_USER_EXISTS = "SELECT 1 FROM users WHERE login = %s OR email = %s LIMIT 1"
+_SQL_INSERT_USER = """
+    INSERT INTO users (login, email, password_hash, id_role, created_at)
+    VALUES (%s, %s, %s, %s, NOW())
+"""
+_SQL_LAST_CLASSIFICATION_ID = """
+    SELECT c.id
+    FROM classifications c
+    JOIN documents d ON c.id_document = d.id
+    WHERE d.id_user = %s
+    ORDER BY c.created_at DESC
+    LIMIT 1
+"""
+
+def _ids_condition(column, ids):
+    """WHERE по списку id для агрегатов; None - без условия"""
+    if ids is None:
+        return ""
+    return f"WHERE {column} IN ({', '.join(['%s'] * len(ids))})"
+
 
 class Database:
+    """Доступ к БД. Все экземпляры используют общий пул подключений процесса:
+    каждый запрос берет подключение из пула и сразу возвращает его."""
+
     def __init__(self):
         self.config = Config()
-        self.connection = None
-        self._connect()
-        
-
-    def _connect(self):
+        self._pool = get_pool()
+        # Проверяем доступность БД при старте, как и раньше
         try:
-            self.connection = pymysql.connect(
-                host=self.config.DB_HOST,
-                user=self.config.DB_USER,
-                password=self.config.DB_PASS,
-                database=self.config.DB_NAME,
-                cursorclass=pymysql.cursors.DictCursor,
-                autocommit=True
-            )
+            with self._pool.connection():
+                pass
         except pymysql.Error as e:
             st.error(f"Database connection failed: {e}")
             st.stop()
 
 
-    def _ensure_connection(self):
-        if not self.connection or not self.connection.open:
-            self._connect()
+    def pool_metrics(self):
+        """Метрики пула подключений: занятые, ожидания, время ожидания"""
+        return self._pool.metrics()
+
+
+    # Дневные агрегаты (день x модель x класс) для графиков аналитики, таблица
+    # classification_rollups создается миграцией. Обновляются в тех же
+    # транзакциях, что и записи классификаций и оценок.
+    @staticmethod
+    def _rollup_classifications(cursor, ids=None):
+        """Добавляет в агрегаты классификации с данными id (ids=None - все классификации)"""
+        cursor.execute(f"""
+            INSERT INTO classification_rollups (day, model_used, predicted_class, n, confidence_sum, confidence_n)
+            SELECT DATE(created_at), model_used, predicted_class, COUNT(*), COALESCE(SUM(confidence), 0), COUNT(confidence)
+            FROM classifications
+            {_ids_condition("id", ids)}
+            GROUP BY DATE(created_at), model_used, predicted_class
+            ON DUPLICATE KEY UPDATE
+                n = n + VALUES(n),
+                confidence_sum = confidence_sum + VALUES(confidence_sum),
+                confidence_n = confidence_n + VALUES(confidence_n)
+        """, list(ids or ()))
+
+    @staticmethod
+    def _rollup_ratings(cursor, ids=None):
+        """Добавляет в агрегаты оценки с данными id (ids=None - все оценки).
+
+        Как и в аналитике, учитывается только последняя оценка классификации:
+        новая оценка заменяет предыдущую, поэтому в агрегат идет разница.
+        """
+        cursor.execute(f"""
+            INSERT INTO classification_rollups (day, model_used, predicted_class, rating_sum, rating_n)
+            SELECT DATE(c.created_at), c.model_used, c.predicted_class,
+                   SUM(r.rating - COALESCE(prev.rating, 0)), SUM(prev.id IS NULL)
+            FROM ratings r
+            JOIN classifications c ON r.id_classification = c.id
+            LEFT JOIN ratings prev ON prev.id = (
+                SELECT MAX(r2.id) FROM ratings r2
+                WHERE r2.id_classification = r.id_classification AND r2.id < r.id
+            )
+            {_ids_condition("r.id", ids)}
+            GROUP BY DATE(c.created_at), c.model_used, c.predicted_class
+            ON DUPLICATE KEY UPDATE
+                rating_sum = rating_sum + VALUES(rating_sum),
+                rating_n = rating_n + VALUES(rating_n)
+        """, list(ids or ()))
+
+    @staticmethod
+    def _inserted_ids(cursor, first_id, table, column, values):
+        """id строк, вставленных многострочным INSERT, в порядке values.
+
+        InnoDB выделяет простому многострочному INSERT значения подряд с шагом
+        auto_increment_increment (больше 1 в Galera и схемах с несколькими
+        primary), first_id - lastrowid этого INSERT. Вычисленные id сверяются
+        в той же транзакции: column найденных строк должен совпасть с values.
+        """
+        cursor.execute("SELECT @@SESSION.auto_increment_increment AS step")
+        step = int(cursor.fetchone()["step"])
+        ids = [first_id + i * step for i in range(len(values))]
+        cursor.execute(
+            f"SELECT id, {column} FROM {table} WHERE id IN ({', '.join(['%s'] * len(ids))})",
+            ids
+        )
+        found = {row["id"]: row[column] for row in cursor.fetchall()}
+        if [found.get(row_id) for row_id in ids] != list(values):
+            raise pymysql.err.InternalError(f"Не удалось определить id строк, вставленных в {table}")
+        return ids
+
+
+    @classmethod
+    def _backfill_rollups(cls, cursor):
+        """Заполняет агрегаты по всем классификациям и оценкам"""
+        cls._rollup_classifications(cursor)
+        cls._rollup_ratings(cursor)
+
+
+    @classmethod
+    def _rebuild_rollups_locked(cls, cursor):
+        """Пересчитывает агрегаты под блокировкой таблиц.
+
+        Пока агрегаты очищаются и заполняются заново, другие процессы не могут
+        ни добавить классификацию или оценку, ни изменить агрегаты (в том числе
+        процессы со старым кодом), поэтому ничего не теряется и не учитывается
+        дважды. LOCK TABLES требует перечислить все псевдонимы из запросов агрегатов.
+        """
+        # Транзакция с LOCK TABLES в MySQL: autocommit = 0, COMMIT до UNLOCK TABLES
+        cursor.execute("SET autocommit = 0")
+        try:
+            cursor.execute("""
+                LOCK TABLES classification_rollups WRITE,
+                            classifications READ, classifications AS c READ,
+                            ratings AS r READ, ratings AS prev READ, ratings AS r2 READ
+            """)
+            try:
+                cursor.execute("DELETE FROM classification_rollups")
+                cls._backfill_rollups(cursor)
+                cursor.execute("COMMIT")
+            except Exception:
+                cursor.execute("ROLLBACK")
+                raise
+            finally:
+                cursor.execute("UNLOCK TABLES")
+        finally:
+            cursor.execute("SET autocommit = 1")
+
+
+    def rebuild_rollups(self):
+        """Полностью пересчитывает агрегаты по таблицам classifications и ratings"""
+        with self._pool.connection() as conn, conn.cursor() as cursor:
+            self._rebuild_rollups_locked(cursor)
 
 
     def execute_query(self, query, params=None, return_result=True):
-        """Универсальный метод выполнения запросов"""
-        self._ensure_connection()
+        """Универсальный метод выполнения запросов (SELECT возвращает DataFrame).
+
+        Для выборок аналитики; точечные запросы используют fetch_one/fetch_all.
+        """
         try:
-            with self.connection.cursor() as cursor:
+            with self._pool.connection() as conn, conn.cursor() as cursor:
                 cursor.execute(query, params or ())
                 
                 if return_result and query.strip().upper().startswith('SELECT'):
@@ -48,19 +180,49 @@ class Database:
         except pymysql.Error as e:
             st.error(f"Database error: {e}")
             return None
+
+
+    def fetch_one(self, query, params=None) -> Optional[dict]:
+        """Первая строка результата в виде dict (None, если строк нет или произошла ошибка)"""
+        try:
+            with self._pool.connection() as conn, conn.cursor() as cursor:
+                cursor.execute(query, params or ())
+                return cursor.fetchone()
+        except pymysql.Error as e:
+            st.error(f"Database error: {e}")
+            return None
+
+
+    def fetch_all(self, query, params=None) -> Optional[list]:
+        """Все строки результата списком dict, без построения DataFrame"""
+        try:
+            with self._pool.connection() as conn, conn.cursor() as cursor:
+                cursor.execute(query, params or ())
+                return list(cursor.fetchall())
+        except pymysql.Error as e:
+            st.error(f"Database error: {e}")
+            return None
+
+
+    def execute(self, query, params=None) -> Optional[int]:
+        """INSERT/UPDATE/DELETE; возвращает число затронутых строк"""
+        try:
+            with self._pool.connection() as conn, conn.cursor() as cursor:
+                cursor.execute(query, params or ())
+                return cursor.rowcount
+        except pymysql.Error as e:
+            st.error(f"Database error: {e}")
+            return None
         
 
     # Методы для работы с пользователями
     def get_emploee(self, login):
-        query = "SELECT * FROM users WHERE login = %s"
-        result = self.execute_query(query, (login,))
-        return result.iloc[0].to_dict() if not result.empty else None
+        return self.fetch_one(_SQL_USER_BY_LOGIN, (login,))
     
     
     def get_analyst_user(self, login):
         """Получение только администраторов"""
-        query = "SELECT * FROM users WHERE login = %s AND id_role = %s"
-        return self.execute_query(query, (login, self.config.ADMIN_ROLE_ID))
+        return self.fetch_one(_SQL_USER_BY_LOGIN_AND_ROLE, (login, self.config.ADMIN_ROLE_ID))
     
 
     def create_emploee(self, login, email, password, role_id=1):
@@ -70,44 +232,30 @@ class Database:
             st.error("Пользователь с таким логином уже существует")
             return False
             
-        query = """
-        INSERT INTO users (login, email, password_hash, id_role, created_at)
-        VALUES (%s, %s, %s, %s, NOW())
-        """
-        affected_rows = self.execute_query(
-            query, 
-            (login, email, self._hash_password(password), role_id),
-            return_result=False
+        affected_rows = self.execute(
+            _SQL_INSERT_USER,
+            (login, email, self._hash_password(password), role_id)
         )
         return affected_rows == 1
     
     
     def get_last_classification_id(self, id_user: int) -> Optional[int]:
-        try:
-            with self.connection.cursor() as cursor:
-                cursor.execute("""
-                    SELECT c.id
-                    FROM classifications c
-                    JOIN documents d ON c.id_document = d.id
-                    WHERE d.id_user = %s
-                    ORDER BY c.created_at DESC
-                    LIMIT 1
-                """, (id_user,))
-                row = cursor.fetchone()
-                return row["id"] if row else None
-        except pymysql.Error as e:
-            st.error(f"Ошибка при получении последней классификации: {e}")
-            return None
+        row = self.fetch_one(_SQL_LAST_CLASSIFICATION_ID, (id_user,))
+        return row["id"] if row else None
 
 
     def create_rating(self, classification_id: int, id_user: int, rating: int, comment: str = "") -> bool:
         try:
-            with self.connection.cursor() as cursor:
+            with self._pool.connection() as conn, conn.cursor() as cursor:
+                conn.begin()
                 cursor.execute("""
                     INSERT INTO ratings (id_classification, id_user, rating, comment, created_at)
                     VALUES (%s, %s, %s, %s, NOW())
                 """, (classification_id, id_user, rating, comment))
-                return True
+                self._rollup_ratings(cursor, [cursor.lastrowid])
+                conn.commit()
+            history_cache.invalidate(id_user)
+            return True
         except pymysql.Error as e:
             st.error(f"Ошибка при сохранении рейтинга: {e}")
             return False
@@ -115,20 +263,16 @@ class Database:
     
     def create_analyst_user(self, login, email, password):
         """Создание администратора (без проверки ключа)"""
-        try:
-            with self.connection.cursor() as cursor:
-                cursor.execute(
-                    "INSERT INTO users (login, email, password_hash, id_role, created_at) VALUES (%s, %s, %s, 2, NOW())",
-                    (login, email, self._hash_password(password)))
-                return cursor.rowcount == 1
-        except pymysql.Error as e:
-            st.error(f"Ошибка создания администратора: {e}")
-            return False
+        affected_rows = self.execute(
+            _SQL_INSERT_USER,
+            (login, email, self._hash_password(password), self.config.ADMIN_ROLE_ID)
+        )
+        return affected_rows == 1
         
         
     def create_zip_folder(self, id_user: int, foldername: str, count_files: int) -> Optional[int]:
         try:
-            with self.connection.cursor() as cursor:
+            with self._pool.connection() as conn, conn.cursor() as cursor:
                 cursor.execute(
                     """
                     INSERT INTO folders_zip (id_user, foldername, count_files, uploaded_at)
@@ -142,46 +286,92 @@ class Database:
             return None
         
         
-    # Новый метод для классификации файла из архива
-    def create_archive_classification(self, id_user: int, filename: str, model_name: str, 
-                                   predicted_class: str, confidence: float, id_folder_zip: int) -> Optional[int]:
-        """Создает запись о классификации файла из архива"""
+    def create_archive_classifications(self, id_user: int, id_folder_zip: int, rows) -> Optional[list]:
+        """Пакетно сохраняет классификации файлов архива одной транзакцией.
+
+        rows - список кортежей (filename, model_name, predicted_class, confidence,
+        content_hash, model_version).
+        Документы и классификации вставляются многострочными INSERT, счетчик
+        count_files архива увеличивается в той же транзакции.
+        Возвращает id классификаций в порядке rows.
+        """
+        if not rows:
+            return []
         try:
-            with self.connection.cursor() as cursor:
-                # Создаем запись о документе с привязкой к архиву
+            # При ошибке пул откатывает транзакцию перед возвратом подключения
+            with self._pool.connection() as conn, conn.cursor() as cursor:
+                conn.begin()
                 cursor.execute(
-                    """
-                    INSERT INTO documents (id_user, filename, id_folder_zip, uploaded_at)
-                    VALUES (%s, %s, %s, NOW())
-                    """,
-                    (id_user, filename, id_folder_zip)
+                    "INSERT INTO documents (id_user, filename, id_folder_zip, content_hash, uploaded_at) VALUES "
+                    + ", ".join(["(%s, %s, %s, %s, NOW())"] * len(rows)),
+                    [
+                        value
+                        for filename, _, _, _, content_hash, _ in rows
+                        for value in (id_user, filename, id_folder_zip, content_hash)
+                    ]
                 )
-                doc_id = cursor.lastrowid
+                doc_ids = self._inserted_ids(cursor, cursor.lastrowid, "documents", "filename", [row[0] for row in rows])
 
-                # Создаем запись о классификации
                 cursor.execute(
-                    """INSERT INTO classifications 
-                       (id_document, model_used, predicted_class, confidence, created_at)
-                       VALUES (%s, %s, %s, %s, NOW())""",
-                    (doc_id, model_name, predicted_class, confidence)
+                    "INSERT INTO classifications (id_document, model_used, model_version, predicted_class, confidence, created_at) VALUES "
+                    + ", ".join(["(%s, %s, %s, %s, %s, NOW())"] * len(rows)),
+                    [
+                        value
+                        for doc_id, (_, model_name, predicted_class, confidence, _, model_version) in zip(doc_ids, rows)
+                        for value in (doc_id, model_name, model_version, predicted_class, confidence)
+                    ]
                 )
-                self.connection.commit()
-                return cursor.lastrowid
+                classification_ids = self._inserted_ids(cursor, cursor.lastrowid, "classifications", "id_document", doc_ids)
+                self._rollup_classifications(cursor, classification_ids)
+
+                cursor.execute(
+                    "UPDATE folders_zip SET count_files = count_files + %s WHERE id = %s",
+                    (len(rows), id_folder_zip)
+                )
+                conn.commit()
+            history_cache.invalidate(id_user)
+            return classification_ids
         except pymysql.Error as e:
-            st.error(f"Ошибка при сохранении классификации из архива: {e}")
+            st.error(f"Ошибка при пакетном сохранении классификаций из архива: {e}")
             return None
-        
-    
+
+
+    def find_classifications_by_hash(self, content_hashes, model_name, model_version) -> dict:
+        """Последние классификации документов с данными SHA-256 той же версией модели.
+
+        Возвращает {content_hash: (predicted_class, confidence)}.
+        """
+        content_hashes = list(content_hashes)
+        if not content_hashes or model_version is None:
+            return {}
+        rows = self.fetch_all(
+            f"""
+            SELECT d.content_hash, c.predicted_class, c.confidence
+            FROM documents d
+            JOIN classifications c ON c.id_document = d.id
+            WHERE d.content_hash IN ({', '.join(['%s'] * len(content_hashes))})
+              AND c.model_used = %s AND c.model_version = %s
+            ORDER BY c.id
+            """,
+            content_hashes + [model_name, model_version]
+        )
+        # При нескольких совпадениях остается последняя классификация
+        return {
+            row["content_hash"]: (row["predicted_class"], float(row["confidence"]) if row["confidence"] is not None else None)
+            for row in rows or []
+        }
+
+
     # Новый метод для обновления счетчика файлов в архиве
     def update_zip_file_count(self, folder_zip_id: int, new_count: int) -> bool:
         """Обновляет количество файлов в архиве"""
         try:
-            with self.connection.cursor() as cursor:
+            with self._pool.connection() as conn, conn.cursor() as cursor:
                 cursor.execute(
                     "UPDATE folders_zip SET count_files = %s WHERE id = %s",
                     (new_count, folder_zip_id)
                 )
-                self.connection.commit()
+                conn.commit()
                 return cursor.rowcount > 0
         except pymysql.Error as e:
             st.error(f"Ошибка при обновлении счетчика файлов архива: {e}")
@@ -189,54 +379,261 @@ class Database:
         
 
     # Методы для работы с классификациями
-    def create_classification(self, id_user, filename, model_name, predicted_class, confidence) -> Optional[int]:
+    def create_classification(self, id_user, filename, model_name, predicted_class, confidence,
+                              content_hash=None, model_version=None) -> Optional[int]:
+        """Сохраняет классификацию одного документа.
+
+        content_hash (SHA-256 файла) и model_version позволяют повторно
+        использовать результат, когда тот же файл придет в архиве.
+        """
         try:
-            with self.connection.cursor() as cursor:
+            with self._pool.connection() as conn, conn.cursor() as cursor:
+                conn.begin()
                 cursor.execute(
-                    "INSERT INTO documents (id_user, filename, uploaded_at) VALUES (%s, %s, NOW())",
-                    (id_user, filename)
+                    "INSERT INTO documents (id_user, filename, content_hash, uploaded_at) VALUES (%s, %s, %s, NOW())",
+                    (id_user, filename, content_hash)
                 )
                 doc_id = cursor.lastrowid
 
                 cursor.execute(
                     """INSERT INTO classifications 
-                       (id_document, model_used, predicted_class, confidence, created_at)
-                       VALUES (%s, %s, %s, ROUND(%s, 2), NOW())""",
-                    (doc_id, model_name, predicted_class, confidence)
+                       (id_document, model_used, model_version, predicted_class, confidence, created_at)
+                       VALUES (%s, %s, %s, %s, ROUND(%s, 2), NOW())""",
+                    (doc_id, model_name, model_version, predicted_class, confidence)
                 )
-                return cursor.lastrowid
+                classification_id = cursor.lastrowid
+                self._rollup_classifications(cursor, [classification_id])
+                conn.commit()
+            history_cache.invalidate(id_user)
+            return classification_id
         except pymysql.Error as e:
             st.error(f"Ошибка при сохранении классификации: {e}")
             return None
-        
 
-    def get_emploee_history(self, id_user):
-        """Получение истории классификаций пользователя"""
-        query = """
-        SELECT 
-            d.filename as filename,
-            c.model_used as model_used,
-            c.predicted_class as predicted_class,
-            c.confidence as confidence,
-            c.created_at as created_at,
-			r.rating as rating,
-			r.comment as comment_user
+
+    def insert_classifications(self, rows) -> list:
+        """Пакетная запись одиночных классификаций одной транзакцией (для фоновой записи).
+
+        rows - список кортежей (id_user, filename, model_name, predicted_class, confidence,
+        content_hash, model_version).
+        Возвращает id классификаций в порядке rows. Ошибки pymysql не перехватываются,
+        чтобы вызывающий код мог повторить запись.
+        """
+        if not rows:
+            return []
+        with self._pool.connection() as conn, conn.cursor() as cursor:
+            conn.begin()
+            cursor.execute(
+                "INSERT INTO documents (id_user, filename, content_hash, uploaded_at) VALUES "
+                + ", ".join(["(%s, %s, %s, NOW())"] * len(rows)),
+                [
+                    value
+                    for id_user, filename, _, _, _, content_hash, _ in rows
+                    for value in (id_user, filename, content_hash)
+                ]
+            )
+            doc_ids = self._inserted_ids(cursor, cursor.lastrowid, "documents", "filename", [row[1] for row in rows])
+
+            cursor.execute(
+                "INSERT INTO classifications (id_document, model_used, model_version, predicted_class, confidence, created_at) VALUES "
+                + ", ".join(["(%s, %s, %s, %s, ROUND(%s, 2), NOW())"] * len(rows)),
+                [
+                    value
+                    for doc_id, (_, _, model_name, predicted_class, confidence, _, model_version) in zip(doc_ids, rows)
+                    for value in (doc_id, model_name, model_version, predicted_class, confidence)
+                ]
+            )
+            classification_ids = self._inserted_ids(cursor, cursor.lastrowid, "classifications", "id_document", doc_ids)
+            self._rollup_classifications(cursor, classification_ids)
+            conn.commit()
+        for id_user in {row[0] for row in rows}:
+            history_cache.invalidate(id_user)
+        return classification_ids
+
+
+    def insert_ratings(self, rows) -> int:
+        """Пакетная запись оценок (id_classification, id_user, rating, comment) одним INSERT.
+
+        Ошибки pymysql не перехватываются, чтобы вызывающий код мог повторить запись.
+        """
+        if not rows:
+            return 0
+        with self._pool.connection() as conn, conn.cursor() as cursor:
+            conn.begin()
+            cursor.execute(
+                "INSERT INTO ratings (id_classification, id_user, rating, comment, created_at) VALUES "
+                + ", ".join(["(%s, %s, %s, %s, NOW())"] * len(rows)),
+                [value for row in rows for value in row]
+            )
+            inserted = cursor.rowcount
+            rating_ids = self._inserted_ids(cursor, cursor.lastrowid, "ratings", "id_classification", [row[0] for row in rows])
+            self._rollup_ratings(cursor, rating_ids)
+            conn.commit()
+        for id_user in {row[1] for row in rows}:
+            history_cache.invalidate(id_user)
+        return inserted
+
+
+    _HISTORY_COLUMNS = [
+        "id", "login", "filename", "model_used", "predicted_class",
+        "confidence", "created_at", "rating", "comment", "rated_at"
+    ]
+
+    def _history_query(self, query, params):
+        """Строки истории в виде DataFrame с постоянным набором колонок (None при ошибке)"""
+        try:
+            with self._pool.connection() as conn, conn.cursor() as cursor:
+                cursor.execute(query, params)
+                rows = cursor.fetchall()
+        except pymysql.Error as e:
+            st.error(f"Database error: {e}")
+            return None
+        frame = pd.DataFrame(list(rows), columns=self._HISTORY_COLUMNS)
+        frame["created_at"] = pd.to_datetime(frame["created_at"])
+        frame["rated_at"] = pd.to_datetime(frame["rated_at"])
+        return frame
+
+
+    def get_history_rows(self, id_user=None, after_id=0, created_since=None):
+        """Классификации с id больше after_id или созданные начиная с created_since,
+        с их последними оценками (id_user=None - все пользователи)"""
+        user_condition = "AND d.id_user = %s" if id_user is not None else ""
+        created_condition = "OR c.created_at >= %s" if created_since is not None else ""
+        query = f"""
+        SELECT
+            c.id, u.login, d.filename, c.model_used, c.predicted_class,
+            c.confidence, c.created_at, r.rating, r.comment, r.created_at AS rated_at
         FROM classifications c
         JOIN documents d ON c.id_document = d.id
-		LEFT JOIN ratings r ON c.id = r.id_classification
-        WHERE d.id_user = %s
-        ORDER BY c.created_at DESC
+        JOIN users u ON d.id_user = u.id
+        {self._LAST_RATING_JOIN}
+        WHERE (c.id > %s {created_condition}) {user_condition}
+        """
+        params = [after_id]
+        if created_since is not None:
+            params.append(created_since)
+        if id_user is not None:
+            params.append(id_user)
+        return self._history_query(query, params)
+
+
+    def get_history_rating_changes(self, id_user=None, since=None):
+        """Последние оценки классификаций, оцененных начиная с since"""
+        user_condition = "AND d.id_user = %s" if id_user is not None else ""
+        query = f"""
+        SELECT DISTINCT
+            c.id, NULL AS login, NULL AS filename, NULL AS model_used, NULL AS predicted_class,
+            NULL AS confidence, c.created_at, r.rating, r.comment, r.created_at AS rated_at
+        FROM ratings changed
+        JOIN classifications c ON changed.id_classification = c.id
+        JOIN documents d ON c.id_document = d.id
+        {self._LAST_RATING_JOIN}
+        WHERE changed.created_at >= %s {user_condition}
+        """
+        params = (since, id_user) if id_user is not None else (since,)
+        return self._history_query(query, params)
+
+
+    def get_emploee_history(self, id_user):
+        """Получение истории классификаций пользователя (через кэш истории процесса).
+
+        Для каждой классификации берется последняя оценка.
+        """
+        df = history_cache.get(self, id_user)
+        df = df.rename(columns={"comment": "comment_user"})
+        return df[["filename", "model_used", "predicted_class", "confidence", "created_at", "rating", "comment_user"]]
+
+
+    # Аналитика: фильтрация, агрегаты и постраничный вывод на стороне MySQL
+    # Последняя оценка классификации (в интерфейсе оценка ставится один раз)
+    _LAST_RATING_JOIN = """
+        LEFT JOIN ratings r ON r.id = (
+            SELECT MAX(r2.id) FROM ratings r2 WHERE r2.id_classification = c.id
+        )
+    """
+
+    @staticmethod
+    def _classification_filters(filters):
+        """WHERE-условие и параметры по фильтрам аналитики.
+
+        filters: date_from, date_to (даты, включительно), search (часть имени файла),
+        classes (значения predicted_class), models, rating_range ((min, max) или None),
+        rated_only.
         """
-        return self.execute_query(query, (id_user,))
+        conditions, params = [], []
+        if filters.get("date_from"):
+            conditions.append("c.created_at >= %s")
+            params.append(filters["date_from"])
+        if filters.get("date_to"):
+            conditions.append("c.created_at < %s + INTERVAL 1 DAY")
+            params.append(filters["date_to"])
+        if filters.get("search"):
+            escaped = filters["search"].replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+            conditions.append("d.filename LIKE %s")
+            params.append(f"%{escaped}%")
+        for column, key in (("c.predicted_class", "classes"), ("c.model_used", "models")):
+            values = filters.get(key)
+            if values is not None:
+                if not values:
+                    conditions.append("FALSE")
+                else:
+                    conditions.append(f"{column} IN ({', '.join(['%s'] * len(values))})")
+                    params.extend(values)
+        if filters.get("rating_range"):
+            low, high = filters["rating_range"]
+            if filters.get("rated_only"):
+                conditions.append("r.rating BETWEEN %s AND %s")
+            else:
+                conditions.append("(r.rating IS NULL OR r.rating BETWEEN %s AND %s)")
+            params.extend([low, high])
+        where = "WHERE " + " AND ".join(conditions) if conditions else ""
+        return where, params
+
 
+    def get_classification_filter_options(self):
+        """Границы дат, модели, классы и наличие оценок для фильтров аналитики.
 
-    def get_all_classifications(self):
-        """Получение всех классификаций (для админа)"""
+        Значения берутся из дневных агрегатов: в них есть каждая пара модели и
+        класса, а таблица на порядки меньше classifications.
+        """
         query = """
-        SELECT 
-            u.login, 
-            d.filename, 
-            c.model_used, 
+        SELECT
+            MIN(day) AS min_date,
+            MAX(day) AS max_date,
+            EXISTS(SELECT 1 FROM ratings) AS has_ratings
+        FROM classification_rollups
+        """
+        bounds = self.fetch_one(query)
+        if bounds is None or bounds["min_date"] is None:
+            return None
+        models = self.fetch_all("SELECT DISTINCT model_used FROM classification_rollups") or []
+        classes = self.fetch_all("SELECT DISTINCT predicted_class FROM classification_rollups") or []
+        return {
+            "min_date": pd.to_datetime(bounds["min_date"]).date(),
+            "max_date": pd.to_datetime(bounds["max_date"]).date(),
+            "has_ratings": bool(bounds["has_ratings"]),
+            "models": [row["model_used"] for row in models],
+            "classes": [row["predicted_class"] for row in classes],
+        }
+
+
+    def get_classifications_page(self, filters, limit=50, after=None):
+        """Страница классификаций по фильтрам, новые сверху.
+
+        Keyset-пагинация: after - (created_at, id) последней строки предыдущей
+        страницы, поэтому стоимость запроса не зависит от номера страницы.
+        """
+        where, params = self._classification_filters(filters)
+        if after is not None:
+            keyset = "(c.created_at < %s OR (c.created_at = %s AND c.id < %s))"
+            where = f"{where} AND {keyset}" if where else f"WHERE {keyset}"
+            params += [after[0], after[0], after[1]]
+        query = f"""
+        SELECT
+            c.id,
+            u.login,
+            d.filename,
+            c.model_used,
             c.predicted_class,
             c.confidence,
             c.created_at,
@@ -245,19 +642,109 @@ class Database:
         FROM classifications c
         JOIN documents d ON c.id_document = d.id
         JOIN users u ON d.id_user = u.id
-        LEFT JOIN ratings r ON r.id_classification = c.id
-        ORDER BY c.created_at DESC
+        {self._LAST_RATING_JOIN}
+        {where}
+        ORDER BY c.created_at DESC, c.id DESC
+        LIMIT %s
         """
-        return self.execute_query(query)
-    
+        return self.execute_query(query, params + [limit])
+
+
+    def count_classifications(self, filters):
+        """Число записей, пользователей, моделей и средняя оценка по фильтрам"""
+        where, params = self._classification_filters(filters)
+        query = f"""
+        SELECT
+            COUNT(*) AS total,
+            COUNT(DISTINCT d.id_user) AS users,
+            COUNT(DISTINCT c.model_used) AS models,
+            AVG(r.rating) AS avg_rating
+        FROM classifications c
+        JOIN documents d ON c.id_document = d.id
+        {self._LAST_RATING_JOIN}
+        {where}
+        """
+        row = self.fetch_one(query, params)
+        if row is None:
+            return {"total": 0, "users": 0, "models": 0, "avg_rating": None}
+        return {
+            "total": int(row["total"]),
+            "users": int(row["users"]),
+            "models": int(row["models"]),
+            "avg_rating": float(row["avg_rating"]) if row["avg_rating"] is not None else None,
+        }
+
+
+    def get_classification_stats(self, filters):
+        """Агрегаты по дням, моделям и классам для графиков аналитики"""
+        where, params = self._classification_filters(filters)
+        query = f"""
+        SELECT
+            DATE(c.created_at) AS day,
+            c.model_used,
+            c.predicted_class,
+            COUNT(*) AS n,
+            SUM(c.confidence) AS confidence_sum,
+            COUNT(c.confidence) AS confidence_n,
+            SUM(r.rating) AS rating_sum,
+            COUNT(r.rating) AS rating_n
+        FROM classifications c
+        JOIN documents d ON c.id_document = d.id
+        {self._LAST_RATING_JOIN}
+        {where}
+        GROUP BY day, c.model_used, c.predicted_class
+        """
+        return self.execute_query(query, params)
+
+
+    def get_rollup_stats(self, filters):
+        """То же, что get_classification_stats, но из таблицы агрегатов.
+
+        Агрегаты хранят только день, модель и класс, поэтому учитываются
+        фильтры по датам, моделям и классам; поиск по имени файла и фильтр
+        оценок требуют get_classification_stats.
+        """
+        conditions, params = [], []
+        if filters.get("date_from"):
+            conditions.append("day >= %s")
+            params.append(filters["date_from"])
+        if filters.get("date_to"):
+            conditions.append("day <= %s")
+            params.append(filters["date_to"])
+        for column, key in (("predicted_class", "classes"), ("model_used", "models")):
+            values = filters.get(key)
+            if values is not None:
+                if not values:
+                    conditions.append("FALSE")
+                else:
+                    conditions.append(f"{column} IN ({', '.join(['%s'] * len(values))})")
+                    params.extend(values)
+        where = "WHERE " + " AND ".join(conditions) if conditions else ""
+        query = f"""
+        SELECT day, model_used, predicted_class, n, confidence_sum, confidence_n, rating_sum, rating_n
+        FROM classification_rollups
+        {where}
+        """
+        return self.execute_query(query, params)
+
+
+    def get_rating_histogram(self, filters):
+        """Количество оценок каждого значения по фильтрам"""
+        where, params = self._classification_filters(filters)
+        where = f"{where} AND r.rating IS NOT NULL" if where else "WHERE r.rating IS NOT NULL"
+        query = f"""
+        SELECT r.rating, COUNT(*) AS n
+        FROM classifications c
+        JOIN documents d ON c.id_document = d.id
+        {self._LAST_RATING_JOIN}
+        {where}
+        GROUP BY r.rating
+        """
+        return self.execute_query(query, params)
+
 
     def emploee_exists(self, login, email):
-        with self.connection.cursor() as cursor:
-            cursor.execute(
-                "SELECT 1 FROM users WHERE login = %s OR email = %s LIMIT 1",
-                (login, email)
-            )
-            return cursor.fetchone() is not None
+        return self.fetch_one(_SQL_USER_EXISTS, (login, email)) is not None
 
 
     def _hash_password(self, password: str) -> str:
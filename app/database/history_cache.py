@@ -0,0 +1,116 @@
+import threading
+import time
+from collections import OrderedDict
+
+import pandas as pd
+
+from config import Config
+
+
+class _HistoryEntry:
+    """Закэшированная история одного пользователя (или всех при id_user=None)"""
+
+    def __init__(self):
+        self.frame = None
+        self.max_id = 0              # водяной знак по c.id
+        self.rated_since = None      # водяной знак по времени последней оценки
+        self.refreshed_at = 0.0
+        self.stale = True
+        self.lock = threading.Lock()
+
+
+class HistoryCache:
+    """Общий для процесса кэш истории классификаций.
+
+    При обновлении из БД запрашиваются только классификации с id больше
+    последнего загруженного и оценки, поставленные после последней известной;
+    новые строки дописываются к кэшу, оценки обновляются на месте. Транзакции
+    фиксируются не в порядке id (пакетная и фоновая запись), поэтому строки и
+    оценки за последние HISTORY_LAG_SECONDS перечитываются каждый раз и
+    заменяют закэшированные с тем же id.
+
+    Кэш обновляется после записи пользователя (invalidate) или по истечении
+    HISTORY_REFRESH_SECONDS, чтобы подхватить записи других процессов. Хранится
+    история не более HISTORY_CACHE_USERS пользователей, давно не запрашиваемые
+    вытесняются.
+    """
+
+    def __init__(self, refresh_seconds=None, lag_seconds=None, max_users=None):
+        self.refresh_seconds = Config.HISTORY_REFRESH_SECONDS if refresh_seconds is None else refresh_seconds
+        self.lag_seconds = Config.HISTORY_LAG_SECONDS if lag_seconds is None else lag_seconds
+        self.max_users = Config.HISTORY_CACHE_USERS if max_users is None else max_users
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _entry(self, id_user):
+        with self._lock:
+            entry = self._entries.get(id_user)
+            if entry is None:
+                entry = self._entries[id_user] = _HistoryEntry()
+            self._entries.move_to_end(id_user)
+            while len(self._entries) > max(self.max_users, 1):
+                self._entries.popitem(last=False)
+            return entry
+
+    def get(self, db, id_user=None):
+        """Копия истории (новые сверху); id_user=None - история всех пользователей"""
+        entry = self._entry(id_user)
+        with entry.lock:
+            if entry.stale or time.monotonic() - entry.refreshed_at > self.refresh_seconds:
+                self._refresh(db, entry, id_user)
+            return entry.frame.reset_index().sort_values(["created_at", "id"], ascending=False, ignore_index=True)
+
+    def _refresh(self, db, entry, id_user):
+        lag = pd.Timedelta(seconds=self.lag_seconds)
+        created_since = None
+        if entry.frame is not None and not entry.frame.empty:
+            created_since = (entry.frame["created_at"].max() - lag).to_pydatetime()
+        new_rows = db.get_history_rows(id_user, after_id=entry.max_id, created_since=created_since)
+        if new_rows is None:
+            if entry.frame is None:
+                raise RuntimeError("Не удалось загрузить историю классификаций")
+            return
+
+        if entry.frame is not None and entry.rated_since is not None:
+            # Оценки, поставленные после последнего обновления, в том числе к старым классификациям
+            changes = db.get_history_rating_changes(id_user, since=(entry.rated_since - lag).to_pydatetime())
+            if changes is not None and not changes.empty:
+                changes = changes.set_index("id")
+                known = changes.index.intersection(entry.frame.index)
+                entry.frame.loc[known, ["rating", "comment", "rated_at"]] = changes.loc[known, ["rating", "comment", "rated_at"]]
+                entry.rated_since = max(entry.rated_since, changes["rated_at"].max())
+
+        if not new_rows.empty:
+            new_rows = new_rows.set_index("id")
+            if entry.frame is None:
+                entry.frame = new_rows
+            else:
+                # Перечитанные строки окна заменяют закэшированные с тем же id
+                entry.frame = pd.concat([entry.frame.drop(new_rows.index, errors="ignore"), new_rows])
+            entry.max_id = max(entry.max_id, int(new_rows.index.max()))
+        elif entry.frame is None:
+            entry.frame = new_rows.set_index("id")
+
+        if entry.rated_since is None and entry.frame["rated_at"].notna().any():
+            entry.rated_since = entry.frame["rated_at"].max()
+        elif entry.rated_since is None:
+            # Оценок еще нет: следим за всеми, поставленными с момента загрузки
+            entry.rated_since = pd.Timestamp(0)
+        entry.refreshed_at = time.monotonic()
+        entry.stale = False
+
+    def invalidate(self, id_user=None):
+        """Помечает устаревшими историю пользователя и общую историю"""
+        with self._lock:
+            for key in (id_user, None):
+                entry = self._entries.get(key)
+                if entry is not None:
+                    entry.stale = True
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+# Единый кэш истории на процесс
+history_cache = HistoryCache()
@@ -0,0 +1,335 @@
+"""Схема БД: версионные миграции и проверка планов запросов.
+
+Миграции применяются по порядку и записываются в schema_migrations, поэтому
+повторный запуск ничего не меняет. Запуск вручную (из каталога app):
+
+    python -m database.migrations migrate
+    python -m database.migrations explain
+"""
+import sys
+import threading
+from datetime import date, datetime
+
+import pymysql
+
+from config import Config
+from .pool import ConnectionPool, get_pool
+
+
+def _index_exists(cursor, table, name):
+    cursor.execute(
+        """
+        SELECT 1 FROM information_schema.statistics
+        WHERE table_schema = DATABASE() AND table_name = %s AND index_name = %s
+        LIMIT 1
+        """,
+        (table, name)
+    )
+    return cursor.fetchone() is not None
+
+
+def _column_exists(cursor, table, column):
+    cursor.execute(
+        """
+        SELECT 1 FROM information_schema.columns
+        WHERE table_schema = DATABASE() AND table_name = %s AND column_name = %s
+        LIMIT 1
+        """,
+        (table, column)
+    )
+    return cursor.fetchone() is not None
+
+
+def _add_column(cursor, table, column, definition):
+    if not _column_exists(cursor, table, column):
+        cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+
+
+def _create_index(cursor, table, name, columns):
+    """CREATE INDEX без ошибки, если индекс уже есть (в MySQL нет IF NOT EXISTS для индексов)"""
+    if not _index_exists(cursor, table, name):
+        cursor.execute(f"CREATE INDEX {name} ON {table} ({columns})")
+
+
+def _base_schema(cursor):
+    # IF NOT EXISTS: существующая база принимается как есть и только получает версию
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS users (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            login VARCHAR(255) NOT NULL,
+            email VARCHAR(255) NOT NULL,
+            password_hash VARCHAR(255) NOT NULL,
+            id_role INT NOT NULL DEFAULT 1,
+            created_at DATETIME NOT NULL
+        )
+    """)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS folders_zip (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            id_user INT NOT NULL,
+            foldername VARCHAR(255) NOT NULL,
+            count_files INT NOT NULL DEFAULT 0,
+            uploaded_at DATETIME NOT NULL,
+            FOREIGN KEY (id_user) REFERENCES users (id)
+        )
+    """)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS documents (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            id_user INT NOT NULL,
+            filename VARCHAR(255) NOT NULL,
+            id_folder_zip INT NULL,
+            uploaded_at DATETIME NOT NULL,
+            FOREIGN KEY (id_user) REFERENCES users (id),
+            FOREIGN KEY (id_folder_zip) REFERENCES folders_zip (id)
+        )
+    """)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS classifications (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            id_document INT NOT NULL,
+            model_used VARCHAR(255) NOT NULL,
+            predicted_class VARCHAR(255) NOT NULL,
+            confidence DECIMAL(5, 2) NULL,
+            created_at DATETIME NOT NULL,
+            FOREIGN KEY (id_document) REFERENCES documents (id)
+        )
+    """)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS ratings (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            id_classification INT NOT NULL,
+            id_user INT NOT NULL,
+            rating TINYINT NOT NULL,
+            comment TEXT,
+            created_at DATETIME NOT NULL,
+            FOREIGN KEY (id_classification) REFERENCES classifications (id),
+            FOREIGN KEY (id_user) REFERENCES users (id)
+        )
+    """)
+
+
+def _hot_query_indexes(cursor):
+    # Вторичные индексы InnoDB содержат первичный ключ, поэтому (id_user) покрывает
+    # переход documents -> classifications, а (id_classification) - MAX(r.id) по классификации
+    _create_index(cursor, "users", "idx_users_login", "login")
+    _create_index(cursor, "users", "idx_users_email", "email")
+    _create_index(cursor, "documents", "idx_documents_user", "id_user")
+    _create_index(cursor, "classifications", "idx_classifications_document", "id_document")
+    # Сортировка и keyset-пагинация по (created_at, id), фильтр по датам
+    _create_index(cursor, "classifications", "idx_classifications_created", "created_at")
+    # Покрывающий индекс для агрегатов по дням, моделям и классам
+    _create_index(
+        cursor, "classifications", "idx_classifications_stats",
+        "created_at, model_used, predicted_class, confidence"
+    )
+    _create_index(cursor, "ratings", "idx_ratings_classification", "id_classification")
+    # Обновление кэша истории по времени оценки
+    _create_index(cursor, "ratings", "idx_ratings_created", "created_at")
+
+
+def _classification_rollups(cursor):
+    from .db_operations import Database
+
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS classification_rollups (
+            day DATE NOT NULL,
+            model_used VARCHAR(255) NOT NULL,
+            predicted_class VARCHAR(255) NOT NULL,
+            n INT NOT NULL DEFAULT 0,
+            confidence_sum DOUBLE NOT NULL DEFAULT 0,
+            confidence_n INT NOT NULL DEFAULT 0,
+            rating_sum INT NOT NULL DEFAULT 0,
+            rating_n INT NOT NULL DEFAULT 0,
+            PRIMARY KEY (day, model_used, predicted_class)
+        )
+    """)
+    # Записи других процессов ждут окончания пересчета
+    Database._rebuild_rollups_locked(cursor)
+
+
+def _document_fingerprints(cursor):
+    # SHA-256 содержимого документа и версия модели (хеш файла модели) для
+    # повторного использования результатов при повторной отправке файлов
+    _add_column(cursor, "documents", "content_hash", "CHAR(64) NULL")
+    _add_column(cursor, "classifications", "model_version", "VARCHAR(32) NULL")
+    _create_index(cursor, "documents", "idx_documents_content_hash", "content_hash")
+
+
+def _distance_confidences(cursor):
+    # Уверенность кластеризации - отношение расстояний до центроидов, а не вероятность:
+    # она хранится как NULL и не входит в среднюю уверенность аналитики
+    cursor.execute(
+        "UPDATE classifications SET confidence = NULL WHERE model_used = %s AND confidence IS NOT NULL",
+        ("Кластеризация",)
+    )
+    cursor.execute(
+        "UPDATE classification_rollups SET confidence_sum = 0, confidence_n = 0 WHERE model_used = %s",
+        ("Кластеризация",)
+    )
+
+
+# (версия, описание, функция): новые миграции добавляются только в конец
+MIGRATIONS = [
+    (1, "Базовая схема", _base_schema),
+    (2, "Индексы для частых запросов", _hot_query_indexes),
+    (3, "Дневные агрегаты аналитики", _classification_rollups),
+    (4, "Отпечатки документов и версии моделей", _document_fingerprints),
+    (5, "Уверенность кластеризации не хранится", _distance_confidences),
+]
+
+_migrated = False
+_migrate_lock = threading.Lock()
+
+
+def migrate(pool=None):
+    """Применяет недостающие миграции; возвращает список примененных версий.
+
+    Между процессами миграции разделены блокировкой GET_LOCK, внутри
+    процесса выполняются один раз.
+    """
+    global _migrated
+    with _migrate_lock:
+        if _migrated:
+            return []
+        applied = []
+        with (pool or get_pool()).connection() as conn, conn.cursor() as cursor:
+            cursor.execute("SELECT GET_LOCK('schema_migrations', 60) AS locked")
+            if not cursor.fetchone()["locked"]:
+                raise pymysql.err.OperationalError("Не удалось получить блокировку миграций")
+            try:
+                cursor.execute("""
+                    CREATE TABLE IF NOT EXISTS schema_migrations (
+                        version INT PRIMARY KEY,
+                        description VARCHAR(255) NOT NULL,
+                        applied_at DATETIME NOT NULL
+                    )
+                """)
+                cursor.execute("SELECT version FROM schema_migrations")
+                done = {row["version"] for row in cursor.fetchall()}
+                for version, description, apply in MIGRATIONS:
+                    if version in done:
+                        continue
+                    # DDL в MySQL фиксируется неявно, версия пишется после успешного применения
+                    apply(cursor)
+                    cursor.execute(
+                        "INSERT INTO schema_migrations (version, description, applied_at) VALUES (%s, %s, NOW())",
+                        (version, description)
+                    )
+                    conn.commit()
+                    applied.append(version)
+            finally:
+                cursor.execute("SELECT RELEASE_LOCK('schema_migrations')")
+        _migrated = True
+        return applied
+
+
+class _RecordingCursor(pymysql.cursors.DictCursor):
+    """Курсор, запоминающий выполненные SELECT для проверки планов"""
+
+    recorded = None
+
+    def execute(self, query, args=None):
+        if self.recorded is not None and query.lstrip().upper().startswith("SELECT"):
+            self.recorded.append(self.mogrify(query, args))
+        return super().execute(query, args)
+
+
+def _sample_calls(db, id_user, login):
+    """Все читающие методы Database с типичными аргументами"""
+    today = date.today()
+    filters = [
+        {},
+        {"date_from": today.replace(day=1), "date_to": today},
+        {"search": "письмо", "classes": ["Order"], "models": ["Логистическая регрессия"]},
+        {"rating_range": (3, 5), "rated_only": True},
+    ]
+    calls = [
+        ("get_emploee", lambda: db.get_emploee(login)),
+        ("emploee_exists", lambda: db.emploee_exists(login, login)),
+        ("get_last_classification_id", lambda: db.get_last_classification_id(id_user)),
+        ("get_history_rows", lambda: db.get_history_rows(id_user, after_id=0)),
+        ("get_history_rows (все)", lambda: db.get_history_rows(None, after_id=0)),
+        ("get_history_rating_changes", lambda: db.get_history_rating_changes(id_user, since=datetime(2000, 1, 1))),
+        ("get_classification_filter_options", db.get_classification_filter_options),
+        ("find_classifications_by_hash",
+         lambda: db.find_classifications_by_hash(["0" * 64], "Наивный Байес", "0" * 16)),
+    ]
+    for i, f in enumerate(filters):
+        calls += [
+            (f"get_classifications_page #{i}", lambda f=f: db.get_classifications_page(f)),
+            (f"get_classifications_page после курсора #{i}",
+             lambda f=f: db.get_classifications_page(f, after=(datetime.now(), 1 << 30))),
+            (f"count_classifications #{i}", lambda f=f: db.count_classifications(f)),
+            (f"get_classification_stats #{i}", lambda f=f: db.get_classification_stats(f)),
+            (f"get_rollup_stats #{i}", lambda f=f: db.get_rollup_stats(f)),
+            (f"get_rating_histogram #{i}", lambda f=f: db.get_rating_histogram(f)),
+        ]
+    return calls
+
+
+def check_query_plans(db=None):
+    """Выполняет EXPLAIN для запросов Database и возвращает найденные полные сканирования.
+
+    Каждый читающий метод вызывается с типичными аргументами, выполненные им
+    SELECT перехватываются курсором и проверяются через EXPLAIN. Результат -
+    список словарей (method, table, rows, query) для строк плана с type=ALL.
+    На почти пустых таблицах оптимизатор может выбрать полное сканирование
+    даже при наличии индекса, поэтому проверять стоит на реальных объемах.
+    """
+    from .db_operations import Database
+
+    def connect():
+        return pymysql.connect(
+            host=Config.DB_HOST,
+            user=Config.DB_USER,
+            password=Config.DB_PASS,
+            database=Config.DB_NAME,
+            cursorclass=_RecordingCursor,
+            autocommit=True
+        )
+
+    db = db or Database()
+    pool = ConnectionPool(connect, size=1)
+    db._pool = pool
+
+    with pool.connection() as conn, conn.cursor(pymysql.cursors.DictCursor) as cursor:
+        cursor.execute("SELECT id, login FROM users ORDER BY id LIMIT 1")
+        user = cursor.fetchone() or {"id": 0, "login": ""}
+
+    scans = []
+    for method, call in _sample_calls(db, user["id"], user["login"]):
+        recorded = []
+        _RecordingCursor.recorded = recorded
+        try:
+            call()
+        finally:
+            _RecordingCursor.recorded = None
+        with pool.connection() as conn, conn.cursor(pymysql.cursors.DictCursor) as cursor:
+            for query in recorded:
+                cursor.execute("EXPLAIN " + query)
+                for row in cursor.fetchall():
+                    if row.get("type") == "ALL":
+                        scans.append({
+                            "method": method,
+                            "table": row.get("table"),
+                            "rows": row.get("rows"),
+                            "query": " ".join(query.split())
+                        })
+    return scans
+
+
+if __name__ == "__main__":
+    command = sys.argv[1] if len(sys.argv) > 1 else "migrate"
+    if command == "migrate":
+        versions = migrate()
+        print(f"Применены миграции: {versions}" if versions else "Схема актуальна")
+    elif command == "explain":
+        migrate()
+        scans = check_query_plans()
+        for scan in scans:
+            print(f"[{scan['method']}] полное сканирование {scan['table']} (~{scan['rows']} строк)\n    {scan['query']}")
+        print(f"Полных сканирований: {len(scans)}")
+        sys.exit(1 if scans else 0)
+    else:
+        sys.exit(f"Неизвестная команда: {command} (migrate | explain)")
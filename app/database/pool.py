@@ -0,0 +1,160 @@
+import threading
+import time
+from contextlib import contextmanager
+from queue import Empty, LifoQueue
+
+import pymysql
+
+from config import Config
+
+
+class PoolTimeout(pymysql.err.OperationalError):
+    """Не удалось получить подключение из пула за отведенное время"""
+
+
+class ConnectionPool:
+    """Потокобезопасный пул подключений pymysql.
+
+    Каждый запрос берет подключение из пула и возвращает его после выполнения,
+    поэтому параллельные сессии Streamlit не используют одно подключение
+    одновременно. Подключения, простоявшие дольше health_check_after секунд,
+    перед выдачей проверяются ping и при необходимости пересоздаются.
+    """
+
+    def __init__(self, connect, size=10, timeout=30.0, health_check_after=30.0):
+        self._connect = connect
+        self.size = size
+        self.timeout = timeout
+        self.health_check_after = health_check_after
+        self._idle = LifoQueue()  # (подключение, время возврата в пул)
+        self._lock = threading.Lock()
+        self._created = 0
+        self._in_use = 0
+        self._checkouts = 0
+        self._waits = 0
+        self._wait_time = 0.0
+        self._reconnects = 0
+
+    def _acquire(self):
+        try:
+            return self._idle.get_nowait()
+        except Empty:
+            pass
+
+        with self._lock:
+            can_create = self._created < self.size
+            if can_create:
+                self._created += 1
+        if can_create:
+            try:
+                return self._connect(), time.monotonic()
+            except Exception:
+                with self._lock:
+                    self._created -= 1
+                raise
+
+        # Все подключения заняты: ждем, пока какое-то вернут
+        started = time.monotonic()
+        try:
+            item = self._idle.get(timeout=self.timeout)
+        except Empty:
+            raise PoolTimeout(f"Нет свободных подключений к БД за {self.timeout} с (размер пула {self.size})")
+        finally:
+            with self._lock:
+                self._waits += 1
+                self._wait_time += time.monotonic() - started
+        return item
+
+    def _check_health(self, conn, returned_at):
+        """Проверяет подключение, долго простоявшее без дела"""
+        if conn.open and time.monotonic() - returned_at < self.health_check_after:
+            return conn
+        try:
+            conn.ping(reconnect=True)
+            return conn
+        except pymysql.Error:
+            with self._lock:
+                self._reconnects += 1
+            try:
+                conn.close()
+            except pymysql.Error:
+                pass
+            return self._connect()
+
+    def _discard(self):
+        with self._lock:
+            self._created -= 1
+
+    @contextmanager
+    def connection(self):
+        """Выдает подключение на время одного запроса или транзакции"""
+        conn, returned_at = self._acquire()
+        try:
+            conn = self._check_health(conn, returned_at)
+        except Exception:
+            self._discard()
+            raise
+
+        with self._lock:
+            self._in_use += 1
+            self._checkouts += 1
+        try:
+            yield conn
+        except Exception:
+            # Незавершенная транзакция не должна вернуться в пул
+            try:
+                conn.rollback()
+            except pymysql.Error:
+                pass
+            raise
+        finally:
+            with self._lock:
+                self._in_use -= 1
+            if conn.open:
+                self._idle.put((conn, time.monotonic()))
+            else:
+                self._discard()
+
+    def metrics(self):
+        """Текущее состояние пула"""
+        with self._lock:
+            return {
+                "size": self.size,
+                "created": self._created,
+                "in_use": self._in_use,
+                "idle": self._idle.qsize(),
+                "checkouts": self._checkouts,
+                "waits": self._waits,
+                "wait_time_total": round(self._wait_time, 4),
+                "wait_time_avg": round(self._wait_time / self._waits, 4) if self._waits else 0.0,
+                "reconnects": self._reconnects,
+            }
+
+
+def _connect():
+    return pymysql.connect(
+        host=Config.DB_HOST,
+        user=Config.DB_USER,
+        password=Config.DB_PASS,
+        database=Config.DB_NAME,
+        cursorclass=pymysql.cursors.DictCursor,
+        autocommit=True
+    )
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    """Единый пул подключений на процесс"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ConnectionPool(
+                _connect,
+                size=Config.DB_POOL_SIZE,
+                timeout=Config.DB_POOL_TIMEOUT,
+                health_check_after=Config.DB_POOL_HEALTH_CHECK_SECONDS
+            )
+        return _pool
@@ -0,0 +1,273 @@
+import atexit
+import json
+import logging
+import queue
+import threading
+import time
+
+import pymysql
+
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+# Ошибки подключения и блокировок, после которых пачку имеет смысл повторить:
+# нет связи с сервером, слишком много подключений, ожидание блокировки, взаимоблокировка
+_TRANSIENT_ERROR_CODES = {1040, 1205, 1213, 2003, 2006, 2013, 2055}
+
+
+def _is_transient(error):
+    """Временная ошибка подключения (повтор) или ошибка данных (повтор не поможет)"""
+    if isinstance(error, pymysql.err.InterfaceError):
+        return True
+    if isinstance(error, pymysql.err.OperationalError):
+        code = error.args[0] if error.args else None
+        # Без кода - ошибка пула подключений (PoolTimeout)
+        return not isinstance(code, int) or code in _TRANSIENT_ERROR_CODES
+    return False
+
+
+class PendingClassification:
+    """Классификация, поставленная в очередь записи; id появляется после записи в БД"""
+
+    def __init__(self, id_user, filename, model_name, predicted_class, confidence,
+                 content_hash=None, model_version=None):
+        self.row = (id_user, filename, model_name, predicted_class, confidence, content_hash, model_version)
+        self.id = None
+        self._done = threading.Event()
+
+    @property
+    def written(self):
+        return self.id is not None
+
+    def describe(self):
+        return {"type": "classification", "row": self.row}
+
+    def resolve(self, classification_id):
+        self.id = classification_id
+        self._done.set()
+
+    def result(self, timeout=None):
+        """Ждет записи в БД и возвращает id классификации (None, если не дождались)"""
+        self._done.wait(timeout)
+        return self.id
+
+
+class PendingRating:
+    """Оценка в очереди записи; может ссылаться на еще не записанную классификацию"""
+
+    def __init__(self, classification, id_user, rating, comment):
+        self.classification = classification
+        self.id_user = id_user
+        self.rating = rating
+        self.comment = comment
+        # Отмечается после записи группы, чтобы повтор пачки не дублировал оценку
+        self.written = False
+
+    def describe(self):
+        return {
+            "type": "rating",
+            "row": (self.classification_id, self.id_user, self.rating, self.comment),
+        }
+
+    @property
+    def classification_id(self):
+        if isinstance(self.classification, PendingClassification):
+            return self.classification.id
+        return self.classification
+
+
+class WriteBehindQueue:
+    """Асинхронная запись классификаций и оценок в MySQL.
+
+    Записи попадают в ограниченную очередь, фоновый поток сбрасывает их в БД
+    пачками. При недоступности БД пачка повторяется не более max_retries раз;
+    при ошибке данных записи пачки пишутся по одной, чтобы некорректная не
+    задерживала остальные. Несохраненные записи попадают в журнал dead_letter_path
+    (JSON-строка на запись). При завершении процесса очередь дописывается.
+    Очередь строго упорядочена, поэтому классификация всегда записывается
+    раньше оценки, которая на нее ссылается.
+    """
+
+    def __init__(self, db, maxsize=1000, batch_size=100, flush_interval=0.5, retry_delay=1.0,
+                 max_retries=5, dead_letter_path=None):
+        self.db = db
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.retry_delay = retry_delay
+        self.max_retries = max_retries
+        self.dead_letter_path = dead_letter_path
+        self.dead_letters = 0
+        self._queue = queue.Queue(maxsize=maxsize)
+        self._stopping = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="write-behind", daemon=True)
+        self._thread.start()
+
+    def submit_classification(self, id_user, filename, model_name, predicted_class, confidence,
+                              content_hash=None, model_version=None):
+        """Ставит классификацию в очередь; при переполнении очереди вызывающий поток ждет"""
+        pending = PendingClassification(
+            id_user, filename, model_name, predicted_class, confidence, content_hash, model_version
+        )
+        self._queue.put(pending)
+        return pending
+
+    def submit_rating(self, classification, id_user, rating, comment=""):
+        """classification - id или PendingClassification из submit_classification"""
+        self._queue.put(PendingRating(classification, id_user, rating, comment))
+        return True
+
+    def flush(self, timeout=None):
+        """Ждет, пока все поставленные записи будут сброшены в БД"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self._queue.unfinished_tasks:
+            if deadline is not None and time.monotonic() > deadline:
+                return False
+            time.sleep(0.05)
+        return True
+
+    def close(self, timeout=30):
+        """Дописывает очередь и останавливает фоновый поток"""
+        self.flush(timeout)
+        self._stopping.set()
+        self._thread.join(timeout=5)
+
+    def _next_batch(self):
+        try:
+            batch = [self._queue.get(timeout=self.flush_interval)]
+        except queue.Empty:
+            return []
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while not self._stopping.is_set():
+            batch = self._next_batch()
+            if not batch:
+                continue
+            error = self._with_retries(lambda: self._write(batch))
+            if error is not None and not _is_transient(error):
+                # Ошибка данных: записи пишутся по одной, чтобы отделить некорректные
+                logger.warning("Ошибка данных при фоновой записи пачки, запись по одной: %s", error)
+                for item in batch:
+                    if not item.written:
+                        item_error = self._with_retries(lambda: self._write_group([item]))
+                        if item_error is not None:
+                            self._dead_letter(item, item_error)
+            elif error is not None:
+                for item in batch:
+                    if not item.written:
+                        self._dead_letter(item, error)
+            for _ in batch:
+                self._queue.task_done()
+
+    def _with_retries(self, write):
+        """Выполняет write; временные ошибки повторяются не более max_retries раз. Возвращает ошибку или None"""
+        for attempt in range(self.max_retries + 1):
+            try:
+                write()
+                return None
+            except Exception as e:
+                if not _is_transient(e) or attempt == self.max_retries:
+                    return e
+                delay = min(self.retry_delay * 2 ** attempt, 30.0)
+                logger.warning("Ошибка фоновой записи в БД, повтор через %.1f с: %s", delay, e)
+                time.sleep(delay)
+
+    def _dead_letter(self, item, error):
+        """Записывает несохраненную запись в журнал и освобождает ожидающих ее id"""
+        self.dead_letters += 1
+        record = {"time": time.strftime("%Y-%m-%d %H:%M:%S"), "error": str(error), **item.describe()}
+        logger.error("Фоновая запись в БД не удалась, запись отброшена: %s", record)
+        if self.dead_letter_path:
+            try:
+                with open(self.dead_letter_path, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(record, ensure_ascii=False, default=str) + "\n")
+            except OSError as e:
+                logger.error("Не удалось записать в журнал %s: %s", self.dead_letter_path, e)
+        if isinstance(item, PendingClassification):
+            item.resolve(None)
+
+    def _write(self, batch):
+        # Пачка делится на последовательные группы одного типа с сохранением порядка
+        group = []
+        for item in batch:
+            if group and type(item) is not type(group[0]):
+                self._write_group(group)
+                group = []
+            group.append(item)
+        if group:
+            self._write_group(group)
+
+    def _write_group(self, group):
+        if isinstance(group[0], PendingClassification):
+            # После повтора пачки уже записанные классификации не дублируются
+            pending = [item for item in group if item.id is None]
+            ids = self.db.insert_classifications([item.row for item in pending])
+            for item, classification_id in zip(pending, ids):
+                item.resolve(classification_id)
+        else:
+            pending = []
+            for item in group:
+                if item.written:
+                    continue
+                if item.classification_id is None:
+                    # Классификация, на которую ссылается оценка, не была записана
+                    item.written = True
+                    self._dead_letter(item, "классификация оценки не записана в БД")
+                else:
+                    pending.append(item)
+            self.db.insert_ratings([
+                (item.classification_id, item.id_user, item.rating, item.comment) for item in pending
+            ])
+            for item in pending:
+                item.written = True
+
+
+_writer = None
+_writer_lock = threading.Lock()
+
+
+def get_writer(db):
+    """Единая очередь фоновой записи на процесс"""
+    global _writer
+    with _writer_lock:
+        if _writer is None:
+            _writer = WriteBehindQueue(
+                db,
+                maxsize=Config.WRITE_BEHIND_QUEUE_SIZE,
+                batch_size=Config.WRITE_BEHIND_BATCH_SIZE,
+                flush_interval=Config.WRITE_BEHIND_FLUSH_SECONDS,
+                max_retries=Config.WRITE_BEHIND_MAX_RETRIES,
+                dead_letter_path=Config.WRITE_BEHIND_DEAD_LETTER
+            )
+            atexit.register(_writer.close)
+        return _writer
+
+
+def save_classification(db, id_user, filename, model_name, predicted_class, confidence,
+                        content_hash=None, model_version=None):
+    """Сохраняет классификацию сразу или через очередь (DB_WRITE_BEHIND).
+
+    Возвращает id классификации либо PendingClassification, который можно
+    передать в save_rating до фактической записи.
+    """
+    args = (id_user, filename, model_name, predicted_class, confidence, content_hash, model_version)
+    if Config.DB_WRITE_BEHIND:
+        return get_writer(db).submit_classification(*args)
+    return db.create_classification(*args)
+
+
+def save_rating(db, classification, id_user, rating, comment=""):
+    """Сохраняет оценку сразу или через очередь (DB_WRITE_BEHIND)"""
+    if Config.DB_WRITE_BEHIND:
+        return get_writer(db).submit_rating(classification, id_user, rating, comment)
+    if isinstance(classification, PendingClassification):
+        classification = classification.result(timeout=Config.WRITE_BEHIND_FLUSH_SECONDS * 20)
+        if classification is None:
+            return False
+    return db.create_rating(classification, id_user, rating, comment)
@@ -1,6 +1,8 @@
 import streamlit as st
 from utils.auth_utils import load_vectorizer
 from utils.ml_utils import MODELS
+from utils.job_utils import job_manager
+from database.migrations import migrate
 import sys
 from pathlib import Path
 from config import Config
@@ -25,6 +27,13 @@ def main():
     except ValueError as e:
         st.error(f"Configuration error: {str(e)}")
         st.stop()
+
+    # Схема БД и индексы приводятся к актуальной версии один раз на процесс
+    try:
+        migrate()
+    except Exception as e:
+        st.error(f"Ошибка миграции базы данных: {str(e)}")
+        st.stop()
         
     current_url = st.query_params
 
@@ -34,13 +43,15 @@ def main():
         st.session_state.client = None
     if 'analyst_step' not in st.session_state:
         st.session_state.analyst_step = None
-    if 'vectorizer' not in st.session_state:
-        st.session_state.vectorizer = load_vectorizer()
     if 'route' not in st.session_state:
         st.session_state.route = None
 
     user = st.session_state.user
-    vectorizer = st.session_state.vectorizer
+    # Один векторизатор на процесс, а не копия в каждой сессии
+    vectorizer = load_vectorizer()
+
+    # Задания по архивам, прерванные перезапуском процесса, продолжаются с контрольной точки
+    job_manager.resume_pending(vectorizer)
 
     if st.session_state.route == "login":
         emploee_login_page()
@@ -52,7 +63,7 @@ def main():
         analyst_login_page()
     elif user:
         if user.get("id_role") == 2:
-            analyst_page(user)
+            analyst_page(user, vectorizer)
         else:
             emploee_page(user, vectorizer)
     else:
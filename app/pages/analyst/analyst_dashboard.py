@@ -1,15 +1,12 @@
 import streamlit as st
 from database.db_operations import Database
+from database.write_behind import save_classification, save_rating
 from utils.auth_utils import load_vectorizer
-from utils.ml_utils import MODELS, MODELS_ZIP, classify_document, load_model
-from utils.file_utils import extract_text_from_file
+from utils.ml_utils import CASCADES, MODELS, MODELS_ZIP, cascade_stats, classify_all_models, classify_document, document_fingerprint, model_stats, stored_confidence
+from utils.job_utils import job_manager, show_archive_jobs
+from utils.result_cache import result_cache
 import pandas as pd
 import plotly.express as px
-import shutil
-import os
-import io
-import tempfile
-import zipfile
 
 
 db = Database()
@@ -72,11 +69,8 @@ def analyst_page(user, vectorizer=None):
                     russian_class = translate_class(prediction, model_name)
                     
                     # Формируем сообщение
-                    if model_name == "Кластеризация":
-                        msg = f"✅ Класс: **{russian_class}**"
-                    else:
-                        confidence_str = f"{confidence:.2%}" if confidence is not None else "не определена"
-                        msg = f"✅ Класс: **{russian_class}** (уверенность: **{confidence_str}**)"
+                    confidence_str = f"{confidence:.2%}" if confidence is not None else "не определена"
+                    msg = f"✅ Класс: **{russian_class}** (уверенность: **{confidence_str}**)"
                     
                     st.success(msg)
                     st.caption(f"🌐 Язык: **{lang}** | 📏 Слов: **{wc}**")
@@ -84,13 +78,17 @@ def analyst_page(user, vectorizer=None):
                     with st.expander("📄 Просмотреть текст"):
                         st.text(preview[:5000] + "..." if len(preview) > 5000 else preview)
                         
-                    # Сохраняем в БД (русские названия для всех моделей)
-                    classification_id = db.create_classification(
+                    # Сохраняем в БД (русские названия для всех моделей) с отпечатком файла и версией модели
+                    content_hash, version = document_fingerprint(uploaded_file, model_name)
+                    classification_id = save_classification(
+                        db,
                         user["id"],
                         uploaded_file.name,
                         model_name,
                         russian_class,
-                        float(confidence) if confidence is not None else None
+                        stored_confidence(model_name, confidence),
+                        content_hash,
+                        version
                     )
                     
                     # Сохраняем ID для оценки
@@ -103,6 +101,31 @@ def analyst_page(user, vectorizer=None):
             except Exception as e:
                 st.error(f"❌ Ошибка классификации: {str(e)}")
 
+    # Сравнение моделей: текст извлекается и векторизуется один раз, в БД не сохраняется
+    if uploaded_file and st.button(
+        "⚖️ Сравнить все модели",
+        key="client_compare",
+        use_container_width=True
+    ):
+        with st.spinner("🔍 Классифицируем всеми моделями..."):
+            record = classify_all_models(uploaded_file, vectorizer)
+            if record:
+                st.dataframe(
+                    pd.DataFrame([
+                        {
+                            "Модель": name,
+                            "Класс": translate_class(prediction, name),
+                            "Уверенность": f"{confidence:.2%}" if confidence is not None else "—"
+                        }
+                        for name, (prediction, confidence) in record["results"].items()
+                    ]),
+                    use_container_width=True,
+                    hide_index=True
+                )
+                st.caption(f"🌐 Язык: **{record['language']}** | 📏 Слов: **{record['word_count']}**")
+            else:
+                st.error("⚠️ Не удалось классифицировать документ")
+
     # Форма оценки результата
     if st.session_state.get("show_rating") and "last_classification_id" in st.session_state:
         with st.form("rating_form"):
@@ -112,7 +135,8 @@ def analyst_page(user, vectorizer=None):
             
             if st.form_submit_button("📤 Отправить оценку"):
                 try:
-                    if db.create_rating(
+                    if save_rating(
+                        db,
                         st.session_state.last_classification_id,
                         user["id"],
                         rating,
@@ -139,215 +163,123 @@ def analyst_page(user, vectorizer=None):
     st.markdown("### 🗂 Классификация архива с документами")
     st.info("Загрузите `.zip` файл с документами (txt, pdf, docx), и получите архив, отсортированный по папкам-классам.")
 
-    zip_model = st.selectbox("🧠 Модель для архива", list(MODELS_ZIP.keys()), key="zip_model")
+    zip_model = st.selectbox("🧠 Модель для архива", list(MODELS_ZIP) + list(CASCADES), key="zip_model")
     zip_file = st.file_uploader("📎 Загрузите архив", type=["zip"], key="zip_upload")
 
-    # Функция перевода названий классов
-    def translate_class_name(class_name):
-        translation = {
-            "Order": "Приказ",
-            "Ordinance": "Постановление",
-            "Letters": "Письмо",
-            "Miscellaneous": "Общее"
-        }
-        return translation.get(class_name, class_name)
-
     if zip_file and st.button(
         "📂 Классифицировать архив", 
         key="zip_classify",
         use_container_width=True
     ):
-        with st.spinner("🔍 Обработка архива..."):
-            try:
-                # Создаем запись об архиве
-                zip_folder_id = db.create_zip_folder(
-                    user["id"],
-                    zip_file.name,
-                    0
-                )
-                
-                if not zip_folder_id:
-                    st.error("❌ Не удалось создать запись об архиве в БД")
-                    return
-
-                with tempfile.TemporaryDirectory() as tmpdir:
-                    tmp_input = os.path.join(tmpdir, "input")
-                    tmp_output = os.path.join(tmpdir, "output")
-                    os.makedirs(tmp_input, exist_ok=True)
-                    os.makedirs(tmp_output, exist_ok=True)
-
-                    # Распаковка архива
-                    with zipfile.ZipFile(zip_file, "r") as zip_ref:
-                        zip_ref.extractall(tmp_input)
-
-                    # Создаем директории для классов (с русскими названиями)
-                    class_dirs = {
-                        "Письмо": os.path.join(tmp_output, "Письмо"),
-                        "Приказ": os.path.join(tmp_output, "Приказ"),
-                        "Постановление": os.path.join(tmp_output, "Постановление"),
-                        "Общее": os.path.join(tmp_output, "Общее")
-                    }
-                    for path in class_dirs.values():
-                        os.makedirs(path, exist_ok=True)
-
-                    processed_files = 0
-                    
-                    for root, _, files in os.walk(tmp_input):
-                        for fname in files:
-                            file_path = os.path.join(root, fname)
-                            ext = os.path.splitext(fname)[1].lower()
-                            
-                            if ext not in ['.txt', '.pdf', '.docx']:
-                                continue
-                            
-                            try:
-                                # Чтение файла
-                                if ext == '.txt':
-                                    with open(file_path, 'r', encoding='utf-8') as f:
-                                        text = f.read()
-                                else:
-                                    with open(file_path, 'rb') as f:
-                                        file_content = f.read()
-                                    
-                                    class FileLikeObject(io.BytesIO):
-                                        name = fname
-                                        seekable = lambda self: True
-                                        readable = lambda self: True
-                                        writable = lambda self: False
-                                        mode = 'rb'
-                                        
-                                        @property
-                                        def type(self):
-                                            return {
-                                                '.pdf': 'application/pdf',
-                                                '.docx': 'application/vnd.openxmlformats-officedocument.wordprocessingml.document'
-                                            }.get(ext, 'application/octet-stream')
-                                    
-                                    file_obj = FileLikeObject(file_content)
-                                    text = extract_text_from_file(file_obj)
-
-                                if not text or len(text.strip()) < 10:
-                                    st.warning(f"⚠️ Файл `{fname}` не содержит текста или слишком короткий.")
-                                    continue
-                                
-                                # Классификация
-                                vector = vectorizer.transform([text])
-                                model = load_model(zip_model)
-                                pred = model.predict(vector)[0]
-                                confidence = model.predict_proba(vector)[0].max() if hasattr(model, 'predict_proba') else None
-                                
-                                # Определение класса с переводом
-                                if zip_model == "Clustering":
-                                    class_map = {
-                                        0: "Приказ",
-                                        1: "Постановление",
-                                        2: "Письмо",
-                                        3: "Общее"
-                                    }
-                                    russian_class = class_map.get(pred, "Общее")
-                                else:
-                                    english_class = pred if isinstance(pred, str) else "Miscellaneous"
-                                    russian_class = translate_class_name(english_class)
-                                
-                                # Сохраняем в БД
-                                classification_id = db.create_archive_classification(
-                                    id_user=user["id"],
-                                    filename=fname,
-                                    model_name=zip_model,
-                                    predicted_class=russian_class,
-                                    confidence=float(confidence) if confidence is not None else None,
-                                    id_folder_zip=zip_folder_id
-                                )
-                                
-                                if not classification_id:
-                                    continue
-                                
-                                # Копирование файла в соответствующую папку
-                                dst_dir = class_dirs.get(russian_class, class_dirs["Общее"])
-                                shutil.copy2(file_path, dst_dir)
-                                processed_files += 1
-                                
-                            except Exception as e:
-                                st.error(f"❌ Ошибка обработки файла `{fname}`: {str(e)}")
-
-                    # Обновляем счетчик файлов
-                    if processed_files > 0:
-                        db.update_zip_file_count(zip_folder_id, processed_files)
-
-                    # Создаем итоговый архив
-                    if processed_files > 0:
-                        result_zip_path = os.path.join(tmpdir, "classified.zip")
-                        with zipfile.ZipFile(result_zip_path, 'w') as zipf:
-                            for class_name, class_dir in class_dirs.items():
-                                if any(os.listdir(class_dir)):
-                                    for root, _, files in os.walk(class_dir):
-                                        for file in files:
-                                            file_path = os.path.join(root, file)
-                                            arcname = os.path.join(class_name, file)
-                                            zipf.write(file_path, arcname)
-
-                        with open(result_zip_path, "rb") as f:
-                            st.success(f"✅ Обработано файлов: {processed_files}")
-                            st.download_button(
-                                "📥 Скачать классифицированный архив",
-                                f,
-                                file_name="classified.zip",
-                                mime="application/zip",
-                                use_container_width=True
-                            )
-                    else:
-                        st.error("⚠️ Ни один файл не был обработан. Проверьте содержимое архива.")
+        try:
+            # Создаем запись об архиве
+            zip_folder_id = db.create_zip_folder(
+                user["id"],
+                zip_file.name,
+                0
+            )
+            
+            if not zip_folder_id:
+                st.error("❌ Не удалось создать запись об архиве в БД")
+                return
+
+            # Архив обрабатывается в фоне, прогресс отображается ниже
+            job_manager.submit(
+                zip_folder_id,
+                user["id"],
+                zip_file.name,
+                zip_file.getvalue(),
+                zip_model,
+                vectorizer
+            )
+            st.success(f"✅ Архив `{zip_file.name}` поставлен в очередь на обработку")
 
-            except Exception as e:
-                st.error(f"❌ Критическая ошибка при обработке архива: {str(e)}")
+        except Exception as e:
+            st.error(f"❌ Критическая ошибка при обработке архива: {str(e)}")
+
+    show_archive_jobs(user["id"])
+
+    # Статистика общего реестра моделей и пула подключений процесса
+    with st.expander("⚙️ Модели и подключения"):
+        loaded_models = model_stats()
+        if loaded_models:
+            st.dataframe(
+                pd.DataFrame(loaded_models)[["path", "version", "load_seconds", "memory_mb"]],
+                column_config={
+                    "path": "Файл модели",
+                    "version": "Версия",
+                    "load_seconds": st.column_config.NumberColumn("Время загрузки, с", format="%.3f"),
+                    "memory_mb": st.column_config.NumberColumn("Память, МБ", format="%.2f")
+                },
+                hide_index=True,
+                use_container_width=True
+            )
+        else:
+            st.caption("Модели еще не загружались")
+
+        cache = result_cache.stats()
+        st.markdown("**Кэш результатов классификации**")
+        cache_col1, cache_col2, cache_col3, cache_col4 = st.columns(4)
+        cache_col1.metric("Записей", f"{cache['size']} / {cache['maxsize']}")
+        cache_col2.metric("Попаданий", cache["hits"])
+        cache_col3.metric("Промахов", cache["misses"])
+        cache_col4.metric("Доля попаданий", f"{cache['hit_rate'] * 100:.1f}%")
+
+        cascades = cascade_stats()
+        if cascades:
+            st.markdown("**Каскады моделей**")
+            st.dataframe(
+                pd.DataFrame(cascades)[["name", "threshold", "documents", "escalation_rate", "saved_seconds"]],
+                column_config={
+                    "name": "Каскад",
+                    "threshold": "Порог уверенности",
+                    "documents": "Документов",
+                    "escalation_rate": st.column_config.NumberColumn("Доля переданных второй модели", format="%.2f"),
+                    "saved_seconds": st.column_config.NumberColumn("Сэкономлено, с (оценка)", format="%.2f")
+                },
+                hide_index=True,
+                use_container_width=True
+            )
+
+        pool = db.pool_metrics()
+        st.markdown("**Пул подключений к БД**")
+        pool_col1, pool_col2, pool_col3, pool_col4 = st.columns(4)
+        pool_col1.metric("Занято", f"{pool['in_use']} / {pool['size']}")
+        pool_col2.metric("Свободно", pool["idle"])
+        pool_col3.metric("Ожиданий", pool["waits"])
+        pool_col4.metric("Среднее ожидание, с", f"{pool['wait_time_avg']:.3f}")
 
-    
     st.markdown("---")
     st.subheader("📊 Аналитика классификаций")
 
     try:
-        # Получаем данные из БД
-        df = db.get_all_classifications()
+        # Границы и значения фильтров считаются в БД, а не по всей выборке
+        options = db.get_classification_filter_options()
         
-        if df.empty:
+        if options is None:
             st.info("📭 Нет данных для отображения")
             return
 
-        # Подготовка данных
-        df = df.rename(columns={
-            'login': 'username',
-            'filename': 'document_name',
-            'predicted_class': 'prediction',
-            'created_at': 'classification_date',
-            'rating': 'user_rating',
-            'comment': 'user_comment'
-        })
-
         # Перевод классов документов
         class_translation = {
             "Order": "Приказ",
             "Ordinance": "Постановление",
             "Letters": "Письмо",
             "Miscellaneous": "Общее",
-            0: "Приказ", 1: "Постановление", 2: "Письмо", 3: "Общее"
+            "0": "Приказ", "1": "Постановление", "2": "Письмо", "3": "Общее"
         }
-        df['russian_category'] = df['prediction'].map(class_translation).fillna(df['prediction'])
-        
-        # Форматирование данных
-        df['classification_date'] = pd.to_datetime(df['classification_date'], errors='coerce')
-        df = df.dropna(subset=['classification_date'])
-        df['formatted_confidence'] = df['confidence'].apply(
-            lambda x: f"{float(x)*100:.1f}%" if pd.notnull(x) and str(x).replace('.','',1).isdigit() else "—"
-        )
-        df['formatted_date'] = df['classification_date'].dt.strftime('%d.%m.%Y %H:%M')
+        def to_russian(value):
+            return class_translation.get(str(value), value)
+
+        categories = sorted({to_russian(value) for value in options['classes']})
 
         # Фильтры в сайдбаре
         with st.sidebar.expander("🔎 Фильтры", expanded=True):
             st.markdown("### Основные фильтры")
             
             # Диапазон дат
-            min_date = df['classification_date'].min().date()
-            max_date = df['classification_date'].max().date()
+            min_date = options['min_date']
+            max_date = options['max_date']
             date_range = st.date_input(
                 "📅 Диапазон дат",
                 value=(min_date, max_date),
@@ -364,20 +296,20 @@ def analyst_page(user, vectorizer=None):
             # Фильтр по категориям
             selected_categories = st.multiselect(
                 "📂 Категории документов",
-                options=sorted(df['russian_category'].unique()),
-                default=sorted(df['russian_category'].unique())
+                options=categories,
+                default=categories
             )
             
             # Фильтр по моделям
             selected_models = st.multiselect(
                 "🧠 Модели классификации",
-                options=df['model_used'].unique(),
-                default=df['model_used'].unique()
+                options=options['models'],
+                default=options['models']
             )
             
             # Фильтр по оценкам
             st.markdown("### Фильтры оценок")
-            if 'user_rating' in df.columns and not df['user_rating'].isna().all():
+            if options['has_ratings']:
                 min_rating, max_rating = st.slider(
                     "⭐ Диапазон оценок", 
                     min_value=1, 
@@ -389,51 +321,27 @@ def analyst_page(user, vectorizer=None):
             else:
                 st.info("Нет данных об оценках")
 
-        # Применение фильтров
-        filtered_df = df.copy()
-        
-        # Фильтр по дате
+        # Фильтры передаются в SQL; пустой выбор, как и раньше, означает "без фильтра"
+        filters = {"search": search_query or None}
         if len(date_range) == 2:
-            start_date, end_date = pd.to_datetime(date_range[0]), pd.to_datetime(date_range[1]) + pd.Timedelta(days=1)
-            filtered_df = filtered_df[
-                (filtered_df['classification_date'] >= start_date) & 
-                (filtered_df['classification_date'] <= end_date)
-            ]
-
-        # Остальные фильтры
-        if search_query:
-            filtered_df = filtered_df[filtered_df['document_name'].str.contains(search_query, case=False, na=False)]
-        
+            filters["date_from"], filters["date_to"] = date_range
         if selected_categories:
-            filtered_df = filtered_df[filtered_df['russian_category'].isin(selected_categories)]
-        
+            filters["classes"] = [value for value in options['classes'] if to_russian(value) in selected_categories]
         if selected_models:
-            filtered_df = filtered_df[filtered_df['model_used'].isin(selected_models)]
-        
-        # Фильтрация по оценкам
-        if 'user_rating' in filtered_df.columns and not filtered_df['user_rating'].isna().all():
-            if show_rated_only:
-                filtered_df = filtered_df[
-                    filtered_df['user_rating'].notna() & 
-                    filtered_df['user_rating'].between(min_rating, max_rating)
-                ]
-            else:
-                filtered_df = filtered_df[
-                    filtered_df['user_rating'].isna() | 
-                    filtered_df['user_rating'].between(min_rating, max_rating)
-                ]
-
-        # Сортировка
-        filtered_df = filtered_df.sort_values(['classification_date', 'russian_category'], ascending=[False, True])
+            filters["models"] = list(selected_models)
+        if options['has_ratings']:
+            filters["rating_range"] = (min_rating, max_rating)
+            filters["rated_only"] = show_rated_only
 
         # Метрики
+        summary = db.count_classifications(filters)
         col1, col2, col3, col4 = st.columns(4)
-        col1.metric("Всего записей", len(filtered_df))
-        col2.metric("Уникальных пользователей", filtered_df['username'].nunique())
-        col3.metric("Использованных моделей", filtered_df['model_used'].nunique())
+        col1.metric("Всего записей", summary['total'])
+        col2.metric("Уникальных пользователей", summary['users'])
+        col3.metric("Использованных моделей", summary['models'])
         
         # Средняя оценка (только для записей с оценками)
-        avg_rating = filtered_df['user_rating'].mean() if 'user_rating' in filtered_df.columns and not filtered_df['user_rating'].isna().all() else None
+        avg_rating = summary['avg_rating']
         col4.metric("Средняя оценка", f"{avg_rating:.1f}" if avg_rating is not None else "—")
 
         # Вкладки
@@ -442,64 +350,111 @@ def analyst_page(user, vectorizer=None):
         with tab1:
             # Настройки пагинации
             items_per_page = 50
-            total_records = len(filtered_df)
+            total_records = summary['total']
             total_pages = (total_records // items_per_page) + (1 if total_records % items_per_page else 0)
-            
-            # Получаем данные для текущей страницы
-            if total_pages > 1:
-                page = st.number_input(
-                    "Страница", 
-                    min_value=1, 
-                    max_value=total_pages, 
-                    value=1,
-                    key="pagination_page"
-                )
-                start_idx = (page - 1) * items_per_page
-                end_idx = min(start_idx + items_per_page, total_records)
-                paginated_df = filtered_df.iloc[start_idx:end_idx]
-            else:
-                paginated_df = filtered_df
 
-            # Таблица данных с оценками и комментариями
-            display_columns = [
-                'formatted_date', 'username', 'document_name', 'model_used',
-                'russian_category', 'formatted_confidence', 'user_rating', 'user_comment'
-            ]
-            
-            st.dataframe(
-                paginated_df[display_columns],
-                column_config={
-                    "formatted_date": st.column_config.TextColumn("Дата"),
-                    "username": "Пользователь",
-                    "document_name": "Название документа",
-                    "model_used": "Модель",
-                    "russian_category": "Категория",
-                    "formatted_confidence": st.column_config.TextColumn("Уверенность"),
-                    "user_rating": st.column_config.NumberColumn("Оценка", format="%d"),
-                    "user_comment": "Комментарий"
-                },
-                hide_index=True,
-                use_container_width=True,
-                height=600
-            )
-            
-            # Отображение пагинации под таблицей
-            if total_pages > 1:
-                st.caption(f"Показаны записи {start_idx+1}-{end_idx} из {total_records}")
+            # Курсоры страниц (keyset) сбрасываются при смене фильтров
+            filters_key = repr(sorted(filters.items()))
+            if st.session_state.get("analytics_filters") != filters_key:
+                st.session_state.analytics_filters = filters_key
+                st.session_state.analytics_cursors = [None]
+            cursors = st.session_state.analytics_cursors
+            page = len(cursors)
+
+            # Из БД читается только текущая страница
+            paginated_df = db.get_classifications_page(filters, items_per_page, cursors[-1])
+            if paginated_df is None or paginated_df.empty:
+                st.info("📭 Нет записей по выбранным фильтрам")
             else:
-                st.caption(f"Всего записей: {total_records}")
+                last_row = paginated_df.iloc[-1]
+                next_cursor = (last_row['created_at'], int(last_row['id']))
+
+                # Подготовка данных
+                paginated_df = paginated_df.rename(columns={
+                    'login': 'username',
+                    'filename': 'document_name',
+                    'predicted_class': 'prediction',
+                    'created_at': 'classification_date',
+                    'rating': 'user_rating',
+                    'comment': 'user_comment'
+                })
+                paginated_df['russian_category'] = paginated_df['prediction'].map(to_russian)
+                paginated_df['classification_date'] = pd.to_datetime(paginated_df['classification_date'], errors='coerce')
+                paginated_df['formatted_confidence'] = paginated_df['confidence'].apply(
+                    lambda x: f"{float(x)*100:.1f}%" if pd.notnull(x) and str(x).replace('.','',1).isdigit() else "—"
+                )
+                paginated_df['formatted_date'] = paginated_df['classification_date'].dt.strftime('%d.%m.%Y %H:%M')
+
+                # Таблица данных с оценками и комментариями
+                display_columns = [
+                    'formatted_date', 'username', 'document_name', 'model_used',
+                    'russian_category', 'formatted_confidence', 'user_rating', 'user_comment'
+                ]
+                
+                st.dataframe(
+                    paginated_df[display_columns],
+                    column_config={
+                        "formatted_date": st.column_config.TextColumn("Дата"),
+                        "username": "Пользователь",
+                        "document_name": "Название документа",
+                        "model_used": "Модель",
+                        "russian_category": "Категория",
+                        "formatted_confidence": st.column_config.TextColumn("Уверенность"),
+                        "user_rating": st.column_config.NumberColumn("Оценка", format="%d"),
+                        "user_comment": "Комментарий"
+                    },
+                    hide_index=True,
+                    use_container_width=True,
+                    height=600
+                )
+                
+                # Отображение пагинации под таблицей
+                if total_pages > 1:
+                    start_idx = (page - 1) * items_per_page
+                    nav_col1, nav_col2, nav_col3 = st.columns([1, 3, 1])
+                    with nav_col1:
+                        if st.button("← Назад", key="pagination_prev", disabled=page == 1, use_container_width=True):
+                            cursors.pop()
+                            st.rerun()
+                    with nav_col2:
+                        st.caption(
+                            f"Страница {page} из {total_pages}. "
+                            f"Показаны записи {start_idx+1}-{start_idx+len(paginated_df)} из {total_records}"
+                        )
+                    with nav_col3:
+                        if st.button("Вперед →", key="pagination_next", disabled=page >= total_pages, use_container_width=True):
+                            cursors.append(next_cursor)
+                            st.rerun()
+                else:
+                    st.caption(f"Всего записей: {total_records}")
+
+        # Графики строятся по дневным агрегатам; поиск по файлу и сужение по оценкам
+        # в агрегатах не представлены, для них агрегаты считаются по исходным таблицам
+        rating_narrowed = filters.get("rated_only") or filters.get("rating_range", (1, 5)) != (1, 5)
+        if not total_records:
+            stats = None
+        elif filters["search"] or rating_narrowed:
+            stats = db.get_classification_stats(filters)
+        else:
+            stats = db.get_rollup_stats(filters)
+        if stats is not None and not stats.empty:
+            stats['russian_category'] = stats['predicted_class'].map(to_russian)
+            stats['day'] = pd.to_datetime(stats['day'])
+            for column in ['n', 'confidence_sum', 'confidence_n', 'rating_sum', 'rating_n']:
+                stats[column] = pd.to_numeric(stats[column]).fillna(0)
         
         with tab2:
-            if not filtered_df.empty:
+            if stats is not None and not stats.empty:
                 col1, col2 = st.columns(2)
                 
                 # Распределение по моделям
                 with col1:
+                    model_counts = stats.groupby('model_used')['n'].sum().sort_values(ascending=False)
                     st.plotly_chart(
                         px.pie(
-                            filtered_df['model_used'].value_counts(),
-                            names=filtered_df['model_used'].value_counts().index,
-                            values=filtered_df['model_used'].value_counts().values,
+                            model_counts,
+                            names=model_counts.index,
+                            values=model_counts.values,
                             title="Распределение по моделям"
                         ),
                         use_container_width=True
@@ -507,11 +462,12 @@ def analyst_page(user, vectorizer=None):
                 
                 # Распределение по категориям
                 with col2:
+                    category_counts = stats.groupby('russian_category')['n'].sum().sort_values(ascending=False)
                     st.plotly_chart(
                         px.bar(
-                            filtered_df['russian_category'].value_counts(),
-                            x=filtered_df['russian_category'].value_counts().index,
-                            y=filtered_df['russian_category'].value_counts().values,
+                            category_counts,
+                            x=category_counts.index,
+                            y=category_counts.values,
                             title="Распределение по категориям",
                             labels={'x': 'Категория', 'y': 'Количество'}
                         ),
@@ -519,25 +475,28 @@ def analyst_page(user, vectorizer=None):
                     )
                 
                 # Распределение оценок (если есть оценки)
-                if 'user_rating' in filtered_df.columns and not filtered_df['user_rating'].isna().all():
+                if stats['rating_n'].sum() > 0:
+                    rating_hist = db.get_rating_histogram(filters)
                     st.plotly_chart(
-                        px.histogram(
-                            filtered_df[filtered_df['user_rating'].notna()],
-                            x='user_rating',
-                            nbins=5,
+                        px.bar(
+                            rating_hist,
+                            x='rating',
+                            y='n',
                             title="Частота оценок пользователей",
-                            labels={'user_rating': 'Оценка'}
+                            labels={'rating': 'Оценка', 'n': 'count'}
                         ),
                         use_container_width=True
                     )
         
         with tab3:
-            if not filtered_df.empty:
+            if stats is not None and not stats.empty:
+                daily = stats.groupby('day')[['n', 'confidence_sum', 'confidence_n', 'rating_sum', 'rating_n']].sum()
+                daily = daily.asfreq('D', fill_value=0)
                 col1, col2 = st.columns(2)
                 
                 # Активность по дням
                 with col1:
-                    daily_counts = filtered_df.set_index('classification_date').resample('D').size()
+                    daily_counts = daily['n'].rename_axis('classification_date')
                     st.plotly_chart(
                         px.line(
                             daily_counts,
@@ -549,23 +508,22 @@ def analyst_page(user, vectorizer=None):
                 
                 # Средняя уверенность по дням
                 with col2:
-                    if 'confidence' in filtered_df.columns:
-                        daily_confidence = filtered_df.set_index('classification_date').resample('D')['confidence'].mean()
-                        st.plotly_chart(
-                            px.line(
-                                daily_confidence,
-                                title="Средняя уверенность модели",
-                                labels={'value': 'Уверенность', 'classification_date': 'Дата'}
-                            ),
-                            use_container_width=True
-                        )
+                    daily_confidence = (daily['confidence_sum'] / daily['confidence_n'].where(daily['confidence_n'] > 0))
+                    st.plotly_chart(
+                        px.line(
+                            daily_confidence.rename_axis('classification_date'),
+                            title="Средняя уверенность модели",
+                            labels={'value': 'Уверенность', 'classification_date': 'Дата'}
+                        ),
+                        use_container_width=True
+                    )
                 
                 # Средняя оценка по дням (если есть оценки)
-                if 'user_rating' in filtered_df.columns and not filtered_df['user_rating'].isna().all():
-                    daily_rating = filtered_df.set_index('classification_date').resample('D')['user_rating'].mean()
+                if daily['rating_n'].sum() > 0:
+                    daily_rating = daily['rating_sum'] / daily['rating_n'].where(daily['rating_n'] > 0)
                     st.plotly_chart(
                         px.line(
-                            daily_rating,
+                            daily_rating.rename_axis('classification_date'),
                             title="Средняя оценка пользователей",
                             labels={'value': 'Оценка', 'classification_date': 'Дата'}
                         ),
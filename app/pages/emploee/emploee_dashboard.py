@@ -1,14 +1,10 @@
 import streamlit as st
 from database.db_operations import Database
-from utils.ml_utils import MODELS, MODELS_ZIP, classify_document, load_model
-from utils.file_utils import extract_text_from_file
+from database.write_behind import save_classification, save_rating
+from utils.ml_utils import CASCADES, MODELS, MODELS_ZIP, classify_document, document_fingerprint, stored_confidence
+from utils.job_utils import job_manager, show_archive_jobs
 import plotly.express as px
 import pandas as pd
-import os
-import io
-import zipfile
-import tempfile
-import shutil
 
 
 db = Database()
@@ -70,11 +66,8 @@ def emploee_page(user, vectorizer):
                     russian_class = translate_class(prediction, model_name)
                     
                     # Формируем сообщение
-                    if model_name == "Кластеризация":
-                        msg = f"✅ Класс: **{russian_class}**"
-                    else:
-                        confidence_str = f"{confidence:.2%}" if confidence is not None else "не определена"
-                        msg = f"✅ Класс: **{russian_class}** (уверенность: **{confidence_str}**)"
+                    confidence_str = f"{confidence:.2%}" if confidence is not None else "не определена"
+                    msg = f"✅ Класс: **{russian_class}** (уверенность: **{confidence_str}**)"
                     
                     st.success(msg)
                     st.caption(f"🌐 Язык: **{lang}** | 📏 Слов: **{wc}**")
@@ -82,13 +75,17 @@ def emploee_page(user, vectorizer):
                     with st.expander("📄 Просмотреть текст"):
                         st.text(preview[:5000] + "..." if len(preview) > 5000 else preview)
                         
-                    # Сохраняем в БД (русские названия для всех моделей)
-                    classification_id = db.create_classification(
+                    # Сохраняем в БД (русские названия для всех моделей) с отпечатком файла и версией модели
+                    content_hash, version = document_fingerprint(uploaded_file, model_name)
+                    classification_id = save_classification(
+                        db,
                         user["id"],
                         uploaded_file.name,
                         model_name,
                         russian_class,
-                        float(confidence) if confidence is not None else None
+                        stored_confidence(model_name, confidence),
+                        content_hash,
+                        version
                     )
                     
                     # Сохраняем ID для оценки
@@ -110,7 +107,8 @@ def emploee_page(user, vectorizer):
             
             if st.form_submit_button("📤 Отправить оценку"):
                 try:
-                    if db.create_rating(
+                    if save_rating(
+                        db,
                         st.session_state.last_classification_id,
                         user["id"],
                         rating,
@@ -137,168 +135,41 @@ def emploee_page(user, vectorizer):
     st.markdown("### 🗂 Классификация архива с документами")
     st.info("Загрузите `.zip` файл с документами (txt, pdf, docx), и получите архив, отсортированный по папкам-классам.")
 
-    zip_model = st.selectbox("🧠 Модель для архива", list(MODELS_ZIP.keys()), key="zip_model")
+    zip_model = st.selectbox("🧠 Модель для архива", list(MODELS_ZIP) + list(CASCADES), key="zip_model")
     zip_file = st.file_uploader("📎 Загрузите архив", type=["zip"], key="zip_upload")
 
-    # Функция перевода названий классов
-    def translate_class_name(class_name):
-        translation = {
-            "Order": "Приказ",
-            "Ordinance": "Постановление",
-            "Letters": "Письмо",
-            "Miscellaneous": "Общее"
-        }
-        return translation.get(class_name, class_name)
-
     if zip_file and st.button(
         "📂 Классифицировать архив", 
         key="zip_classify",
         use_container_width=True
     ):
-        with st.spinner("🔍 Обработка архива..."):
-            try:
-                # Создаем запись об архиве
-                zip_folder_id = db.create_zip_folder(
-                    user["id"],
-                    zip_file.name,
-                    0
-                )
-                
-                if not zip_folder_id:
-                    st.error("❌ Не удалось создать запись об архиве в БД")
-                    return
-
-                with tempfile.TemporaryDirectory() as tmpdir:
-                    tmp_input = os.path.join(tmpdir, "input")
-                    tmp_output = os.path.join(tmpdir, "output")
-                    os.makedirs(tmp_input, exist_ok=True)
-                    os.makedirs(tmp_output, exist_ok=True)
-
-                    # Распаковка архива
-                    with zipfile.ZipFile(zip_file, "r") as zip_ref:
-                        zip_ref.extractall(tmp_input)
-
-                    # Создаем директории для классов (с русскими названиями)
-                    class_dirs = {
-                        "Письмо": os.path.join(tmp_output, "Письмо"),
-                        "Приказ": os.path.join(tmp_output, "Приказ"),
-                        "Постановление": os.path.join(tmp_output, "Постановление"),
-                        "Общее": os.path.join(tmp_output, "Общее")
-                    }
-                    for path in class_dirs.values():
-                        os.makedirs(path, exist_ok=True)
-
-                    processed_files = 0
-                    
-                    for root, _, files in os.walk(tmp_input):
-                        for fname in files:
-                            file_path = os.path.join(root, fname)
-                            ext = os.path.splitext(fname)[1].lower()
-                            
-                            if ext not in ['.txt', '.pdf', '.docx']:
-                                continue
-                            
-                            try:
-                                # Чтение файла
-                                if ext == '.txt':
-                                    with open(file_path, 'r', encoding='utf-8') as f:
-                                        text = f.read()
-                                else:
-                                    with open(file_path, 'rb') as f:
-                                        file_content = f.read()
-                                    
-                                    class FileLikeObject(io.BytesIO):
-                                        name = fname
-                                        seekable = lambda self: True
-                                        readable = lambda self: True
-                                        writable = lambda self: False
-                                        mode = 'rb'
-                                        
-                                        @property
-                                        def type(self):
-                                            return {
-                                                '.pdf': 'application/pdf',
-                                                '.docx': 'application/vnd.openxmlformats-officedocument.wordprocessingml.document'
-                                            }.get(ext, 'application/octet-stream')
-                                    
-                                    file_obj = FileLikeObject(file_content)
-                                    text = extract_text_from_file(file_obj)
-
-                                if not text or len(text.strip()) < 10:
-                                    st.warning(f"⚠️ Файл `{fname}` не содержит текста или слишком короткий.")
-                                    continue
-                                
-                                # Классификация
-                                vector = vectorizer.transform([text])
-                                model = load_model(zip_model)
-                                pred = model.predict(vector)[0]
-                                confidence = model.predict_proba(vector)[0].max() if hasattr(model, 'predict_proba') else None
-                                
-                                # Определение класса с переводом
-                                if zip_model == "Clustering":
-                                    class_map = {
-                                        0: "Приказ",
-                                        1: "Постановление",
-                                        2: "Письмо",
-                                        3: "Общее"
-                                    }
-                                    russian_class = class_map.get(pred, "Общее")
-                                else:
-                                    english_class = pred if isinstance(pred, str) else "Miscellaneous"
-                                    russian_class = translate_class_name(english_class)
-                                
-                                # Сохраняем в БД
-                                classification_id = db.create_archive_classification(
-                                    id_user=user["id"],
-                                    filename=fname,
-                                    model_name=zip_model,
-                                    predicted_class=russian_class,
-                                    confidence=float(confidence) if confidence is not None else None,
-                                    id_folder_zip=zip_folder_id
-                                )
-                                
-                                if not classification_id:
-                                    continue
-                                
-                                # Копирование файла в соответствующую папку
-                                dst_dir = class_dirs.get(russian_class, class_dirs["Общее"])
-                                shutil.copy2(file_path, dst_dir)
-                                processed_files += 1
-                                
-                            except Exception as e:
-                                st.error(f"❌ Ошибка обработки файла `{fname}`: {str(e)}")
-
-                    # Обновляем счетчик файлов
-                    if processed_files > 0:
-                        db.update_zip_file_count(zip_folder_id, processed_files)
-
-                    # Создаем итоговый архив
-                    if processed_files > 0:
-                        result_zip_path = os.path.join(tmpdir, "classified.zip")
-                        with zipfile.ZipFile(result_zip_path, 'w') as zipf:
-                            for class_name, class_dir in class_dirs.items():
-                                if any(os.listdir(class_dir)):
-                                    for root, _, files in os.walk(class_dir):
-                                        for file in files:
-                                            file_path = os.path.join(root, file)
-                                            arcname = os.path.join(class_name, file)
-                                            zipf.write(file_path, arcname)
-
-                        with open(result_zip_path, "rb") as f:
-                            st.success(f"✅ Обработано файлов: {processed_files}")
-                            st.download_button(
-                                "📥 Скачать классифицированный архив",
-                                f,
-                                file_name="classified.zip",
-                                mime="application/zip",
-                                use_container_width=True
-                            )
-                    else:
-                        st.error("⚠️ Ни один файл не был обработан. Проверьте содержимое архива.")
+        try:
+            # Создаем запись об архиве
+            zip_folder_id = db.create_zip_folder(
+                user["id"],
+                zip_file.name,
+                0
+            )
+            
+            if not zip_folder_id:
+                st.error("❌ Не удалось создать запись об архиве в БД")
+                return
+
+            # Архив обрабатывается в фоне, прогресс отображается ниже
+            job_manager.submit(
+                zip_folder_id,
+                user["id"],
+                zip_file.name,
+                zip_file.getvalue(),
+                zip_model,
+                vectorizer
+            )
+            st.success(f"✅ Архив `{zip_file.name}` поставлен в очередь на обработку")
 
-            except Exception as e:
-                st.error(f"❌ Критическая ошибка при обработке архива: {str(e)}")
+        except Exception as e:
+            st.error(f"❌ Критическая ошибка при обработке архива: {str(e)}")
 
+    show_archive_jobs(user["id"])
 
     # Секция истории операций
     st.markdown("---")
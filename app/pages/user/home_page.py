@@ -125,11 +125,8 @@ def user_page(vectorizer):
                     # Получаем русское название класса
                     russian_class = translate_class(prediction)
                     
-                    if model_name == "Кластеризация":
-                        st.success(f"✅ Класс: **{russian_class}**")
-                    else:
-                        confidence_str = f"{confidence:.2%}" if confidence is not None else "не определена"
-                        st.success(f"✅ Класс: **{russian_class}** (уверенность: **{confidence_str}**)")
+                    confidence_str = f"{confidence:.2%}" if confidence is not None else "не определена"
+                    st.success(f"✅ Класс: **{russian_class}** (уверенность: **{confidence_str}**)")
                     
                     st.caption(f"🌐 Язык: **{lang}** &nbsp;&nbsp;|&nbsp;&nbsp;📏 Кол-во слов: **{wc}**")
                     
@@ -0,0 +1,434 @@
+import hashlib
+import io
+import json
+import multiprocessing
+import os
+import struct
+import threading
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+
+from config import Config
+from .file_utils import read_text
+from .ml_utils import CascadeStats, get_cascade, load_model, model_version, predict_batch, stored_confidence
+
+# Поддерживаемые типы файлов внутри архива
+ARCHIVE_FILE_TYPES = {
+    '.txt': 'text/plain',
+    '.pdf': 'application/pdf',
+    '.docx': 'application/vnd.openxmlformats-officedocument.wordprocessingml.document'
+}
+
+# Флаги заголовка файла zip: дескриптор данных после тела, имя в UTF-8
+_FLAG_DATA_DESCRIPTOR = 0x08
+_FLAG_UTF8 = 0x800
+
+# Папки-классы итогового архива
+CLASS_FOLDERS = ["Письмо", "Приказ", "Постановление", "Общее"]
+
+CLASS_TRANSLATION = {
+    "Order": "Приказ",
+    "Ordinance": "Постановление",
+    "Letters": "Письмо",
+    "Miscellaneous": "Общее"
+}
+
+
+class ArchiveFile(io.BytesIO):
+    """Файл из архива с интерфейсом загруженного файла Streamlit (name, type)"""
+
+    mode = 'rb'
+
+    def __init__(self, content, name):
+        super().__init__(content)
+        self.name = name
+        self.type = ARCHIVE_FILE_TYPES.get(os.path.splitext(name)[1].lower(), 'application/octet-stream')
+
+    def writable(self):
+        return False
+
+
+class ArchiveResult:
+    """Итог обработки архива"""
+
+    def __init__(self):
+        self.classified = []  # (имя файла, класс, уверенность)
+        self.skipped = []     # файлы без текста
+        self.errors = []      # (имя файла, текст ошибки)
+        self.reused = 0       # результаты, взятые из БД по отпечатку файла
+        self.escalated = 0    # каскад: документы, переданные второй модели
+        self.escalation_rate = 0.0
+        self.cascade_saved_seconds = None  # каскад: оценка сэкономленного времени
+        self.zip_path = None
+
+    @property
+    def processed(self):
+        return len(self.classified)
+
+
+class ArchiveCheckpoint:
+    """Журнал обработанных файлов архива: одна JSON-строка на файл, ключ - путь внутри архива.
+
+    Хранится в каталоге задания, т.е. привязан к id_folder_zip. Перезапущенное
+    задание пропускает файлы из журнала и не создает повторных записей в БД.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._file = None
+
+    def load(self):
+        """Словарь {путь файла в архиве: запись} для уже обработанных файлов"""
+        completed = {}
+        if not os.path.exists(self.path):
+            return completed
+        with open(self.path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    # Последняя строка могла не дописаться при падении процесса
+                    continue
+                completed[entry["member"]] = entry
+        return completed
+
+    def record(self, member, status, predicted_class=None, confidence=None):
+        if self._file is None:
+            self._file = open(self.path, "a", encoding="utf-8")
+            # Недописанная при падении строка не должна склеиться со следующей записью
+            if self._file.tell() > 0:
+                with open(self.path, "rb") as f:
+                    f.seek(-1, os.SEEK_END)
+                    if f.read(1) != b"\n":
+                        self._file.write("\n")
+        entry = {"member": member, "status": status, "class": predicted_class, "confidence": confidence}
+        self._file.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        self._file.flush()
+
+    def sync(self):
+        """Сбрасывает журнал на диск (вызывается после каждой пачки)"""
+        if self._file is not None:
+            os.fsync(self._file.fileno())
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+def _extract_member_text(name, content):
+    """Выполняется в процессе-воркере: (текст, None) или (None, текст ошибки).
+
+    st.error из воркера никуда не выводится, поэтому ошибка возвращается
+    родителю и попадает в ArchiveResult.errors.
+    """
+    try:
+        return read_text(ArchiveFile(content, name)), None
+    except Exception as e:
+        return None, f"Ошибка чтения файла: {e}"
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _get_pool():
+    """Общий пул процессов для извлечения текста (None, если воркеры отключены)"""
+    global _pool
+    if Config.ARCHIVE_WORKERS <= 0:
+        return None
+    with _pool_lock:
+        if _pool is None:
+            # spawn: сервер Streamlit многопоточный, fork из него небезопасен
+            _pool = ProcessPoolExecutor(
+                max_workers=Config.ARCHIVE_WORKERS,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+        return _pool
+
+
+def extract_texts(files):
+    """(текст, ошибка) для пар (имя, содержимое), параллельно; порядок результатов сохраняется"""
+    names = [name for name, _ in files]
+    contents = [content for _, content in files]
+    pool = _get_pool()
+    if pool is None:
+        return list(map(_extract_member_text, names, contents))
+    return list(pool.map(_extract_member_text, names, contents))
+
+
+def _unique_arcname(arcname, used):
+    """Не допускает одинаковых имен в итоговом архиве (файлы из разных подпапок)"""
+    base, ext = os.path.splitext(arcname)
+    candidate, n = arcname, 1
+    while candidate in used:
+        n += 1
+        candidate = f"{base} ({n}){ext}"
+    used.add(candidate)
+    return candidate
+
+
+def _copy_member(zin, zout, info, arcname):
+    """Переносит файл в итоговый архив сжатыми байтами исходного архива.
+
+    Данные не распаковываются и не сжимаются заново: копируется тело файла
+    из исходного архива с тем же методом сжатия и CRC. zipfile не умеет
+    записывать готовые сжатые данные, поэтому запись в zout повторяет
+    ZipFile.writestr без этапа сжатия.
+    """
+    zin.fp.seek(info.header_offset + 26)
+    name_length, extra_length = struct.unpack("<HH", zin.fp.read(4))
+    zin.fp.seek(info.header_offset + 30 + name_length + extra_length)
+    raw = zin.fp.read(info.compress_size)
+
+    out_info = zipfile.ZipInfo(arcname, date_time=info.date_time)
+    out_info.compress_type = info.compress_type
+    out_info.external_attr = info.external_attr
+    # Размеры и CRC известны заранее: дескриптор данных после тела не нужен
+    out_info.flag_bits = info.flag_bits & ~(_FLAG_DATA_DESCRIPTOR | _FLAG_UTF8)
+    out_info.CRC = info.CRC
+    out_info.compress_size = info.compress_size
+    out_info.file_size = info.file_size
+    zip64 = max(info.file_size, info.compress_size) > zipfile.ZIP64_LIMIT
+    with zout._lock:
+        out_info.header_offset = zout.fp.tell()
+        zout.fp.write(out_info.FileHeader(zip64))
+        zout.fp.write(raw)
+        zout.filelist.append(out_info)
+        zout.NameToInfo[out_info.filename] = out_info
+        zout.start_dir = zout.fp.tell()
+        zout._didModify = True
+
+
+def translate_prediction(pred, model_name):
+    """Название папки-класса для предсказания модели"""
+    if model_name == "Кластеризация":
+        class_map = {
+            0: "Приказ",
+            1: "Постановление",
+            2: "Письмо",
+            3: "Общее"
+        }
+        return class_map.get(pred, "Общее")
+    english_class = pred if isinstance(pred, str) else "Miscellaneous"
+    return CLASS_TRANSLATION.get(english_class, english_class)
+
+
+def _read_member(zin, info):
+    """(содержимое, SHA-256) файла архива: отпечаток считается при том же единственном чтении"""
+    digest = hashlib.sha256()
+    blocks = []
+    with zin.open(info) as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+            blocks.append(block)
+    return b"".join(blocks), digest.hexdigest()
+
+
+def _find_known(db, hashes, model_name, version):
+    """{отпечаток: (класс, уверенность, модель)} для файлов, уже классифицированных моделью"""
+    known = db.find_classifications_by_hash(hashes, model_name, version) if hashes else {}
+    return {content_hash: (cls, conf, model_name) for content_hash, (cls, conf) in known.items()}
+
+
+def _find_known_cascade(db, hashes, cascade, versions):
+    """Ранее полученные результаты для каскада.
+
+    Результат дешевой модели подходит, если его уверенность не ниже порога
+    каскада; иначе берется результат второй модели, если он есть.
+    """
+    cheap = _find_known(db, hashes, cascade.cheap_name, versions[cascade.cheap_name])
+    strong = _find_known(db, hashes, cascade.strong_name, versions[cascade.strong_name])
+    known = {}
+    for content_hash in hashes:
+        previous = cheap.get(content_hash)
+        if previous is not None and previous[1] is not None and previous[1] >= cascade.threshold:
+            known[content_hash] = previous
+        elif content_hash in strong:
+            known[content_hash] = strong[content_hash]
+    return known
+
+
+def classify_archive(zip_file, model_name, vectorizer, db, id_user, id_folder_zip, workdir,
+                     batch_size=None, progress=None, checkpoint=None):
+    """Классифицирует документы архива и собирает архив, разложенный по папкам-классам.
+
+    Файлы читаются прямо из загруженного архива (один раз, отпечаток
+    считается при том же чтении) и переносятся в итоговый сразу после
+    классификации сжатыми байтами, без распаковки на диск и повторного сжатия. Обработка идет пачками
+    в три этапа: извлечение текста в пуле процессов, классификация пачки
+    одной векторизацией, сохранение результатов в БД.
+
+    Для файлов, которые уже классифицировались той же версией модели
+    (совпадает SHA-256 содержимого), результат берется из БД без
+    извлечения текста и предсказания; известные результаты запрашиваются
+    одним запросом на пачку.
+
+    progress(done, total) вызывается по мере обработки файлов; результаты
+    пачки и счетчик count_files архива сохраняются одной транзакцией.
+
+    С checkpoint уже обработанные файлы не классифицируются повторно:
+    классифицированные переносятся в итоговый архив по сохраненному классу.
+
+    model_name может быть каскадом из CASCADES: тогда в model_used каждой
+    классификации сохраняется модель, которая приняла решение.
+    """
+    result = ArchiveResult()
+    cascade = get_cascade(model_name)
+    if cascade is not None:
+        cheap, strong = load_model(cascade.cheap_name), load_model(cascade.strong_name)
+        if cheap is None or strong is None:
+            return result
+        stages = (cascade.cheap_name, cascade.strong_name)
+        cascade_stats = CascadeStats()
+    else:
+        model = load_model(model_name)
+        if model is None:
+            return result
+        stages = (model_name,)
+    versions = {stage: model_version(stage) for stage in stages}
+
+    batch_size = batch_size or Config.ARCHIVE_BATCH_SIZE
+    zip_path = os.path.join(workdir, "classified.zip")
+    used_names = set()
+
+    with zipfile.ZipFile(zip_file, "r") as zin, zipfile.ZipFile(zip_path, "w") as zout:
+        # Файлы архива, пригодные для классификации
+        members = [
+            info for info in zin.infolist()
+            if not info.is_dir() and os.path.splitext(info.filename)[1].lower() in ARCHIVE_FILE_TYPES
+        ]
+        total = len(members)
+        done = 0
+
+        # Восстановление после перезапуска: файлы из журнала не обрабатываются заново
+        completed = checkpoint.load() if checkpoint else {}
+        if completed:
+            pending = []
+            for info in members:
+                entry = completed.get(info.filename)
+                if entry is None:
+                    pending.append(info)
+                    continue
+                fname = os.path.basename(info.filename)
+                if entry["status"] in ("classified", "reused"):
+                    folder = entry["class"] if entry["class"] in CLASS_FOLDERS else "Общее"
+                    _copy_member(zin, zout, info, _unique_arcname(f"{folder}/{fname}", used_names))
+                    result.classified.append((fname, entry["class"], entry["confidence"]))
+                    if entry["status"] == "reused":
+                        result.reused += 1
+                else:
+                    result.skipped.append(fname)
+                done += 1
+            members = pending
+            if result.processed:
+                db.update_zip_file_count(id_folder_zip, result.processed)
+            if progress:
+                progress(done, total)
+
+        hashes = {}
+        for start in range(0, len(members), batch_size):
+            chunk = []
+            for info in members[start:start + batch_size]:
+                content, hashes[info.filename] = _read_member(zin, info)
+                chunk.append((info, content))
+            # Уже известные результаты для файлов пачки - одним запросом
+            chunk_hashes = {hashes[info.filename] for info, _ in chunk}
+            if cascade is not None:
+                known = _find_known_cascade(db, chunk_hashes, cascade, versions)
+            else:
+                known = _find_known(db, chunk_hashes, model_name, versions[model_name])
+            # (info, содержимое, класс, уверенность, статус для журнала, модель)
+            ready = []
+            new = []
+            for info, content in chunk:
+                previous = known.get(hashes[info.filename])
+                # Повторно используется только результат модели: у файла все равно своя
+                # строка documents/classifications, так как она описывает эту загрузку
+                # (пользователь, архив, count_files, история и оценки), а найденная
+                # запись может принадлежать другому пользователю
+                if previous is not None:
+                    ready.append((info, content, previous[0], previous[1], "reused", previous[2]))
+                else:
+                    new.append((info, content))
+
+            # Этап 1: извлечение текста
+            texts = extract_texts([(os.path.basename(info.filename), content) for info, content in new])
+            batch = []
+            for (info, content), (text, error) in zip(new, texts):
+                if error is not None:
+                    # Без отметки в журнале: после перезапуска файл будет прочитан снова
+                    result.errors.append((os.path.basename(info.filename), error))
+                    done += 1
+                    if progress:
+                        progress(done, total)
+                elif not text or len(text.strip()) < 10:
+                    result.skipped.append(os.path.basename(info.filename))
+                    if checkpoint:
+                        checkpoint.record(info.filename, "skipped")
+                    done += 1
+                    if progress:
+                        progress(done, total)
+                else:
+                    batch.append((info, content, text))
+
+            # Этап 2: классификация всей пачки
+            if batch:
+                try:
+                    texts = [text for _, _, text in batch]
+                    if cascade is not None:
+                        predictions = cascade.predict_batch(cheap, strong, vectorizer, texts, batch_size, cascade_stats)
+                    else:
+                        predictions = [(model_name, pred, conf) for pred, conf in predict_batch(model, vectorizer, texts, batch_size)]
+                except Exception as e:
+                    result.errors.extend((os.path.basename(info.filename), str(e)) for info, _, _ in batch)
+                    done += len(batch)
+                    if progress:
+                        progress(done, total)
+                    predictions = []
+                for (info, content, _), (used, pred, conf) in zip(batch, predictions):
+                    confidence = float(conf) if conf is not None else None
+                    ready.append((info, content, translate_prediction(pred, used), confidence, "classified", used))
+            if not ready:
+                continue
+
+            # Этап 3: сохранение пачки в БД одной транзакцией и запись в итоговый архив
+            rows = [
+                (
+                    os.path.basename(info.filename), used, russian_class, stored_confidence(used, confidence),
+                    hashes[info.filename], versions[used]
+                )
+                for info, _, russian_class, confidence, _, used in ready
+            ]
+            classification_ids = db.create_archive_classifications(id_user, id_folder_zip, rows)
+            if classification_ids is None:
+                result.errors.extend((row[0], "не удалось сохранить результат в БД") for row in rows)
+            else:
+                for info, content, russian_class, confidence, status, _ in ready:
+                    fname = os.path.basename(info.filename)
+                    # Файл отмечается в журнале после фиксации транзакции
+                    if checkpoint:
+                        checkpoint.record(info.filename, status, russian_class, confidence)
+                    try:
+                        folder = russian_class if russian_class in CLASS_FOLDERS else "Общее"
+                        _copy_member(zin, zout, info, _unique_arcname(f"{folder}/{fname}", used_names))
+                        result.classified.append((fname, russian_class, confidence))
+                        if status == "reused":
+                            result.reused += 1
+                    except Exception as e:
+                        result.errors.append((fname, str(e)))
+                if checkpoint:
+                    checkpoint.sync()
+            done += len(ready)
+            if progress:
+                progress(done, total)
+
+    if result.processed:
+        result.zip_path = zip_path
+    if cascade is not None:
+        summary = cascade_stats.summary()
+        result.escalated = summary["escalated"]
+        result.escalation_rate = summary["escalation_rate"]
+        result.cascade_saved_seconds = summary["saved_seconds"]
+
+    return result
@@ -1,26 +1,87 @@
-from joblib import load
+import logging
+import threading
 from pathlib import Path
 import streamlit as st
+from .ml_utils import load_artifact
+from .model_registry import file_sha256, registry
 
-def load_vectorizer():
-    """Загрузка векторизатора с русской обработкой текста"""
-    try:
-        model_path = Path("/app/app/models/vectorizer.pkl")
-        
-        # Проверка существования файла
-        if not model_path.exists():
-            st.error(f"Файл векторизатора не найден: {model_path}")
-            raise FileNotFoundError(f"Файл векторизатора не найден: {model_path}")
-        
-        # Загрузка с обработкой русской кодировки
-        vectorizer = load(model_path)
-        
-        # Проверка работоспособности
-        test_text = "проверка русского текста"
-        _ = vectorizer.transform([test_text])
-        
-        return vectorizer
-        
-    except Exception as e:
-        st.error(f"Ошибка загрузки векторизатора: {str(e)}")
-        raise
\ No newline at end of file
+logger = logging.getLogger(__name__)
+
+VECTORIZER_PATH = Path("/app/app/models/vectorizer.pkl")
+
+
+class VectorizerHandle:
+    """Неизменяемая ссылка на общий для процесса векторизатор.
+
+    Наружу доступно только преобразование текста; transform не меняет
+    состояние векторизатора, поэтому один объект безопасно использовать
+    из всех сессий и рабочих потоков.
+    """
+
+    __slots__ = ("_vectorizer", "path")
+
+    def __init__(self, vectorizer, path):
+        object.__setattr__(self, "_vectorizer", vectorizer)
+        object.__setattr__(self, "path", path)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("VectorizerHandle доступен только для чтения")
+
+    def transform(self, raw_documents):
+        return self._vectorizer.transform(raw_documents)
+
+    def get_feature_names_out(self, input_features=None):
+        return self._vectorizer.get_feature_names_out(input_features)
+
+
+_handles = {}
+_handles_lock = threading.Lock()
+
+
+def _load_current(model_path):
+    """(векторизатор, путь): компактная версия (utils.compact_vectorizer), если она
+    собрана из текущего model_path, иначе сам model_path.
+
+    Компактная версия дает тот же результат и занимает меньше памяти.
+    """
+    compact_path = model_path.with_name("vectorizer_compact.pkl")
+    if compact_path.exists() and model_path.exists():
+        compact = load_artifact(compact_path)
+        if getattr(compact, "source_sha256", None) == file_sha256(str(model_path)):
+            return compact, compact_path
+        registry.evict(str(compact_path))
+        logger.warning("%s собран не из текущего %s и не используется, пересоберите его", compact_path, model_path)
+
+    # Проверка существования файла
+    if not model_path.exists():
+        st.error(f"Файл векторизатора не найден: {model_path}")
+        raise FileNotFoundError(f"Файл векторизатора не найден: {model_path}")
+    return load_artifact(model_path), model_path
+
+
+def load_vectorizer(model_path=None):
+    """Общий векторизатор процесса: загружается один раз, все сессии получают одну ссылку"""
+    model_path = Path(model_path or VECTORIZER_PATH)
+
+    handle = _handles.get(model_path)
+    if handle is not None:
+        return handle
+
+    with _handles_lock:
+        handle = _handles.get(model_path)
+        if handle is not None:
+            return handle
+        try:
+            # Загрузка через реестр моделей: один экземпляр на процесс, массивы через mmap
+            vectorizer, loaded_path = _load_current(model_path)
+
+            # Проверка работоспособности
+            test_text = "проверка русского текста"
+            _ = vectorizer.transform([test_text])
+
+            handle = _handles[model_path] = VectorizerHandle(vectorizer, str(loaded_path))
+            return handle
+
+        except Exception as e:
+            st.error(f"Ошибка загрузки векторизатора: {str(e)}")
+            raise
\ No newline at end of file
@@ -0,0 +1,106 @@
+"""Быстрое отнесение разреженных векторов TF-IDF к кластерам KMeans.
+
+Квадраты норм центроидов считаются один раз; для пачки документов
+расстояния до всех центроидов получаются одним произведением
+разреженной матрицы на плотную:
+
+    ||x - c||^2 = ||x||^2 - 2 x·c + ||c||^2
+
+Кроме номера кластера возвращается уверенность по расстояниям:
+1 - d1 / d2, где d1 и d2 - расстояния до ближайшего и второго по близости
+центроида (0 - документ на границе кластеров, ближе к 1 - у своего центроида).
+Сверка с KMeans.predict (из каталога app):
+
+    python -m utils.cluster_assign models/clasterisation.pkl
+"""
+import sys
+import threading
+import time
+import weakref
+
+import numpy as np
+import scipy.sparse as sp
+
+
+class ClusterAssigner:
+    """Замена обученного KMeans для predict с уверенностью по расстояниям"""
+
+    def __init__(self, kmeans):
+        self.cluster_centers_ = np.ascontiguousarray(kmeans.cluster_centers_, dtype=np.float64)
+        self.n_clusters = self.cluster_centers_.shape[0]
+        self.n_features_in_ = self.cluster_centers_.shape[1]
+        self._center_norms = (self.cluster_centers_ ** 2).sum(axis=1)
+
+    def distances(self, X):
+        """Расстояния от строк X до всех центроидов, (строки X, кластеры)"""
+        if sp.issparse(X):
+            X = sp.csr_matrix(X, dtype=np.float64)
+            row_norms = np.asarray(X.multiply(X).sum(axis=1)).ravel()
+        else:
+            X = np.asarray(X, dtype=np.float64)
+            row_norms = (X ** 2).sum(axis=1)
+        squared = row_norms[:, np.newaxis] - 2.0 * np.asarray(X @ self.cluster_centers_.T) + self._center_norms
+        return np.sqrt(np.maximum(squared, 0.0))
+
+    def predict_with_confidence(self, X):
+        """(номера кластеров, уверенность 1 - d1 / d2) для строк X"""
+        distances = self.distances(X)
+        labels = distances.argmin(axis=1)
+        if self.n_clusters < 2:
+            return labels, np.ones(labels.size)
+        nearest = np.partition(distances, 1, axis=1)[:, :2]
+        confidence = np.divide(
+            nearest[:, 0], nearest[:, 1], out=np.zeros(labels.size), where=nearest[:, 1] > 0
+        )
+        # Документ совпадает со всеми центроидами (d1 = d2 = 0): уверенности нет
+        confidence[nearest[:, 1] == 0] = 1.0
+        return labels, 1.0 - confidence
+
+    def predict(self, X):
+        return self.distances(X).argmin(axis=1)
+
+
+def is_kmeans(model):
+    return isinstance(model, ClusterAssigner) or type(model).__name__ in ("KMeans", "MiniBatchKMeans")
+
+
+_assigners = weakref.WeakKeyDictionary()
+_assigners_lock = threading.Lock()
+
+
+def cluster_assigner(kmeans):
+    """ClusterAssigner для загруженной модели KMeans, один на модель в процессе"""
+    if isinstance(kmeans, ClusterAssigner):
+        return kmeans
+    with _assigners_lock:
+        assigner = _assigners.get(kmeans)
+        if assigner is None:
+            assigner = _assigners[kmeans] = ClusterAssigner(kmeans)
+        return assigner
+
+
+if __name__ == "__main__":
+    import joblib
+    from sklearn.preprocessing import normalize
+
+    if len(sys.argv) < 2:
+        sys.exit("Использование: python -m utils.cluster_assign <clasterisation.pkl>")
+    kmeans = joblib.load(sys.argv[1])
+    assigner = ClusterAssigner(kmeans)
+    # Случайные разреженные векторы с l2-нормой, как у TF-IDF
+    X = normalize(sp.random(1024, assigner.n_features_in_, density=0.01, format="csr", random_state=0))
+
+    for size in (1, 32, 1024):
+        batch = X[:size]
+        timings = []
+        for predict in (kmeans.predict, assigner.predict):
+            predict(batch)
+            started = time.perf_counter()
+            for _ in range(20):
+                predict(batch)
+            timings.append((time.perf_counter() - started) / 20)
+        same = np.array_equal(kmeans.predict(batch), assigner.predict(batch))
+        print(
+            f"пачка {size}: KMeans.predict {timings[0] * 1000:.2f} мс, "
+            f"ClusterAssigner {timings[1] * 1000:.2f} мс, кластеры совпадают: {same}"
+        )
@@ -0,0 +1,146 @@
+"""Компактное представление обученного TfidfVectorizer.
+
+Словарь vocabulary_ (dict термин -> индекс) заменяется на:
+  - все термины одним массивом байт UTF-8 (_blob) и смещения терминов в ней (_offsets);
+  - отсортированный массив CRC32 терминов (_hashes) и индексы признаков в том же
+    порядке (_columns).
+Токен ищется двоичным поиском по хешу и затем сравнивается с термином побайтно,
+поэтому коллизии CRC32 не влияют на результат. Остальное (анализатор текста,
+TF-IDF преобразование) берется из исходного векторизатора, и transform дает
+ту же матрицу, что TfidfVectorizer.transform. В source_sha256 хранится SHA-256
+исходного pickle: load_vectorizer не использует компактную версию, собранную
+из другого файла.
+
+Конвертация (из каталога app):
+
+    python -m utils.compact_vectorizer models/vectorizer.pkl models/vectorizer_compact.pkl
+"""
+import copy
+import sys
+import zlib
+
+import joblib
+import numpy as np
+import scipy.sparse as sp
+from sklearn.base import clone
+
+from .model_registry import file_sha256
+
+
+class CompactTfidfVectorizer:
+    """Замена обученного TfidfVectorizer для transform с компактным словарем"""
+
+    def __init__(self, vectorizer, idf_dtype=np.float64, source_sha256=None):
+        self.source_sha256 = source_sha256
+        terms = [None] * len(vectorizer.vocabulary_)
+        for term, index in vectorizer.vocabulary_.items():
+            terms[index] = term
+        encoded = [term.encode("utf-8") for term in terms]
+
+        # Массивы numpy (а не bytes), чтобы их можно было открыть через mmap
+        self._blob = np.frombuffer(b"".join(encoded), dtype=np.uint8).copy()
+        self._offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum([len(term) for term in encoded], out=self._offsets[1:])
+        hashes = np.fromiter((zlib.crc32(term) for term in encoded), dtype=np.uint32, count=len(encoded))
+        order = np.argsort(hashes, kind="stable")
+        self._hashes = hashes[order]
+        self._columns = order.astype(np.int32)
+
+        # Необученная копия с теми же параметрами: анализатор строится без словаря
+        self._params = clone(vectorizer)
+        self._analyzer = self._params.build_analyzer()
+        self.dtype = vectorizer.dtype
+        self.n_features = len(encoded)
+
+        # float32 вдвое уменьшает idf_, но результат может отличаться в последних знаках
+        self._tfidf = copy.deepcopy(vectorizer._tfidf)
+        if idf_dtype != np.float64:
+            self._tfidf.idf_ = vectorizer.idf_.astype(idf_dtype)
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        # Анализатор - замыкание, он пересоздается при загрузке
+        del state["_analyzer"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._analyzer = self._params.build_analyzer()
+
+    @property
+    def idf_(self):
+        return self._tfidf.idf_
+
+    def _term(self, column):
+        return self._blob[self._offsets[column]:self._offsets[column + 1]].tobytes()
+
+    def _lookup(self, tokens):
+        """Индексы признаков для токенов из словаря (токены вне словаря отбрасываются)"""
+        if not tokens:
+            return np.empty(0, dtype=np.int32)
+        encoded = [token.encode("utf-8") for token in tokens]
+        hashes = np.fromiter((zlib.crc32(token) for token in encoded), dtype=np.uint32, count=len(encoded))
+        positions = np.searchsorted(self._hashes, hashes)
+        candidates = np.flatnonzero(
+            self._hashes[np.minimum(positions, len(self._hashes) - 1)] == hashes
+        )
+
+        columns = []
+        for i, position in zip(candidates.tolist(), positions[candidates].tolist()):
+            # Проверка термина; при совпадении хешей у нескольких терминов перебираем их
+            while position < len(self._hashes) and self._hashes[position] == hashes[i]:
+                column = int(self._columns[position])
+                if self._term(column) == encoded[i]:
+                    columns.append(column)
+                    break
+                position += 1
+        return np.asarray(columns, dtype=np.int32)
+
+    def transform(self, raw_documents):
+        """Матрица TF-IDF документов, как у исходного TfidfVectorizer.transform"""
+        if isinstance(raw_documents, str):
+            raise ValueError("Iterable over raw text documents expected, string object received.")
+
+        indices = []
+        counts = []
+        indptr = [0]
+        for document in raw_documents:
+            columns, n = np.unique(self._lookup(self._analyzer(document)), return_counts=True)
+            if self._params.binary:
+                n = np.ones_like(n)
+            indices.append(columns)
+            counts.append(n)
+            indptr.append(indptr[-1] + len(columns))
+
+        X = sp.csr_matrix(
+            (
+                np.concatenate(counts) if counts else np.empty(0),
+                np.concatenate(indices) if indices else np.empty(0, dtype=np.int32),
+                np.asarray(indptr, dtype=np.int64)
+            ),
+            shape=(len(indptr) - 1, self.n_features),
+            dtype=self.dtype
+        )
+        return self._tfidf.transform(X, copy=False)
+
+    def get_feature_names_out(self, input_features=None):
+        return np.asarray(
+            [self._term(column).decode("utf-8") for column in range(self.n_features)],
+            dtype=object
+        )
+
+
+def convert(source_path, target_path, idf_dtype=np.float64):
+    """Конвертирует сохраненный TfidfVectorizer в CompactTfidfVectorizer"""
+    compact = CompactTfidfVectorizer(
+        joblib.load(source_path), idf_dtype=idf_dtype, source_sha256=file_sha256(str(source_path))
+    )
+    joblib.dump(compact, target_path)
+    return compact
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 3:
+        sys.exit("Использование: python -m utils.compact_vectorizer <vectorizer.pkl> <vectorizer_compact.pkl> [--float32]")
+    convert(sys.argv[1], sys.argv[2], np.float32 if "--float32" in sys.argv[3:] else np.float64)
+    print(f"Сохранено: {sys.argv[2]}")
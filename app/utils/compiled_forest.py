@@ -0,0 +1,189 @@
+"""Компиляция случайного леса scikit-learn в плоские массивы узлов.
+
+Все деревья леса хранятся в общих массивах: признак и порог узла, индексы
+левого и правого потомков и нормированные значения листьев. Пачка документов
+проходит все деревья одновременно: на каждом шаге для всех пар
+(документ, дерево) выбирается следующий узел одной операцией numpy, без
+вызова predict_proba каждого дерева.
+
+Вычисления повторяют scikit-learn: X приводится к float32, переход влево при
+X[признак] <= порог, вероятности деревьев нормируются по листу и суммируются
+в том же порядке, поэтому predict_proba совпадает с исходной моделью.
+Экспорт в .npz (без pickle) и сверка (из каталога app):
+
+    python -m utils.compiled_forest
+"""
+import os
+import time
+from pathlib import Path
+
+import numpy as np
+
+# Отметка листа в children_left/children_right дерева scikit-learn
+TREE_LEAF = -1
+
+# Сколько строк разреженной матрицы переводится в плотную за раз
+DENSE_BATCH_SIZE = 256
+
+
+class CompiledForest:
+    """Случайный лес в виде массивов узлов с predict и predict_proba"""
+
+    def __init__(self, feature, threshold, left, right, value, roots, max_depth, n_features, classes):
+        self.classes_ = classes
+        self.n_estimators = roots.size
+        self.n_features_in_ = int(n_features)
+        self._roots = roots
+        self._max_depth = int(max_depth)
+        self._value = value
+        self._is_leaf = left == TREE_LEAF
+        # У листьев потомки указывают на сам лист: обход продолжается без ветвлений
+        nodes = np.arange(left.size, dtype=np.int64)
+        self._left = np.where(self._is_leaf, nodes, left)
+        self._right = np.where(self._is_leaf, nodes, right)
+        self._threshold = threshold
+        # Из X берутся только признаки, которые встречаются в узлах леса
+        self._features = np.unique(feature[~self._is_leaf])
+        self._column = np.where(self._is_leaf, 0, np.searchsorted(self._features, feature))
+        self._arrays = {
+            "feature": feature, "threshold": threshold, "left": left, "right": right,
+            "value": value, "roots": roots,
+            "max_depth": np.array(max_depth), "n_features": np.array(n_features), "classes": classes,
+        }
+
+    @classmethod
+    def from_sklearn(cls, forest):
+        """Компилирует обученный RandomForestClassifier (один выход)"""
+        if getattr(forest, "n_outputs_", 1) != 1:
+            raise ValueError("Поддерживаются только леса с одним выходом")
+        features, thresholds, lefts, rights, values, roots = [], [], [], [], [], []
+        offset = 0
+        max_depth = 0
+        for estimator in forest.estimators_:
+            tree = estimator.tree_
+            left = tree.children_left.astype(np.int64)
+            right = tree.children_right.astype(np.int64)
+            # Индексы потомков сдвигаются на начало дерева в общих массивах
+            lefts.append(np.where(left == TREE_LEAF, TREE_LEAF, left + offset))
+            rights.append(np.where(right == TREE_LEAF, TREE_LEAF, right + offset))
+            features.append(np.where(left == TREE_LEAF, 0, tree.feature).astype(np.int64))
+            thresholds.append(tree.threshold.astype(np.float64))
+
+            # Как в DecisionTreeClassifier.predict_proba: нормировка значений листа
+            value = tree.value[:, 0, :forest.n_classes_].astype(np.float64)
+            normalizer = value.sum(axis=1)[:, np.newaxis]
+            normalizer[normalizer == 0.0] = 1.0
+            values.append(value / normalizer)
+
+            roots.append(offset)
+            offset += tree.node_count
+            max_depth = max(max_depth, tree.max_depth)
+        return cls(
+            np.concatenate(features), np.concatenate(thresholds), np.concatenate(lefts), np.concatenate(rights),
+            np.ascontiguousarray(np.concatenate(values)), np.asarray(roots, dtype=np.int64), max_depth,
+            forest.n_features_in_, np.asarray(forest.classes_)
+        )
+
+    def _leaves(self, X):
+        """Индексы листьев, (строки X, деревья)"""
+        if hasattr(X, "tocsr"):
+            X = X.tocsr()[:, self._features].toarray()
+        else:
+            X = np.asarray(X)[:, self._features]
+        # Как в scikit-learn: сравнение значений float32 с порогами
+        X = X.astype(np.float32, copy=False)
+
+        nodes = np.repeat(self._roots[np.newaxis, :], X.shape[0], axis=0)
+        rows = np.arange(X.shape[0])[:, np.newaxis]
+        for _ in range(self._max_depth):
+            if self._is_leaf[nodes].all():
+                break
+            go_left = X[rows, self._column[nodes]] <= self._threshold[nodes]
+            nodes = np.where(go_left, self._left[nodes], self._right[nodes])
+        return nodes
+
+    def predict_proba(self, X):
+        n_samples = X.shape[0]
+        proba = np.zeros((n_samples, self.classes_.size), dtype=np.float64)
+        for start in range(0, n_samples, DENSE_BATCH_SIZE):
+            leaves = self._leaves(X[start:start + DENSE_BATCH_SIZE])
+            chunk = proba[start:start + DENSE_BATCH_SIZE]
+            # Суммирование по деревьям в том же порядке, что в RandomForestClassifier
+            for tree in range(self.n_estimators):
+                chunk += self._value[leaves[:, tree]]
+        proba /= self.n_estimators
+        return proba
+
+    def predict(self, X):
+        return self.classes_[self.predict_proba(X).argmax(axis=1)]
+
+    @property
+    def nbytes(self):
+        return sum(array.nbytes for array in self._arrays.values())
+
+
+def is_forest(model):
+    return isinstance(model, CompiledForest) or type(model).__name__ == "RandomForestClassifier"
+
+
+def export_forest(forest, path, source_sha256):
+    """Сохраняет скомпилированный лес в .npz (без pickle).
+
+    source_sha256 - хэш pickle, из которого загружен лес: по нему
+    utils.ml_utils.load_artifact отличает устаревший экспорт.
+    """
+    compiled = forest if isinstance(forest, CompiledForest) else CompiledForest.from_sklearn(forest)
+    arrays = dict(compiled._arrays)
+    if arrays["classes"].dtype == object:
+        arrays["classes"] = arrays["classes"].astype(str)
+    np.savez(path, source_sha256=np.array(source_sha256), **arrays)
+    return compiled
+
+
+def load_forest(path):
+    """Загружает лес, сохраненный export_forest"""
+    with np.load(path, allow_pickle=False) as data:
+        arrays = {name: data[name] for name in data.files if name != "source_sha256"}
+    if arrays["classes"].dtype.kind == "U":
+        # Метки как обычные str, как в classes_ моделей scikit-learn
+        arrays["classes"] = arrays["classes"].astype(object)
+    return CompiledForest(**arrays)
+
+
+def compare(forest, compiled, X):
+    """Сверка с исходным лесом: (совпадают ли предсказания, макс. отличие вероятностей)"""
+    same_predictions = bool(np.array_equal(forest.predict(X), compiled.predict(X)))
+    max_diff = float(np.abs(forest.predict_proba(X) - compiled.predict_proba(X)).max())
+    return same_predictions, max_diff
+
+
+if __name__ == "__main__":
+    import joblib
+    import scipy.sparse as sp
+    from sklearn.preprocessing import normalize
+
+    from utils.ml_utils import COMPILED_DIR, MODELS
+    from utils.model_registry import file_sha256
+
+    os.makedirs(COMPILED_DIR, exist_ok=True)
+    for name, path in MODELS.items():
+        started = time.perf_counter()
+        model = joblib.load(path)
+        pickle_seconds = time.perf_counter() - started
+        if type(model).__name__ != "RandomForestClassifier":
+            continue
+        target = Path(COMPILED_DIR) / (Path(path).stem + ".npz")
+        export_forest(model, target, file_sha256(path))
+
+        started = time.perf_counter()
+        compiled = load_forest(target)
+        npz_seconds = time.perf_counter() - started
+
+        # Случайные разреженные векторы с l2-нормой, как у TF-IDF
+        X = normalize(sp.random(500, model.n_features_in_, density=0.01, format="csr", random_state=0))
+        same, max_diff = compare(model, compiled, X)
+        print(
+            f"{name}: {target.name}, {compiled.n_estimators} деревьев, {compiled.nbytes / 2 ** 20:.1f} МБ, "
+            f"загрузка {pickle_seconds * 1000:.1f} мс -> {npz_seconds * 1000:.1f} мс, "
+            f"предсказания совпадают: {same}, макс. отличие: {max_diff:.2e}"
+        )
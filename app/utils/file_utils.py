@@ -2,24 +2,33 @@ import streamlit as st
 import pandas as pd
 
 
+class UnsupportedFileType(ValueError):
+    """Формат файла не поддерживается"""
+
+
+def read_text(uploaded_file):
+    """Текст документа; ошибки чтения не перехватываются (для процессов-воркеров без интерфейса)"""
+    if uploaded_file.type == "text/plain":
+        return str(uploaded_file.read(), "utf-8")
+    elif uploaded_file.type == "application/pdf":
+        from PyPDF2 import PdfReader
+        return "\n".join([page.extract_text() for page in PdfReader(uploaded_file).pages])
+    elif uploaded_file.type in ["application/vnd.openxmlformats-officedocument.wordprocessingml.document", "application/msword"]:
+        from docx import Document
+        return "\n".join([para.text for para in Document(uploaded_file).paragraphs])
+    raise UnsupportedFileType("Неподдерживаемый формат файла")
+
+
 # Обработка текстов документов, которые подаются в векторизатор
 def extract_text_from_file(uploaded_file):
     try:
-        if uploaded_file.type == "text/plain":
-            return str(uploaded_file.read(), "utf-8")
-        elif uploaded_file.type == "application/pdf":
-            from PyPDF2 import PdfReader
-            return "\n".join([page.extract_text() for page in PdfReader(uploaded_file).pages])
-        elif uploaded_file.type in ["application/vnd.openxmlformats-officedocument.wordprocessingml.document", "application/msword"]:
-            from docx import Document
-            return "\n".join([para.text for para in Document(uploaded_file).paragraphs])
-        else:
-            st.error("Неподдерживаемый формат файла")
-            return None
+        return read_text(uploaded_file)
+    except UnsupportedFileType as e:
+        st.error(str(e))
+        return None
     except Exception as e:
         st.error(f"Ошибка чтения файла: {e}")
-        return None
-    
+        return None    
     
 # Функция фильтрации истории классификаций
 def filter_history(df):
@@ -0,0 +1,335 @@
+import fcntl
+import json
+import os
+import shutil
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import streamlit as st
+
+from config import Config
+from database.db_operations import Database
+from .archive_utils import ArchiveCheckpoint, classify_archive
+from .ml_utils import get_cascade
+
+
+class JobLease:
+    """Право одного процесса на обработку задания: flock на файле в каталоге задания.
+
+    Каталог заданий может быть общим для нескольких процессов (реплики на
+    одном хосте). Блокировка держится все время обработки и снимается ОС при
+    завершении процесса, поэтому задание упавшего процесса может подхватить
+    другой, а задание живого процесса - нет.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._file = None
+
+    def acquire(self):
+        """Берет блокировку без ожидания; False, если задание обрабатывает другой процесс"""
+        f = open(self.path, "a")
+        try:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            f.close()
+            return False
+        self._file = f
+        return True
+
+    def release(self):
+        if self._file is not None:
+            fcntl.flock(self._file.fileno(), fcntl.LOCK_UN)
+            self._file.close()
+            self._file = None
+
+
+class ArchiveJob:
+    """Фоновое задание классификации архива; id совпадает с id записи folders_zip"""
+
+    def __init__(self, id_folder_zip, id_user, filename, model_name, workdir):
+        self.id = id_folder_zip
+        self.id_user = id_user
+        self.filename = filename
+        self.model_name = model_name
+        self.workdir = workdir
+        self.status = "queued"  # queued -> running -> done / failed
+        self.done = 0
+        self.total = 0
+        self.processed = 0
+        self.reused = 0
+        self.escalated = 0
+        self.escalation_rate = 0.0
+        self.cascade_saved_seconds = None
+        self.skipped = []
+        self.errors = []
+        self.zip_path = None
+        self.error = None
+        self.created_at = time.time()
+        self.finished_at = None
+
+    @property
+    def progress(self):
+        return self.done / self.total if self.total else 0.0
+
+    @property
+    def active(self):
+        return self.status in ("queued", "running")
+
+    @property
+    def source_path(self):
+        return os.path.join(self.workdir, "source.zip")
+
+    @property
+    def manifest_path(self):
+        return os.path.join(self.workdir, "job.json")
+
+    @property
+    def lease_path(self):
+        return os.path.join(self.workdir, "lease.lock")
+
+    def save(self):
+        """Сохраняет состояние задания в каталог задания (атомарно)"""
+        state = {
+            key: getattr(self, key)
+            for key in ("id", "id_user", "filename", "model_name", "status", "processed",
+                        "reused", "escalated", "escalation_rate", "cascade_saved_seconds", "skipped", "errors", "zip_path", "error", "created_at", "finished_at")
+        }
+        tmp_path = self.manifest_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(state, f, ensure_ascii=False)
+        os.replace(tmp_path, self.manifest_path)
+
+    @classmethod
+    def load(cls, workdir):
+        with open(os.path.join(workdir, "job.json"), encoding="utf-8") as f:
+            state = json.load(f)
+        job = cls(state["id"], state["id_user"], state["filename"], state["model_name"], workdir)
+        for key, value in state.items():
+            setattr(job, key, value)
+        job.errors = [tuple(error) for error in job.errors]
+        return job
+
+
+class ArchiveJobManager:
+    """Очередь заданий классификации архивов, общая для всех сессий процесса.
+
+    Архивы обрабатываются в рабочих потоках, поэтому обновление страницы
+    или закрытие вкладки не прерывает обработку, а результат можно скачать позже.
+    """
+
+    def __init__(self, jobs_dir=None, workers=None):
+        self.jobs_dir = jobs_dir or Config.ARCHIVE_JOBS_DIR
+        self.workers = workers or Config.ARCHIVE_JOB_WORKERS
+        self._jobs = {}
+        self._lock = threading.Lock()
+        self._executor = None
+        self._resumed = False
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="archive-job")
+            return self._executor
+
+    def submit(self, id_folder_zip, id_user, filename, zip_bytes, model_name, vectorizer):
+        """Ставит архив в очередь и возвращает id задания"""
+        self.cleanup()
+        workdir = os.path.join(self.jobs_dir, str(id_folder_zip))
+        os.makedirs(workdir, exist_ok=True)
+        job = ArchiveJob(id_folder_zip, id_user, filename, model_name, workdir)
+        # Блокировка берется до появления job.json, чтобы задание не подхватил другой процесс
+        lease = JobLease(job.lease_path)
+        if not lease.acquire():
+            raise RuntimeError(f"Задание №{id_folder_zip} уже обрабатывается другим процессом")
+        with open(job.source_path, "wb") as f:
+            f.write(zip_bytes)
+        job.save()
+        self._enqueue(job, vectorizer, lease)
+        return job.id
+
+    def _enqueue(self, job, vectorizer, lease):
+        with self._lock:
+            self._jobs[job.id] = job
+        self._get_executor().submit(self._run, job, vectorizer, lease)
+
+    def resume_pending(self, vectorizer):
+        """Один раз на процесс поднимает задания из каталога заданий.
+
+        Завершенные снова доступны для скачивания, незавершенные (процесс
+        упал во время обработки) продолжаются с места последней контрольной точки.
+        Задание продолжается, только если удалось взять его блокировку (JobLease):
+        задания, которые обрабатывает другой процесс, пропускаются.
+        """
+        with self._lock:
+            if self._resumed:
+                return
+            self._resumed = True
+        if not os.path.isdir(self.jobs_dir):
+            return
+
+        for name in os.listdir(self.jobs_dir):
+            workdir = os.path.join(self.jobs_dir, name)
+            if not os.path.exists(os.path.join(workdir, "job.json")):
+                continue
+            try:
+                job = ArchiveJob.load(workdir)
+            except (OSError, ValueError, KeyError):
+                continue
+            if job.id in self._jobs:
+                continue
+            if job.active and os.path.exists(job.source_path):
+                lease = JobLease(job.lease_path)
+                if not lease.acquire():
+                    continue
+                # Пока блокировку держал другой процесс, задание могло завершиться
+                try:
+                    job = ArchiveJob.load(workdir)
+                except (OSError, ValueError, KeyError):
+                    lease.release()
+                    continue
+                if not job.active or not os.path.exists(job.source_path):
+                    lease.release()
+                    with self._lock:
+                        self._jobs[job.id] = job
+                    continue
+                job.status = "queued"
+                self._enqueue(job, vectorizer, lease)
+            else:
+                with self._lock:
+                    self._jobs[job.id] = job
+
+    def _run(self, job, vectorizer, lease):
+        job.status = "running"
+        job.save()
+        # Подключения к БД берутся из общего пула процесса
+        db = Database()
+        checkpoint = ArchiveCheckpoint(os.path.join(job.workdir, "checkpoint.jsonl"))
+
+        def on_progress(done, total):
+            job.done, job.total = done, total
+
+        try:
+            result = classify_archive(
+                job.source_path,
+                job.model_name,
+                vectorizer,
+                db,
+                id_user=job.id_user,
+                id_folder_zip=job.id,
+                workdir=job.workdir,
+                progress=on_progress,
+                checkpoint=checkpoint
+            )
+            job.processed = result.processed
+            job.reused = result.reused
+            job.escalated = result.escalated
+            job.escalation_rate = result.escalation_rate
+            job.cascade_saved_seconds = result.cascade_saved_seconds
+            job.skipped = result.skipped
+            job.errors = result.errors
+            job.zip_path = result.zip_path
+            job.status = "done"
+        except Exception as e:
+            job.error = str(e)
+            job.status = "failed"
+        finally:
+            job.finished_at = time.time()
+            checkpoint.close()
+            job.save()
+            # Исходный архив больше не нужен для возобновления
+            if job.status == "done" and os.path.exists(job.source_path):
+                os.remove(job.source_path)
+            lease.release()
+
+    def get(self, job_id):
+        return self._jobs.get(job_id)
+
+    def list_for_user(self, id_user):
+        """Задания пользователя, новые сверху"""
+        jobs = [job for job in list(self._jobs.values()) if job.id_user == id_user]
+        return sorted(jobs, key=lambda job: job.created_at, reverse=True)
+
+    def cleanup(self):
+        """Удаляет завершенные задания старше ARCHIVE_JOB_TTL_HOURS вместе с файлами"""
+        deadline = time.time() - Config.ARCHIVE_JOB_TTL_HOURS * 3600
+        with self._lock:
+            expired = [job for job in self._jobs.values() if job.finished_at and job.finished_at < deadline]
+            for job in expired:
+                del self._jobs[job.id]
+        for job in expired:
+            shutil.rmtree(job.workdir, ignore_errors=True)
+
+
+# Единая очередь заданий на процесс
+job_manager = ArchiveJobManager()
+
+
+def _render_job(job):
+    with st.container(border=True):
+        st.markdown(f"**{job.filename}** · {job.model_name} · задание №{job.id}")
+        if job.active:
+            label = f"Обработано {job.done} из {job.total}" if job.total else "В очереди..."
+            st.progress(job.progress, text=label)
+        elif job.status == "failed":
+            st.error(f"❌ Критическая ошибка при обработке архива: {job.error}")
+        else:
+            for fname in job.skipped:
+                st.warning(f"⚠️ Файл `{fname}` не содержит текста или слишком короткий.")
+            for fname, error in job.errors:
+                st.error(f"❌ Ошибка обработки файла `{fname}`: {error}")
+
+            if job.zip_path and os.path.exists(job.zip_path):
+                st.success(f"✅ Обработано файлов: {job.processed}")
+                if job.reused:
+                    st.info(
+                        f"♻️ Взято из ранее классифицированных: {job.reused} из {job.processed} "
+                        f"({job.reused / job.processed * 100:.0f}%)"
+                    )
+                if get_cascade(job.model_name) is not None:
+                    saved = (
+                        f", сэкономлено ≈ {job.cascade_saved_seconds:.1f} с"
+                        if job.cascade_saved_seconds is not None else ""
+                    )
+                    st.info(
+                        f"🪜 Передано второй модели каскада: {job.escalated} "
+                        f"({job.escalation_rate * 100:.0f}% классифицированных){saved}"
+                    )
+                with open(job.zip_path, "rb") as f:
+                    st.download_button(
+                        "📥 Скачать классифицированный архив",
+                        f.read(),
+                        file_name="classified.zip",
+                        mime="application/zip",
+                        key=f"download_job_{job.id}",
+                        use_container_width=True
+                    )
+            else:
+                st.error("⚠️ Ни один файл не был обработан. Проверьте содержимое архива.")
+
+
+def _render_active_jobs(id_user):
+    jobs = [job for job in job_manager.list_for_user(id_user) if job.active]
+    if not jobs:
+        # Все задания завершились: перерисовываем страницу и прекращаем опрос
+        st.rerun()
+    for job in jobs:
+        _render_job(job)
+
+
+def show_archive_jobs(id_user):
+    """Панель заданий пользователя.
+
+    Опрос раз в 2 секунды перерисовывает только активные задания; завершенные
+    (с чтением итогового архива для кнопки скачивания) выводятся при обычном
+    выполнении страницы.
+    """
+    jobs = job_manager.list_for_user(id_user)
+    if not jobs:
+        return
+    if any(job.active for job in jobs):
+        st.fragment(_render_active_jobs, run_every=2)(id_user)
+    for job in jobs:
+        if not job.active:
+            _render_job(job)
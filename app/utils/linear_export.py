@@ -0,0 +1,238 @@
+"""Экспорт линейных моделей (наивный Байес, логистическая регрессия, LinearSVC)
+в массивы numpy (.npz, без pickle) и легкий оценщик для них.
+
+Оценщик повторяет вычисления scikit-learn: те же предсказания и вероятности,
+но загрузка занимает миллисекунды и не зависит от версии scikit-learn.
+Экспорт и сверка с исходными моделями (из каталога app):
+
+    python -m utils.linear_export
+"""
+import os
+import time
+from pathlib import Path
+
+import numpy as np
+from scipy.special import expit, logsumexp
+
+# Виды вероятностей: OvR-нормировка сигмоид (liblinear), softmax, без вероятностей
+PROBA_OVR = "ovr"
+PROBA_SOFTMAX = "softmax"
+PROBA_NONE = "none"
+
+
+class LinearScorer:
+    """Линейная модель: scores = X @ coef.T + intercept.
+
+    Методы *_from_scores принимают уже посчитанные scores, поэтому несколько
+    моделей можно оценить одним матричным произведением (FusedLinearModels).
+    """
+
+    def __init__(self, kind, coef, intercept, classes):
+        self.kind = kind
+        self.coef_ = coef
+        self.intercept_ = intercept
+        self.classes_ = classes
+        self.n_features_in_ = coef.shape[1]
+
+    def scores(self, X):
+        return np.asarray(X @ self.coef_.T + self.intercept_)
+
+    def decision_from_scores(self, scores):
+        # Бинарная модель с одной строкой коэффициентов, как в scikit-learn
+        return scores.ravel() if scores.shape[1] == 1 else scores
+
+    def predict_from_scores(self, scores):
+        scores = self.decision_from_scores(scores)
+        if scores.ndim == 1:
+            return self.classes_[(scores > 0).astype(int)]
+        return self.classes_[scores.argmax(axis=1)]
+
+    def decision_function(self, X):
+        return self.decision_from_scores(self.scores(X))
+
+    def predict(self, X):
+        return self.predict_from_scores(self.scores(X))
+
+
+class ProbabilisticLinearScorer(LinearScorer):
+    """Линейная модель с predict_proba"""
+
+    def __init__(self, kind, coef, intercept, classes, proba):
+        super().__init__(kind, coef, intercept, classes)
+        self.proba = proba
+
+    def proba_from_scores(self, scores):
+        scores = self.decision_from_scores(scores)
+        if self.proba == PROBA_OVR:
+            # LogisticRegression с liblinear: сигмоида по каждому классу и нормировка строки
+            prob = expit(scores)
+            if prob.ndim == 1:
+                return np.vstack([1 - prob, prob]).T
+            return prob / prob.sum(axis=1).reshape((prob.shape[0], -1))
+        if scores.ndim == 1:
+            scores = np.c_[-scores, scores]
+        if self.kind == "naive_bayes":
+            # MultinomialNB: exp(jll - logsumexp(jll))
+            return np.exp(scores - np.atleast_2d(logsumexp(scores, axis=1)).T)
+        scores = scores - scores.max(axis=1)[:, np.newaxis]
+        np.exp(scores, out=scores)
+        scores /= scores.sum(axis=1)[:, np.newaxis]
+        return scores
+
+    def predict_proba(self, X):
+        return self.proba_from_scores(self.scores(X))
+
+
+class NaiveBayesScorer(ProbabilisticLinearScorer):
+    """MultinomialNB: совместное логарифмическое правдоподобие, всегда по строке на класс"""
+
+    def decision_from_scores(self, scores):
+        return scores
+
+    def predict_from_scores(self, scores):
+        return self.classes_[scores.argmax(axis=1)]
+
+
+def _linear_parts(model):
+    """(вид, coef, intercept, вид вероятностей) для поддерживаемых моделей scikit-learn"""
+    name = type(model).__name__
+    if name == "MultinomialNB":
+        return "naive_bayes", model.feature_log_prob_, model.class_log_prior_, PROBA_SOFTMAX
+    if name == "LogisticRegression":
+        # Та же логика выбора OvR, что в LogisticRegression.predict_proba
+        multi_class = getattr(model, "multi_class", "auto")
+        ovr = multi_class in ("ovr", "warn") or (
+            multi_class in ("auto", "deprecated") and (model.classes_.size <= 2 or model.solver == "liblinear")
+        )
+        return "logistic", model.coef_, model.intercept_, PROBA_OVR if ovr else PROBA_SOFTMAX
+    if name == "LinearSVC":
+        return "svc", model.coef_, model.intercept_, PROBA_NONE
+    return None
+
+
+def is_linear(model):
+    return isinstance(model, LinearScorer) or _linear_parts(model) is not None
+
+
+def _make_scorer(kind, proba, coef, intercept, classes):
+    if kind == "naive_bayes":
+        return NaiveBayesScorer(kind, coef, intercept, classes, proba)
+    if proba == PROBA_NONE:
+        return LinearScorer(kind, coef, intercept, classes)
+    return ProbabilisticLinearScorer(kind, coef, intercept, classes, proba)
+
+
+def linear_scorer(model):
+    """Оценщик для линейной модели scikit-learn (или сам оценщик, если он уже загружен из .npz)"""
+    if isinstance(model, LinearScorer):
+        return model
+    kind, coef, intercept, proba = _linear_parts(model)
+    return _make_scorer(
+        kind, proba, np.asarray(coef, dtype=np.float64), np.asarray(intercept, dtype=np.float64),
+        np.asarray(model.classes_)
+    )
+
+
+class FusedLinearModels:
+    """Несколько линейных моделей, оцениваемых одним разреженным произведением.
+
+    Коэффициенты всех моделей сложены в одну матрицу; каждый элемент X @ W.T
+    считается так же, как в отдельной модели, поэтому результаты совпадают.
+    """
+
+    def __init__(self, scorers):
+        self.names = list(scorers)
+        self._scorers = [scorers[name] for name in self.names]
+        self._coef = np.ascontiguousarray(np.vstack([scorer.coef_ for scorer in self._scorers]))
+        self._intercept = np.concatenate([np.ravel(scorer.intercept_) for scorer in self._scorers])
+        bounds = np.cumsum([0] + [scorer.coef_.shape[0] for scorer in self._scorers])
+        self._slices = [slice(start, stop) for start, stop in zip(bounds[:-1], bounds[1:])]
+
+    def score(self, X):
+        """{имя модели: (предсказания, вероятности или None, decision_function или None)}"""
+        scores = np.asarray(X @ self._coef.T + self._intercept)
+        results = {}
+        for name, scorer, part in zip(self.names, self._scorers, self._slices):
+            model_scores = scores[:, part]
+            predictions = scorer.predict_from_scores(model_scores)
+            if isinstance(scorer, ProbabilisticLinearScorer):
+                results[name] = (predictions, scorer.proba_from_scores(model_scores), None)
+            else:
+                results[name] = (predictions, None, scorer.decision_from_scores(model_scores))
+        return results
+
+
+def export_linear(model, path, source_sha256):
+    """Сохраняет линейную модель в .npz (без pickle).
+
+    source_sha256 - хэш pickle, из которого загружена модель: по нему
+    utils.ml_utils.load_artifact отличает устаревший экспорт.
+    """
+    kind, coef, intercept, proba = _linear_parts(model)
+    classes = np.asarray(model.classes_)
+    if classes.dtype == object:
+        classes = classes.astype(str)
+    np.savez(
+        path,
+        kind=np.array(kind),
+        proba=np.array(proba),
+        coef=np.ascontiguousarray(coef, dtype=np.float64),
+        intercept=np.asarray(intercept, dtype=np.float64),
+        classes=classes,
+        source_sha256=np.array(source_sha256)
+    )
+
+
+def load_linear(path):
+    """Загружает оценщик, сохраненный export_linear"""
+    with np.load(path, allow_pickle=False) as data:
+        kind = str(data["kind"])
+        proba = str(data["proba"])
+        coef = data["coef"]
+        intercept = data["intercept"]
+        classes = data["classes"]
+    if classes.dtype.kind == "U":
+        # Метки как обычные str, как в classes_ моделей scikit-learn
+        classes = classes.astype(object)
+    return _make_scorer(kind, proba, coef, intercept, classes)
+
+
+def compare(model, scorer, X):
+    """Сверка оценщика с исходной моделью: (совпадают ли предсказания, макс. отличие вероятностей)"""
+    same_predictions = bool(np.array_equal(model.predict(X), scorer.predict(X)))
+    if hasattr(model, "predict_proba"):
+        max_diff = float(np.abs(model.predict_proba(X) - scorer.predict_proba(X)).max())
+    else:
+        max_diff = float(np.abs(model.decision_function(X) - scorer.decision_function(X)).max())
+    return same_predictions, max_diff
+
+
+if __name__ == "__main__":
+    import joblib
+    import scipy.sparse as sp
+    from sklearn.preprocessing import normalize
+
+    from utils.ml_utils import LINEAR_DIR, MODELS
+    from utils.model_registry import file_sha256
+
+    os.makedirs(LINEAR_DIR, exist_ok=True)
+    for name, path in MODELS.items():
+        started = time.perf_counter()
+        model = joblib.load(path)
+        pickle_seconds = time.perf_counter() - started
+        if not is_linear(model):
+            continue
+        target = Path(LINEAR_DIR) / (Path(path).stem + ".npz")
+        export_linear(model, target, file_sha256(path))
+
+        started = time.perf_counter()
+        scorer = load_linear(target)
+        npz_seconds = time.perf_counter() - started
+
+        # Случайные разреженные векторы с l2-нормой, как у TF-IDF
+        X = normalize(sp.random(500, scorer.n_features_in_, density=0.01, format="csr", random_state=0))
+        same, max_diff = compare(model, scorer, X)
+        print(
+            f"{name}: {target.name}, загрузка {pickle_seconds * 1000:.1f} мс -> {npz_seconds * 1000:.1f} мс, "
+            f"предсказания совпадают: {same}, макс. отличие: {max_diff:.2e}"
+        )
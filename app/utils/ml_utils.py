@@ -1,11 +1,23 @@
 import streamlit as st
 import joblib
+import logging
 import os
 from .file_utils import extract_text_from_file
+from .model_registry import ExportedArtifact, file_sha256, registry
+from .result_cache import content_key, result_cache
+from .linear_export import FusedLinearModels, is_linear, linear_scorer, load_linear
+from .compiled_forest import load_forest
+from .neighbor_index import build_index
+from .cluster_assign import ClusterAssigner, cluster_assigner, is_kmeans
 from langdetect import detect
 import numpy as np
 import os
+import threading
+import time
 from pathlib import Path
+from config import Config
+
+logger = logging.getLogger(__name__)
 
 BASE_DIR = Path(__file__).parent.resolve()  # Путь к папке со скриптом
 MODELS_DIR = Path("/app/app/models")  # Абсолютный путь в контейнере
@@ -26,6 +38,13 @@ MODELS = {
     "Кластеризация": str(MODELS_DIR / "clasterisation.pkl")
 }
 
+# Memory-mapped copies of the artifacts (see export_mmap_artifacts)
+MMAP_DIR = MODELS_DIR / "mmap"
+# Linear models exported as plain arrays (see utils.linear_export)
+LINEAR_DIR = MODELS_DIR / "linear"
+# Random forests compiled to node arrays (see utils.compiled_forest)
+COMPILED_DIR = MODELS_DIR / "compiled"
+
 # Model configurations for .zip archive classification
 MODELS_ZIP = {
     "Наивный Байес": str(MODELS_DIR / "naive_bayes.pkl"),
@@ -35,6 +54,12 @@ MODELS_ZIP = {
     "Кластеризация": str(MODELS_DIR / "clasterisation.pkl")
 }
 
+# Cascades for .zip archive classification: (cheap model, model for low-confidence documents)
+CASCADES = {
+    "Каскад: Наивный Байес → Случайный лес": ("Наивный Байес", "Случайный лес"),
+    "Каскад: Логистическая регрессия → SVC": ("Логистическая регрессия", "Метод опорных векторов (SVC)"),
+}
+
 class AnomalyAwareClassifier:
     """Classifier with integrated anomaly detection capability"""
     
@@ -44,11 +69,50 @@ class AnomalyAwareClassifier:
         self.clf = classifier
         self.vectorizer = vectorizer
         self.threshold = threshold
+        self._build_index()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        # The index is rebuilt on load, so pickles stay small and independent of it
+        state.pop("_index", None)
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._build_index()
+
+    def _build_index(self):
+        """Neighbour index over the KNN reference set, built once at load time"""
+        self._index = None
+        if Config.ANOMALY_INDEX_COMPONENTS > 0:
+            self._index = build_index(
+                self.knn,
+                n_components=Config.ANOMALY_INDEX_COMPONENTS,
+                n_candidates=Config.ANOMALY_INDEX_CANDIDATES
+            )
+
+    def nearest_distances(self, vectors):
+        """Distance from each row to its nearest reference document.
+
+        The index returns a real reference document, so its distance can only
+        overestimate the true one; rows the index puts above the threshold are
+        checked by brute force. Anomaly decisions therefore match a full scan.
+        """
+        if self._index is None:
+            return self.knn.kneighbors(vectors, n_neighbors=1)[0][:, 0]
+        distances, _ = self._index.query(vectors)
+        suspect = np.flatnonzero(distances > self.threshold)
+        if suspect.size:
+            distances[suspect] = self.knn.kneighbors(vectors[suspect], n_neighbors=1)[0][:, 0]
+        return distances
+
+    def is_anomaly_batch(self, vectors):
+        """Anomaly flag for every row of a vectorized batch"""
+        return self.nearest_distances(vectors) > self.threshold
 
     def is_anomaly(self, vector):
         """Check if sample is anomalous based on KNN distance threshold"""
-        distances, _ = self.knn.kneighbors(vector, n_neighbors=1)
-        return distances[0][0] > self.threshold
+        return bool(self.is_anomaly_batch(vector)[0])
     
     def predict(self, text):
         """Predict class for raw text input"""
@@ -57,12 +121,136 @@ class AnomalyAwareClassifier:
 
     def predict_vector(self, vector):
         """Predict class for vectorized text, returns ('Аномалия', '-') if anomalous"""
-        if self.is_anomaly(vector):
-            return "Аномалия", "-"
-        else:
-            label = self.clf.predict(vector)[0]
-            confidence = f"{self.clf.predict_proba(vector).max():.2f}" if hasattr(self.clf, "predict_proba") else "-"
-            return label, confidence
+        return self.predict_vector_batch(vector)[0]
+
+    def predict_vector_batch(self, vectors):
+        """(label, confidence) for every row of a vectorized batch, ('Аномалия', '-') for anomalies"""
+        results = [("Аномалия", "-")] * vectors.shape[0]
+        normal = np.flatnonzero(~self.is_anomaly_batch(vectors))
+        if normal.size:
+            rows = vectors[normal]
+            labels = self.clf.predict(rows)
+            if hasattr(self.clf, "predict_proba"):
+                confidences = [f"{value:.2f}" for value in self.clf.predict_proba(rows).max(axis=1)]
+            else:
+                confidences = ["-"] * normal.size
+            for i, label, confidence in zip(normal, labels, confidences):
+                results[i] = (label, confidence)
+        return results
+
+def _npz_source_sha256(path):
+    """SHA-256 of the source pickle stored in an .npz export, None for exports without it"""
+    with np.load(path, allow_pickle=False) as data:
+        return str(data["source_sha256"]) if "source_sha256" in data.files else None
+
+
+def _load_linear_export(path):
+    return ExportedArtifact(load_linear(path), _npz_source_sha256(path))
+
+
+def _load_forest_export(path):
+    return ExportedArtifact(load_forest(path), _npz_source_sha256(path))
+
+
+def _load_mmap_export(path):
+    payload = joblib.load(path, mmap_mode="r")
+    return ExportedArtifact(payload["artifact"], payload["source_sha256"])
+
+
+def _export_candidates(path):
+    """(export path, loader) pairs for an artifact, most preferred first.
+
+    The native export of a linear model (utils.linear_export) or a compiled
+    random forest (utils.compiled_forest) comes before the memory-mapped copy.
+    """
+    stem = Path(path).stem
+    candidates = []
+    if Config.LINEAR_EXPORT:
+        candidates.append((LINEAR_DIR / (stem + ".npz"), _load_linear_export))
+    if Config.COMPILED_FOREST:
+        candidates.append((COMPILED_DIR / (stem + ".npz"), _load_forest_export))
+    if Config.MODEL_MMAP:
+        candidates.append((MMAP_DIR / (stem + ".joblib"), _load_mmap_export))
+    return [(str(export_path), loader) for export_path, loader in candidates if export_path.exists()]
+
+
+def load_mmap(path):
+    """Load an artifact exported by export_mmap_artifacts with its numpy arrays memory-mapped read-only.
+
+    The OS page cache shares mapped arrays between all processes on the host.
+    Objects that copy their arrays on unpickling (e.g. the trees of a random
+    forest) still get private memory.
+    """
+    return _load_mmap_export(path).model
+
+
+# (export path, source pickle SHA-256) pairs already found to be built from another pickle
+_stale_exports = set()
+# Registry key (an export or the pickle itself) that load_artifact last served for each pickle
+_served = {}
+
+
+def load_artifact(path):
+    """Load a model or vectorizer once per process from the fastest available format.
+
+    Every export stores the SHA-256 of the pickle it was built from; an export
+    that does not match the current pickle is skipped with a warning, and the
+    pickle itself is loaded if no export matches. A loaded pickle is reloaded
+    once the file on disk changes.
+    """
+    path = str(path)
+    digest = file_sha256(path)
+    for export_path, loader in _export_candidates(path):
+        if (export_path, digest) in _stale_exports:
+            continue
+        loaded_from = registry.source_sha256(export_path)
+        if loaded_from is not None and loaded_from != digest:
+            # The pickle was replaced after the export was loaded; the export may have been rebuilt too
+            registry.evict(export_path)
+        model = registry.get(export_path, loader)
+        if registry.source_sha256(export_path) == digest:
+            _served[path] = export_path
+            return model
+        registry.evict(export_path)
+        _stale_exports.add((export_path, digest))
+        logger.warning("Экспорт %s собран не из текущего %s и не используется, выгрузите его заново", export_path, path)
+    loaded_from = registry.source_sha256(path)
+    if loaded_from is not None and loaded_from != digest:
+        registry.evict(path)
+    model = registry.get(path)
+    _served[path] = path
+    return model
+
+
+def artifact_version(path):
+    """Version of the artifact load_artifact serves for path: the start of its source pickle SHA-256.
+
+    Taken from the loaded registry record, so it describes the object that
+    actually classifies, not a pickle replaced after it was loaded.
+    """
+    path = str(path)
+    served = _served.get(path)
+    version = registry.version(served) if served is not None else None
+    if version is None:
+        load_artifact(path)
+        version = registry.version(_served[path])
+    return version
+
+
+def export_mmap_artifacts(paths, target_dir=MMAP_DIR):
+    """Re-save artifacts uncompressed so that joblib can memory-map their arrays.
+
+    The copy keeps the SHA-256 of its source so that load_artifact can detect
+    a copy left over from a replaced pickle.
+    """
+    os.makedirs(target_dir, exist_ok=True)
+    exported = []
+    for path in paths:
+        target = Path(target_dir) / (Path(path).stem + ".joblib")
+        joblib.dump({"source_sha256": file_sha256(path), "artifact": joblib.load(path)}, target)
+        exported.append(str(target))
+    return exported
+
 
 def load_model(model_name):
     """Load trained model from pickle file with validation checks"""
@@ -78,7 +266,8 @@ def load_model(model_name):
             
         # Make sure AnomalyAwareClassifier is available when unpickling
         global AnomalyAwareClassifier
-        model = joblib.load(model_path)
+        # Models are unpickled once per process and shared between sessions
+        model = load_artifact(model_path)
         
         # Special validation for anomaly detector
         if model_name == "Ансамбль моделей (детектор аномалий)":
@@ -88,6 +277,10 @@ def load_model(model_name):
         elif not hasattr(model, 'predict'):
             st.error(f"Модель {model_name} не поддерживает метод predict")
             return None
+
+        # KMeans is scored with precomputed centroid norms and a distance-based confidence
+        if is_kmeans(model):
+            model = cluster_assigner(model)
             
         return model
         
@@ -96,8 +289,319 @@ def load_model(model_name):
         return None
     
 
+def _predict_matrix(model, matrix):
+    """(prediction, confidence) for every row of a vectorized batch"""
+    if isinstance(model, ClusterAssigner):
+        return list(zip(*model.predict_with_confidence(matrix)))
+    if isinstance(model, AnomalyAwareClassifier):
+        return [
+            (label, float(confidence) if confidence != "-" else None)
+            for label, confidence in model.predict_vector_batch(matrix)
+        ]
+    if hasattr(model, "predict_proba"):
+        # One pass over the model: the class is the most probable one, as in predict
+        proba = model.predict_proba(matrix)
+        return list(zip(model.classes_[proba.argmax(axis=1)], proba.max(axis=1)))
+    if hasattr(model, "decision_function"):
+        # Same confidence as for a single document (e.g. LinearSVC)
+        return [_prediction_confidence(model.classes_, scores=scores) for scores in model.decision_function(matrix)]
+    return [(prediction, None) for prediction in model.predict(matrix)]
+
+
+def predict_batch(model, vectorizer, texts, batch_size=None):
+    """Vectorize and classify texts in chunks, returns (prediction, confidence) per text in input order"""
+    batch_size = batch_size or Config.ARCHIVE_BATCH_SIZE
+    results = []
+    for start in range(0, len(texts), batch_size):
+        # One sparse matrix and one predict call per chunk instead of per document
+        matrix = vectorizer.transform(texts[start:start + batch_size])
+        results.extend(_predict_matrix(model, matrix))
+    return results
+
+
+class CascadeStats:
+    """Counters and timings of a cascade: documents, escalations, time per stage"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.documents = 0
+        self.escalated = 0
+        self.cheap_seconds = 0.0
+        self.strong_seconds = 0.0
+
+    def add(self, documents, escalated, cheap_seconds, strong_seconds):
+        with self._lock:
+            self.documents += documents
+            self.escalated += escalated
+            self.cheap_seconds += cheap_seconds
+            self.strong_seconds += strong_seconds
+
+    def summary(self):
+        """Escalation rate and time saved against running the strong model on every document.
+
+        The strong model's time per document is estimated from the escalated
+        documents, so saved_seconds is None until something escalates.
+        """
+        with self._lock:
+            strong_per_document = self.strong_seconds / self.escalated if self.escalated else None
+            return {
+                "documents": self.documents,
+                "escalated": self.escalated,
+                "escalation_rate": self.escalated / self.documents if self.documents else 0.0,
+                "cheap_seconds": self.cheap_seconds,
+                "strong_seconds": self.strong_seconds,
+                "saved_seconds": (
+                    strong_per_document * self.documents - self.cheap_seconds - self.strong_seconds
+                    if strong_per_document is not None else None
+                ),
+            }
+
+
+class ModelCascade:
+    """Confidence-gated cascade of two models.
+
+    The cheap model (it must provide predict_proba) classifies every
+    document; documents whose confidence is below the threshold are
+    classified again by the strong model on the same vectors.
+
+    Cascades are offered for archives only: a single upload is classified
+    by the model the user picked, and the saving comes from running the
+    strong model once over the uncertain part of a whole chunk.
+    """
+
+    def __init__(self, name, cheap_name, strong_name, threshold=None):
+        self.name = name
+        self.cheap_name = cheap_name
+        self.strong_name = strong_name
+        self.threshold = Config.CASCADE_THRESHOLD if threshold is None else threshold
+        # Totals for the lifetime of the process
+        self.totals = CascadeStats()
+
+    def predict_batch(self, cheap, strong, vectorizer, texts, batch_size=None, stats=None):
+        """(deciding model name, prediction, confidence) per text in input order.
+
+        Counters go to the process totals and, if given, to stats (e.g. per archive).
+        """
+        batch_size = batch_size or Config.ARCHIVE_BATCH_SIZE
+        results = []
+        for start in range(0, len(texts), batch_size):
+            matrix = vectorizer.transform(texts[start:start + batch_size])
+
+            started = time.perf_counter()
+            proba = cheap.predict_proba(matrix)
+            confidences = proba.max(axis=1)
+            chunk = [
+                (self.cheap_name, prediction, confidence)
+                for prediction, confidence in zip(cheap.classes_[proba.argmax(axis=1)], confidences)
+            ]
+            cheap_seconds = time.perf_counter() - started
+
+            # Only uncertain documents reach the strong model
+            escalate = np.flatnonzero(confidences < self.threshold)
+            strong_seconds = 0.0
+            if escalate.size:
+                started = time.perf_counter()
+                for row, (prediction, confidence) in zip(escalate, _predict_matrix(strong, matrix[escalate])):
+                    chunk[row] = (self.strong_name, prediction, confidence)
+                strong_seconds = time.perf_counter() - started
+
+            for target in (self.totals, stats):
+                if target is not None:
+                    target.add(len(chunk), int(escalate.size), cheap_seconds, strong_seconds)
+            results.extend(chunk)
+        return results
+
+    def stats(self):
+        return {"name": self.name, "threshold": self.threshold, **self.totals.summary()}
+
+
+_cascades = {}
+_cascades_lock = threading.Lock()
+
+
+def get_cascade(name):
+    """Process-wide cascade by its name in CASCADES, None for plain models"""
+    if name not in CASCADES:
+        return None
+    with _cascades_lock:
+        cascade = _cascades.get(name)
+        if cascade is None:
+            cascade = _cascades[name] = ModelCascade(name, *CASCADES[name])
+        return cascade
+
+
+def cascade_stats():
+    """Statistics of the cascades used in this process"""
+    with _cascades_lock:
+        cascades = list(_cascades.values())
+    return [cascade.stats() for cascade in cascades]
+
+
+# Bumped when the way a model's output is turned into class and confidence changes,
+# so that stored and cached results of the old scoring are not reused
+SCORING_REVISIONS = {
+    "Кластеризация": 2,  # cluster folders and distance-based confidence
+}
+
+# Models whose confidence is a distance ratio, not a class probability: it is shown
+# to the user but stored as NULL, so that analytics average probabilities only
+DISTANCE_CONFIDENCE_MODELS = {"Кластеризация"}
+
+
+def stored_confidence(model_name, confidence):
+    """Confidence as stored with a classification, None for distance-based ones"""
+    if confidence is None or model_name in DISTANCE_CONFIDENCE_MODELS:
+        return None
+    return float(confidence)
+
+
+def model_version(model_name):
+    """Version of the model stored with its classifications, None for unknown models.
+
+    The start of the SHA-256 of the source pickle of the loaded model (see
+    artifact_version); exports are used only while they match the pickle, so
+    the version does not depend on which of them is loaded.
+    """
+    if model_name not in MODELS or not os.path.exists(MODELS[model_name]):
+        return None
+    try:
+        version = artifact_version(MODELS[model_name])
+    except Exception:
+        # Unloadable model: load_model reports the error
+        return None
+    revision = SCORING_REVISIONS.get(model_name)
+    return f"{version}.r{revision}" if revision else version
+
+
+def model_stats():
+    """registry.stats() where models show the version their classifications are stored with"""
+    names = {}
+    for name, path in MODELS.items():
+        if path in _served:
+            names.setdefault(_served[path], name)
+    stats = registry.stats()
+    for row in stats:
+        if row["path"] in names:
+            row["version"] = model_version(names[row["path"]])
+    return stats
+
+
+def document_fingerprint(uploaded_file, model_name):
+    """(content SHA-256, model version) stored with a classification.
+
+    Archive members get the same fingerprint, so an archive containing an
+    already classified file reuses the stored result.
+    """
+    content_hash, _, version = content_key(uploaded_file.getvalue(), model_name, model_version(model_name))
+    return content_hash, version
+
+
 def classify_document(uploaded_file, model_name, vectorizer):
-    """Classify document using specified model and return results"""
+    """Classify document using specified model and return results.
+
+    Results are cached by file content, model name and model version, so a
+    re-uploaded document is not extracted and classified again.
+    """
+    version = model_version(model_name)
+    if version is None:
+        return _classify_document(uploaded_file, model_name, vectorizer)
+
+    key = content_key(uploaded_file.getvalue(), model_name, version)
+    result = result_cache.get(key)
+    if result is None:
+        result = _classify_document(uploaded_file, model_name, vectorizer)
+        # Failed classifications are not cached so that they can be retried
+        if result[0] is not None:
+            result_cache.put(key, result)
+    return result
+
+
+def _prediction_confidence(classes, proba=None, scores=None):
+    """Class and confidence from one row of probabilities or decision scores"""
+    if proba is not None:
+        return classes[np.argmax(proba)], np.max(proba)
+    return classes[np.argmax(scores)], (scores.max() - scores.min()) / 10
+
+
+_fused = {}
+_fused_lock = threading.Lock()
+
+
+def _fused_linear_models(models):
+    """Stacked coefficient matrix of the linear models, built once per set of model versions"""
+    key = tuple((name, model_version(name)) for name in models)
+    with _fused_lock:
+        fused = _fused.get(key)
+        if fused is None:
+            fused = _fused[key] = FusedLinearModels({name: linear_scorer(model) for name, model in models.items()})
+        return fused
+
+
+def classify_all_models(uploaded_file, vectorizer, model_names=None):
+    """Classify a document with every model, extracting and vectorizing it once.
+
+    Linear models (NB, logistic regression, SVC) are scored together with one
+    sparse product over their stacked coefficients; the rest use the shared
+    vector. Returns a record with preview, word count, language and
+    results {model name: (prediction, confidence)}, or None if there is no text.
+    """
+    try:
+        text = extract_text_from_file(uploaded_file)
+        if not text or len(text.strip()) < 10:
+            return None
+        vector = vectorizer.transform([text])
+
+        models = {}
+        for name in model_names or MODELS:
+            model = load_model(name)
+            if model is not None:
+                models[name] = model
+        linear = {name: model for name, model in models.items() if is_linear(model)}
+
+        results = {}
+        if linear:
+            for name, (_, proba, scores) in _fused_linear_models(linear).score(vector).items():
+                classes = linear[name].classes_
+                if proba is not None:
+                    results[name] = _prediction_confidence(classes, proba=proba[0])
+                else:
+                    results[name] = _prediction_confidence(classes, scores=scores[0])
+
+        # Non-linear models share the same vector
+        for name, model in models.items():
+            if name in linear:
+                continue
+            if name == "Ансамбль моделей (детектор аномалий)":
+                label, conf_str = model.predict_vector(vector)
+                try:
+                    confidence = float(conf_str) if conf_str != "-" else None
+                except (ValueError, TypeError):
+                    confidence = None
+                results[name] = (label, confidence)
+            elif isinstance(model, ClusterAssigner):
+                labels, confidences = model.predict_with_confidence(vector)
+                results[name] = (labels[0], confidences[0])
+            elif hasattr(model, "predict_proba"):
+                results[name] = _prediction_confidence(model.classes_, proba=model.predict_proba(vector)[0])
+            elif hasattr(model, "decision_function"):
+                results[name] = _prediction_confidence(model.classes_, scores=model.decision_function(vector)[0])
+            else:
+                results[name] = (model.predict(vector)[0], None)
+
+        return {
+            "preview": text[:500],
+            "word_count": len(text.split()),
+            "language": detect(text) if len(text) > 50 else "Неизвестно",
+            # Same order as MODELS
+            "results": {name: results[name] for name in models},
+        }
+
+    except Exception as e:
+        st.error(f"Ошибка обработки документа: {str(e)}")
+        return None
+
+
+def _classify_document(uploaded_file, model_name, vectorizer):
     try:
         # Extract and validate text
         text = extract_text_from_file(uploaded_file)
@@ -122,23 +626,19 @@ def classify_document(uploaded_file, model_name, vectorizer):
                 confidence = float(conf_str) if conf_str != "-" else None
             except (ValueError, TypeError):
                 confidence = None
-        elif model_name == "Кластеризация":
-            prediction = model.predict(vector)[0]
-            confidence = None  # Clustering doesn't provide confidence scores
+        elif isinstance(model, ClusterAssigner):
+            labels, confidences = model.predict_with_confidence(vector)
+            # Relative distance to the nearest centroid versus the second nearest one
+            prediction, confidence = labels[0], confidences[0]
         else:
             try:
                 # Try different prediction methods
                 if hasattr(model, "predict_proba"):
-                    proba = model.predict_proba(vector)[0]
-                    prediction = model.classes_[np.argmax(proba)]
-                    confidence = np.max(proba)
+                    prediction, confidence = _prediction_confidence(model.classes_, proba=model.predict_proba(vector)[0])
                 elif hasattr(model, "decision_function"):
-                    scores = model.decision_function(vector)[0]
-                    prediction = model.classes_[np.argmax(scores)]
-                    confidence = (scores.max() - scores.min()) / 10
+                    prediction, confidence = _prediction_confidence(model.classes_, scores=model.decision_function(vector)[0])
                 else:
-                    prediction = model.predict(vector)[0]
-                    confidence = None
+                    prediction, confidence = model.predict(vector)[0], None
             except Exception as e:
                 st.error(f"Ошибка предсказания: {str(e)}")
                 return None, None, text[:500], len(text.split()), lang
@@ -147,4 +647,11 @@ def classify_document(uploaded_file, model_name, vectorizer):
     
     except Exception as e:
         st.error(f"Ошибка обработки документа: {str(e)}")
-        return None, None, text[:500] if 'text' in locals() else "", 0, "Неизвестно"
\ No newline at end of file
+        return None, None, text[:500] if 'text' in locals() else "", 0, "Неизвестно"
+
+
+if __name__ == "__main__":
+    # python -m utils.ml_utils: export memory-mapped copies of all models and vectorizers
+    vectorizers = [p for p in (MODELS_DIR / "vectorizer.pkl", MODELS_DIR / "vectorizer_compact.pkl") if p.exists()]
+    for exported in export_mmap_artifacts(list(dict.fromkeys(MODELS.values())) + [str(p) for p in vectorizers]):
+        print(exported)
@@ -0,0 +1,174 @@
+import hashlib
+import logging
+import os
+import threading
+import time
+from typing import NamedTuple
+
+import joblib
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+def _estimate_nbytes(obj, seen=None):
+    """Приблизительный объем памяти модели: сумма numpy-массивов во вложенных атрибутах"""
+    if seen is None:
+        seen = set()
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+
+    if isinstance(obj, np.ndarray):
+        return obj.nbytes
+    # Разреженные матрицы scipy
+    if all(hasattr(obj, attr) for attr in ("data", "indices", "indptr")):
+        return sum(_estimate_nbytes(getattr(obj, attr), seen) for attr in ("data", "indices", "indptr"))
+    if isinstance(obj, dict):
+        return sum(_estimate_nbytes(k, seen) + _estimate_nbytes(v, seen) for k, v in obj.items())
+    if isinstance(obj, (list, tuple, set, frozenset)):
+        return sum(_estimate_nbytes(item, seen) for item in obj)
+    if isinstance(obj, (str, bytes, int, float, bool)) or obj is None:
+        return 0
+    if hasattr(obj, "__dict__"):
+        return _estimate_nbytes(vars(obj), seen)
+    # Cython-объекты (например, sklearn Tree) отдают массивы через __getstate__
+    try:
+        state = obj.__getstate__()
+    except Exception:
+        return 0
+    return _estimate_nbytes(state, seen) if isinstance(state, dict) else 0
+
+
+_digests = {}
+_digests_lock = threading.Lock()
+
+
+def file_sha256(path):
+    """SHA-256 файла (hex), None если файла нет.
+
+    Хэш пересчитывается, только когда меняются размер или время изменения файла.
+    """
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    key = (stat.st_size, stat.st_mtime_ns)
+    cached = _digests.get(path)
+    if cached is not None and cached[0] == key:
+        return cached[1]
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    with _digests_lock:
+        _digests[path] = (key, digest.hexdigest())
+    return digest.hexdigest()
+
+
+class ExportedArtifact(NamedTuple):
+    """Результат загрузчика экспорта: модель и SHA-256 pickle, из которого собран экспорт"""
+
+    model: object
+    source_sha256: str | None
+
+
+class ModelRecord:
+    """Загруженная модель и статистика ее загрузки.
+
+    source_sha256 - SHA-256 pickle, из которого получена модель (для экспорта -
+    исходного pickle), version - его начало.
+    """
+
+    def __init__(self, path, model, load_seconds, nbytes, source_sha256=None):
+        self.path = path
+        self.model = model
+        self.load_seconds = load_seconds
+        self.nbytes = nbytes
+        self.source_sha256 = source_sha256
+        self.version = source_sha256[:16] if source_sha256 else None
+        self.loaded_at = time.time()
+
+
+class ModelRegistry:
+    """Потокобезопасный реестр моделей, общий для всех сессий Streamlit в процессе.
+
+    Каждый файл загружается один раз; блокировка на каждый путь гарантирует,
+    что два потока не будут распаковывать одну и ту же модель одновременно.
+    """
+
+    def __init__(self, loader=joblib.load):
+        self._loader = loader
+        self._records = {}
+        self._locks = {}
+        self._guard = threading.Lock()
+
+    def _lock_for(self, path):
+        with self._guard:
+            lock = self._locks.get(path)
+            if lock is None:
+                lock = self._locks[path] = threading.Lock()
+            return lock
+
+    def get(self, path, loader=None):
+        """Возвращает модель по пути к файлу, загружая ее при первом обращении.
+
+        loader заменяет загрузчик реестра для этого файла (например, загрузку через mmap);
+        если он возвращает ExportedArtifact, в записи сохраняется хэш исходного pickle,
+        иначе - хэш самого файла.
+        """
+        record = self._records.get(path)
+        if record is not None:
+            return record.model
+
+        with self._lock_for(path):
+            # Повторная проверка: модель могла загрузить другая сессия, пока мы ждали
+            record = self._records.get(path)
+            if record is None:
+                # Хэш до загрузки: если файл заменят во время загрузки, запись не совпадет
+                # с новым файлом и будет загружена заново
+                source_sha256 = file_sha256(path)
+                started = time.perf_counter()
+                model = (loader or self._loader)(path)
+                elapsed = time.perf_counter() - started
+                if isinstance(model, ExportedArtifact):
+                    model, source_sha256 = model
+                record = ModelRecord(path, model, elapsed, _estimate_nbytes(model), source_sha256)
+                self._records[path] = record
+                logger.info(
+                    "Модель %s загружена за %.3f с (~%.1f МБ)",
+                    path, elapsed, record.nbytes / 1024 / 1024
+                )
+            return record.model
+
+    def version(self, path):
+        """Версия загруженной модели, None если модель не загружена"""
+        record = self._records.get(path)
+        return record.version if record is not None else None
+
+    def source_sha256(self, path):
+        """SHA-256 pickle, из которого получена загруженная модель, None если она не загружена"""
+        record = self._records.get(path)
+        return record.source_sha256 if record is not None else None
+
+    def evict(self, path):
+        """Удаляет модель из реестра; следующий get загрузит ее заново"""
+        with self._lock_for(path):
+            self._records.pop(path, None)
+
+    def stats(self):
+        """Время загрузки и занимаемая память по каждой загруженной модели"""
+        return [
+            {
+                "path": record.path,
+                "load_seconds": round(record.load_seconds, 4),
+                "memory_mb": round(record.nbytes / 1024 / 1024, 2),
+                "version": record.version,
+                "loaded_at": record.loaded_at,
+            }
+            for record in list(self._records.values())
+        ]
+
+
+# Единый реестр на процесс
+registry = ModelRegistry()
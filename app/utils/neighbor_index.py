@@ -0,0 +1,105 @@
+"""Индекс ближайших соседей для разреженных векторов TF-IDF.
+
+Опорные документы один раз проецируются в пространство меньшей размерности
+(TruncatedSVD). Для пачки запросов кандидаты выбираются одним плотным
+произведением в этом пространстве, затем расстояния до кандидатов
+пересчитываются точно по исходным разреженным векторам. Найденный сосед -
+реальный опорный документ, поэтому его расстояние не меньше расстояния до
+истинного ближайшего соседа.
+"""
+import numpy as np
+import scipy.sparse as sp
+from sklearn.decomposition import TruncatedSVD
+
+# На небольших наборах полный перебор быстрее построения индекса
+MIN_INDEX_SIZE = 1000
+
+# Сколько запросов оценивается одним произведением (ограничивает память под матрицу оценок)
+QUERY_BATCH_SIZE = 256
+
+
+def _squared_norms(X):
+    return np.asarray(X.multiply(X).sum(axis=1)).ravel()
+
+
+class NeighborIndex:
+    """Приближенный поиск одного ближайшего соседа с точной переоценкой кандидатов"""
+
+    def __init__(self, X, metric="euclidean", n_components=128, n_candidates=32, random_state=0):
+        if metric not in ("euclidean", "cosine"):
+            raise ValueError(f"Неподдерживаемая метрика: {metric}")
+        self.metric = metric
+        self.n_candidates = min(n_candidates, X.shape[0])
+        self._X = sp.csr_matrix(X, dtype=np.float64)
+        self._norms = _squared_norms(self._X)
+        if metric == "cosine":
+            self._norms = np.sqrt(self._norms)
+
+        svd = TruncatedSVD(n_components=min(n_components, X.shape[1] - 1), random_state=random_state)
+        self._reduced = svd.fit_transform(self._X).astype(np.float32)
+        self._components = np.ascontiguousarray(svd.components_.T, dtype=np.float32)
+        if metric == "cosine":
+            # Для косинусной метрики кандидаты выбираются по углу и в сниженном пространстве
+            lengths = np.linalg.norm(self._reduced, axis=1)
+            lengths[lengths == 0] = 1.0
+            self._reduced /= lengths[:, np.newaxis]
+        self._reduced_norms = (self._reduced ** 2).sum(axis=1)
+
+    def __len__(self):
+        return self._X.shape[0]
+
+    def _candidates(self, Q):
+        """Индексы кандидатов, (строки Q, n_candidates)"""
+        reduced = np.asarray(Q @ self._components, dtype=np.float32)
+        if self.metric == "cosine":
+            lengths = np.linalg.norm(reduced, axis=1)
+            lengths[lengths == 0] = 1.0
+            reduced /= lengths[:, np.newaxis]
+        # Квадрат расстояния без слагаемого запроса: для выбора кандидатов оно не нужно
+        scores = self._reduced_norms - 2.0 * (reduced @ self._reduced.T)
+        if self.n_candidates >= scores.shape[1]:
+            return np.broadcast_to(np.arange(scores.shape[1]), scores.shape)
+        return np.argpartition(scores, self.n_candidates - 1, axis=1)[:, :self.n_candidates]
+
+    def _exact(self, Q, candidates):
+        """Точные расстояния от строк Q до их кандидатов"""
+        rows = np.repeat(np.arange(Q.shape[0]), candidates.shape[1])
+        dots = np.asarray(self._X[candidates.ravel()].multiply(Q[rows]).sum(axis=1)).reshape(candidates.shape)
+        if self.metric == "cosine":
+            lengths = np.sqrt(_squared_norms(Q))[:, np.newaxis] * self._norms[candidates]
+            similarity = np.divide(dots, lengths, out=np.zeros_like(dots), where=lengths > 0)
+            return 1.0 - similarity
+        distances = _squared_norms(Q)[:, np.newaxis] - 2.0 * dots + self._norms[candidates]
+        return np.sqrt(np.maximum(distances, 0.0))
+
+    def query(self, Q):
+        """(расстояния, индексы) ближайшего найденного соседа для каждой строки Q"""
+        Q = sp.csr_matrix(Q, dtype=np.float64)
+        distances = np.empty(Q.shape[0])
+        indices = np.empty(Q.shape[0], dtype=np.int64)
+        for start in range(0, Q.shape[0], QUERY_BATCH_SIZE):
+            chunk = Q[start:start + QUERY_BATCH_SIZE]
+            candidates = self._candidates(chunk)
+            exact = self._exact(chunk, candidates)
+            best = exact.argmin(axis=1)
+            rows = np.arange(chunk.shape[0])
+            distances[start:start + chunk.shape[0]] = exact[rows, best]
+            indices[start:start + chunk.shape[0]] = candidates[rows, best]
+        return distances, indices
+
+
+def build_index(knn, n_components=128, n_candidates=32):
+    """Индекс по опорному набору обученной модели соседей scikit-learn.
+
+    None, если набор слишком мал или метрика модели не поддерживается:
+    тогда поиск остается за knn.kneighbors.
+    """
+    X = getattr(knn, "_fit_X", None)
+    if X is None or not sp.issparse(X) or X.shape[0] < MIN_INDEX_SIZE:
+        return None
+    metric = getattr(knn, "effective_metric_", None)
+    if metric == "minkowski" and getattr(knn, "effective_metric_params_", {}).get("p", 2) == 2:
+        metric = "euclidean"
+    if metric not in ("euclidean", "cosine"):
+        return None
+    return NeighborIndex(X, metric=metric, n_components=n_components, n_candidates=n_candidates)
@@ -0,0 +1,73 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from config import Config
+
+
+def content_key(content, model_name, model_version):
+    """Ключ кэша: SHA-256 содержимого файла, модель и версия модели"""
+    return hashlib.sha256(content).hexdigest(), model_name, model_version
+
+
+class ResultCache:
+    """Ограниченный LRU-кэш результатов классификации с временем жизни записей.
+
+    Общий для всех сессий процесса: повторно загруженный документ не
+    извлекается и не классифицируется заново, пока запись не вытеснена
+    или не устарела.
+    """
+
+    def __init__(self, maxsize=512, ttl=3600.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._items = OrderedDict()  # ключ -> (время записи, результат)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        """Результат по ключу или None"""
+        with self._lock:
+            item = self._items.get(key)
+            if item is not None and time.monotonic() - item[0] > self.ttl:
+                del self._items[key]
+                item = None
+            if item is None:
+                self.misses += 1
+                return None
+            self._items.move_to_end(key)
+            self.hits += 1
+            return item[1]
+
+    def put(self, key, value):
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._items[key] = (time.monotonic(), value)
+            self._items.move_to_end(key)
+            while len(self._items) > self.maxsize:
+                self._items.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._items),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+
+# Единый кэш результатов на процесс
+result_cache = ResultCache(maxsize=Config.RESULT_CACHE_SIZE, ttl=Config.RESULT_CACHE_TTL_SECONDS)
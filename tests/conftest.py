@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# Модули приложения импортируются как в самом приложении: из каталога app
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "app"))
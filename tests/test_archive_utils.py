@@ -0,0 +1,154 @@
+import hashlib
+import io
+import os
+import zipfile
+
+from config import Config
+from utils import archive_utils
+from utils.archive_utils import (
+    ArchiveCheckpoint, _copy_member, _extract_member_text, _read_member, classify_archive, extract_texts
+)
+
+
+def test_worker_returns_text():
+    assert _extract_member_text("a.txt", "Приказ о назначении".encode("utf-8")) == ("Приказ о назначении", None)
+
+
+def test_worker_returns_read_errors_instead_of_empty_text():
+    text, error = _extract_member_text("broken.pdf", b"not a pdf")
+    assert text is None
+    assert error.startswith("Ошибка чтения файла")
+
+    text, error = _extract_member_text("scan.docx", b"\x00\x01")
+    assert text is None and error
+
+
+def test_texts_keep_order_of_files():
+    files = [("a.txt", "первый документ".encode("utf-8")), ("b.pdf", b"%PDF-broken"), ("c.txt", b"third")]
+    results = extract_texts(files)
+    assert [text for text, _ in results] == ["первый документ", None, "third"]
+    assert [error is None for _, error in results] == [True, False, True]
+
+
+def _source_archive():
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w") as zf:
+        zf.writestr("docs/приказ.txt", "Приказ о назначении " * 200, compress_type=zipfile.ZIP_DEFLATED)
+        zf.writestr("letter.txt", b"stored letter", compress_type=zipfile.ZIP_STORED)
+        # Запись потоком: размеры и CRC в дескрипторе данных после тела файла
+        with zf.open("stream.txt", "w") as f:
+            f.write(b"streamed " * 500)
+    buffer.seek(0)
+    return buffer
+
+
+def test_member_is_hashed_during_the_single_read():
+    with zipfile.ZipFile(_source_archive()) as zin:
+        info = zin.getinfo("docs/приказ.txt")
+        content, digest = _read_member(zin, info)
+    assert content == ("Приказ о назначении " * 200).encode("utf-8")
+    assert digest == hashlib.sha256(content).hexdigest()
+
+
+def test_members_are_copied_without_recompression():
+    source = _source_archive()
+    output = io.BytesIO()
+    with zipfile.ZipFile(source) as zin, zipfile.ZipFile(output, "w") as zout:
+        for info in zin.infolist():
+            _copy_member(zin, zout, info, "Приказ/" + os.path.basename(info.filename))
+        expected = {os.path.basename(info.filename): (zin.read(info), info.compress_type, info.compress_size)
+                    for info in zin.infolist()}
+
+    output.seek(0)
+    with zipfile.ZipFile(output) as copied:
+        assert copied.testzip() is None
+        for info in copied.infolist():
+            content, compress_type, compress_size = expected[os.path.basename(info.filename)]
+            assert info.filename.startswith("Приказ/")
+            assert copied.read(info) == content
+            assert (info.compress_type, info.compress_size) == (compress_type, compress_size)
+
+
+class FakeArchiveDatabase:
+    def __init__(self):
+        self.rows = []
+        self.counts = []
+
+    def find_classifications_by_hash(self, hashes, model_name, version):
+        return {}
+
+    def create_archive_classifications(self, id_user, id_folder_zip, rows):
+        self.rows.extend(rows)
+        return list(range(len(self.rows) - len(rows) + 1, len(self.rows) + 1))
+
+    def update_zip_file_count(self, id_folder_zip, count):
+        self.counts.append(count)
+
+
+def test_checkpoint_skips_torn_last_line(tmp_path):
+    checkpoint = ArchiveCheckpoint(str(tmp_path / "checkpoint.jsonl"))
+    checkpoint.record("a.txt", "classified", "Письмо", 0.8)
+    checkpoint.close()
+    with open(checkpoint.path, "a", encoding="utf-8") as f:
+        f.write('{"member": "b.t')
+
+    checkpoint.record("c.txt", "skipped")
+    checkpoint.close()
+    assert set(ArchiveCheckpoint(checkpoint.path).load()) == {"a.txt", "c.txt"}
+
+
+def test_resumed_archive_classifies_only_files_missing_from_checkpoint(tmp_path, monkeypatch):
+    monkeypatch.setattr(Config, "ARCHIVE_WORKERS", 0)
+    monkeypatch.setattr(archive_utils, "get_cascade", lambda name: None)
+    monkeypatch.setattr(archive_utils, "load_model", lambda name: object())
+    monkeypatch.setattr(archive_utils, "model_version", lambda name: "v1")
+    predicted = []
+
+    def predict_batch(model, vectorizer, texts, batch_size):
+        predicted.extend(texts)
+        return [("Order", 0.9)] * len(texts)
+
+    monkeypatch.setattr(archive_utils, "predict_batch", predict_batch)
+    source = tmp_path / "source.zip"
+    with zipfile.ZipFile(source, "w") as zf:
+        zf.writestr("a.txt", "Письмо о поставке оборудования")
+        zf.writestr("b.txt", "Приказ о назначении ответственного")
+    checkpoint = ArchiveCheckpoint(str(tmp_path / "checkpoint.jsonl"))
+    checkpoint.record("a.txt", "classified", "Письмо", 0.8)
+    checkpoint.close()
+
+    db = FakeArchiveDatabase()
+    result = classify_archive(
+        str(source), "Наивный Байес", None, db, id_user=1, id_folder_zip=7, workdir=str(tmp_path),
+        checkpoint=checkpoint
+    )
+    checkpoint.close()
+
+    assert predicted == ["Приказ о назначении ответственного"]
+    assert result.classified == [("a.txt", "Письмо", 0.8), ("b.txt", "Приказ", 0.9)]
+    content_hash = hashlib.sha256("Приказ о назначении ответственного".encode("utf-8")).hexdigest()
+    assert db.rows == [("b.txt", "Наивный Байес", "Приказ", 0.9, content_hash, "v1")]
+    assert db.counts == [1]
+    with zipfile.ZipFile(result.zip_path) as zf:
+        assert sorted(zf.namelist()) == ["Письмо/a.txt", "Приказ/b.txt"]
+    assert set(ArchiveCheckpoint(checkpoint.path).load()) == {"a.txt", "b.txt"}
+
+
+def test_cluster_confidence_is_not_stored(tmp_path, monkeypatch):
+    monkeypatch.setattr(Config, "ARCHIVE_WORKERS", 0)
+    monkeypatch.setattr(archive_utils, "get_cascade", lambda name: None)
+    monkeypatch.setattr(archive_utils, "load_model", lambda name: object())
+    monkeypatch.setattr(archive_utils, "model_version", lambda name: "v1.r2")
+    monkeypatch.setattr(archive_utils, "predict_batch", lambda model, vectorizer, texts, batch_size: [(1, 0.4)])
+    source = tmp_path / "source.zip"
+    with zipfile.ZipFile(source, "w") as zf:
+        zf.writestr("a.txt", "Постановление о порядке предоставления субсидий")
+
+    db = FakeArchiveDatabase()
+    result = classify_archive(
+        str(source), "Кластеризация", None, db, id_user=1, id_folder_zip=7, workdir=str(tmp_path)
+    )
+
+    # Пользователь видит уверенность по расстояниям, в БД она не попадает
+    assert result.classified == [("a.txt", "Постановление", 0.4)]
+    assert db.rows[0][1:4] == ("Кластеризация", "Постановление", None)
@@ -0,0 +1,71 @@
+import numpy as np
+from sklearn.feature_extraction.text import TfidfVectorizer
+from sklearn.naive_bayes import MultinomialNB
+from sklearn.svm import LinearSVC
+
+from utils.ml_utils import CascadeStats, ModelCascade, _prediction_confidence, _predict_matrix
+
+DOCUMENTS = [
+    "Приказ о назначении ответственного за пожарную безопасность",
+    "Приказ об отпуске сотрудника отдела кадров",
+    "Письмо в налоговую инспекцию о предоставлении документов",
+    "Письмо партнеру о сроках поставки",
+    "Постановление администрации о благоустройстве территории",
+    "Постановление о порядке предоставления субсидий",
+]
+LABELS = ["Order", "Order", "Letters", "Letters", "Ordinance", "Ordinance"]
+TEXTS = ["приказ об отпуске", "письмо о поставке", "постановление о субсидиях", "отчет за квартал"]
+
+
+def _models():
+    vectorizer = TfidfVectorizer().fit(DOCUMENTS)
+    matrix = vectorizer.transform(DOCUMENTS)
+    return vectorizer, MultinomialNB().fit(matrix, LABELS), LinearSVC().fit(matrix, LABELS)
+
+
+def test_svc_batch_confidence_matches_single_document():
+    vectorizer, _, svc = _models()
+    matrix = vectorizer.transform(TEXTS)
+
+    batch = _predict_matrix(svc, matrix)
+    for row, (prediction, confidence) in enumerate(batch):
+        expected = _prediction_confidence(svc.classes_, scores=svc.decision_function(matrix[row])[0])
+        assert prediction == expected[0]
+        assert confidence is not None and np.isclose(confidence, expected[1])
+
+
+def test_uncertain_documents_fall_back_to_strong_model():
+    vectorizer, nb, svc = _models()
+    matrix = vectorizer.transform(TEXTS)
+    cheap_confidence = nb.predict_proba(matrix).max(axis=1)
+    # Порог между уверенностями: часть документов остается у дешевой модели
+    threshold = float(np.median(cheap_confidence))
+    cascade = ModelCascade("Каскад", "Наивный Байес", "SVC", threshold=threshold)
+    stats = CascadeStats()
+
+    results = cascade.predict_batch(nb, svc, vectorizer, TEXTS, batch_size=3, stats=stats)
+
+    strong = _predict_matrix(svc, matrix)
+    escalated = 0
+    for row, (used, prediction, confidence) in enumerate(results):
+        if cheap_confidence[row] < threshold:
+            escalated += 1
+            assert (used, prediction) == ("SVC", strong[row][0])
+            assert np.isclose(confidence, strong[row][1])
+        else:
+            assert (used, prediction) == ("Наивный Байес", nb.predict(matrix[row])[0])
+            assert np.isclose(confidence, cheap_confidence[row])
+    assert 0 < escalated < len(TEXTS)
+    assert stats.summary()["documents"] == len(TEXTS)
+    assert stats.summary()["escalated"] == escalated
+    assert cascade.totals.summary()["escalated"] == escalated
+
+
+def test_cascade_with_zero_threshold_never_escalates():
+    vectorizer, nb, svc = _models()
+    cascade = ModelCascade("Каскад", "Наивный Байес", "SVC", threshold=0.0)
+
+    results = cascade.predict_batch(nb, svc, vectorizer, TEXTS)
+
+    assert [used for used, _, _ in results] == ["Наивный Байес"] * len(TEXTS)
+    assert cascade.totals.summary()["escalated"] == 0
@@ -0,0 +1,37 @@
+import numpy as np
+import scipy.sparse as sp
+from sklearn.cluster import KMeans
+from sklearn.preprocessing import normalize
+
+from utils.cluster_assign import ClusterAssigner, cluster_assigner
+
+
+def _fitted_kmeans():
+    X = normalize(sp.random(300, 30, density=0.3, format="csr", random_state=0))
+    return KMeans(n_clusters=4, n_init=3, random_state=0).fit(X), X
+
+
+def test_assigner_matches_kmeans_predict():
+    kmeans, X = _fitted_kmeans()
+    assigner = ClusterAssigner(kmeans)
+
+    assert np.array_equal(assigner.predict(X), kmeans.predict(X))
+    assert np.array_equal(assigner.predict(X.toarray()), kmeans.predict(X))
+    assert np.allclose(assigner.distances(X), kmeans.transform(X))
+
+
+def test_confidence_from_distances():
+    kmeans, X = _fitted_kmeans()
+    labels, confidence = ClusterAssigner(kmeans).predict_with_confidence(X)
+
+    assert np.array_equal(labels, kmeans.predict(X))
+    nearest = np.sort(kmeans.transform(X), axis=1)[:, :2]
+    assert np.allclose(confidence, 1 - nearest[:, 0] / nearest[:, 1])
+    # Документ в центроиде - максимальная уверенность
+    _, at_center = ClusterAssigner(kmeans).predict_with_confidence(kmeans.cluster_centers_)
+    assert np.allclose(at_center, 1.0)
+
+
+def test_one_assigner_per_model():
+    kmeans, _ = _fitted_kmeans()
+    assert cluster_assigner(kmeans) is cluster_assigner(kmeans)
@@ -0,0 +1,66 @@
+import pickle
+
+import joblib
+import numpy as np
+import pytest
+from sklearn.feature_extraction.text import TfidfVectorizer
+
+from config import Config
+from utils import auth_utils
+from utils.compact_vectorizer import CompactTfidfVectorizer, convert
+from utils.model_registry import file_sha256
+
+DOCUMENTS = [
+    "Приказ о назначении ответственного за пожарную безопасность",
+    "Письмо в налоговую инспекцию о предоставлении документов",
+    "Договор поставки оборудования и приложение к договору",
+    "Приказ об отпуске сотрудника отдела кадров",
+    "Служебная записка о закупке оборудования",
+]
+
+
+def test_transform_matches_tfidf_vectorizer():
+    vectorizer = TfidfVectorizer(ngram_range=(1, 2)).fit(DOCUMENTS)
+    compact = CompactTfidfVectorizer(vectorizer)
+    queries = DOCUMENTS + ["новый приказ о поставке", "", "слова не из словаря"]
+
+    expected = vectorizer.transform(queries)
+    actual = compact.transform(queries)
+    assert actual.shape == expected.shape
+    assert np.allclose(actual.toarray(), expected.toarray())
+    assert np.array_equal(compact.get_feature_names_out(), vectorizer.get_feature_names_out())
+
+
+def test_pickled_vectorizer_transforms_the_same():
+    vectorizer = TfidfVectorizer(binary=True).fit(DOCUMENTS)
+    compact = pickle.loads(pickle.dumps(CompactTfidfVectorizer(vectorizer)))
+
+    assert np.allclose(compact.transform(DOCUMENTS).toarray(), vectorizer.transform(DOCUMENTS).toarray())
+
+
+@pytest.fixture
+def vectorizer_dir(tmp_path, monkeypatch):
+    # Только pickle из tmp_path: без экспортов и без векторизаторов, загруженных другими тестами
+    for flag in ("LINEAR_EXPORT", "COMPILED_FOREST", "MODEL_MMAP"):
+        monkeypatch.setattr(Config, flag, False)
+    monkeypatch.setattr(auth_utils, "_handles", {})
+    return tmp_path
+
+
+def test_compact_vectorizer_is_used_only_for_its_source(vectorizer_dir):
+    source = vectorizer_dir / "vectorizer.pkl"
+    compact_path = vectorizer_dir / "vectorizer_compact.pkl"
+    joblib.dump(TfidfVectorizer().fit(DOCUMENTS), source)
+    compact = convert(source, compact_path)
+    assert compact.source_sha256 == file_sha256(str(source))
+
+    assert auth_utils.load_vectorizer(source).path == str(compact_path)
+
+    # Векторизатор переобучен, компактная версия не пересобрана
+    retrained = TfidfVectorizer(ngram_range=(1, 2)).fit(DOCUMENTS)
+    joblib.dump(retrained, source)
+    auth_utils._handles.clear()
+    handle = auth_utils.load_vectorizer(source)
+
+    assert handle.path == str(source)
+    assert np.allclose(handle.transform(DOCUMENTS).toarray(), retrained.transform(DOCUMENTS).toarray())
@@ -0,0 +1,34 @@
+import numpy as np
+import scipy.sparse as sp
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.preprocessing import normalize
+
+from utils.compiled_forest import CompiledForest, export_forest, load_forest
+
+
+def _fitted_forest():
+    X = normalize(sp.random(300, 40, density=0.2, format="csr", random_state=0))
+    y = np.array(["приказ", "письмо", "договор"])[np.arange(300) % 3]
+    return RandomForestClassifier(n_estimators=15, max_depth=8, random_state=0).fit(X, y), X
+
+
+def test_compiled_forest_matches_sklearn():
+    forest, X = _fitted_forest()
+    compiled = CompiledForest.from_sklearn(forest)
+
+    assert np.array_equal(compiled.predict(X), forest.predict(X))
+    assert np.allclose(compiled.predict_proba(X), forest.predict_proba(X))
+    # Плотный вход и пачка больше DENSE_BATCH_SIZE дают тот же результат
+    assert np.allclose(compiled.predict_proba(X.toarray()), forest.predict_proba(X))
+
+
+def test_exported_forest_matches_sklearn(tmp_path):
+    forest, X = _fitted_forest()
+    path = tmp_path / "random_forest.npz"
+    export_forest(forest, path, "cd" * 32)
+    compiled = load_forest(path)
+
+    assert np.array_equal(compiled.predict(X), forest.predict(X))
+    assert np.allclose(compiled.predict_proba(X), forest.predict_proba(X))
+    with np.load(path, allow_pickle=False) as data:
+        assert str(data["source_sha256"]) == "cd" * 32
@@ -0,0 +1,290 @@
+import re
+
+import pymysql
+import pytest
+
+from database.db_operations import Database
+from database.pool import ConnectionPool
+
+_PLACEHOLDER = re.compile(r"ROUND\(%s, 2\)|%s|NOW\(\)")
+
+
+class FakeServer:
+    """Таблицы в памяти и журнал запросов; понимает многострочные INSERT и выборку id"""
+
+    def __init__(self, step=1):
+        self.step = step
+        self.tables = {}
+        self.next_id = {}
+        self.statements = []
+        # Таблица -> сколько id отдать другой сессии посреди следующего INSERT
+        self.interleave = {}
+
+    def insert(self, table, columns, values_sql, params):
+        """Вставляет строки многострочного INSERT, возвращает их id"""
+        tokens = _PLACEHOLDER.findall(values_sql)[:len(columns)]
+        bound = [column for column, token in zip(columns, tokens) if token != "NOW()"]
+        rows = self.tables.setdefault(table, {})
+        ids = []
+        for start in range(0, len(params), len(bound)):
+            row_id = self.next_id.get(table, 1)
+            if ids and self.interleave.get(table):
+                # Строка другой сессии получила id между строками этого INSERT
+                self.interleave[table] -= 1
+                rows[row_id] = {}
+                row_id += self.step
+            rows[row_id] = dict(zip(bound, params[start:start + len(bound)]))
+            self.next_id[table] = row_id + self.step
+            ids.append(row_id)
+        return ids
+
+
+class FakeCursor:
+    def __init__(self, server):
+        self.server = server
+        self.lastrowid = None
+        self.rowcount = 0
+        self._result = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, sql, params=None):
+        sql = " ".join(sql.split())
+        self.server.statements.append((sql, params))
+        self._result = []
+        insert = re.match(r"INSERT INTO (\w+) \(([^)]*)\) VALUES (.*)", sql)
+        if sql.startswith("SELECT @@SESSION.auto_increment_increment"):
+            self._result = [{"step": self.server.step}]
+        elif insert and insert.group(1) in ("documents", "classifications", "ratings"):
+            columns = [column.strip() for column in insert.group(2).split(",")]
+            ids = self.server.insert(insert.group(1), columns, insert.group(3), list(params))
+            self.lastrowid, self.rowcount = ids[0], len(ids)
+        elif sql.startswith("SELECT id, "):
+            column, table = re.match(r"SELECT id, (\w+) FROM (\w+)", sql).groups()
+            rows = self.server.tables.get(table, {})
+            self._result = [{"id": i, column: rows[i].get(column)} for i in params if i in rows]
+
+    def fetchone(self):
+        return self._result[0] if self._result else None
+
+    def fetchall(self):
+        return self._result
+
+
+class FakeConnection:
+    def __init__(self, server):
+        self.server = server
+        self.open = True
+        self.commits = 0
+        self.rollbacks = 0
+
+    def cursor(self):
+        return FakeCursor(self.server)
+
+    def begin(self):
+        pass
+
+    def commit(self):
+        self.commits += 1
+        self.server.statements.append(("COMMIT", None))
+
+    def rollback(self):
+        self.rollbacks += 1
+
+    def ping(self, reconnect=True):
+        pass
+
+    def close(self):
+        self.open = False
+
+
+@pytest.fixture
+def server():
+    return FakeServer()
+
+
+@pytest.fixture
+def db(server):
+    connections = []
+
+    def connect():
+        connections.append(FakeConnection(server))
+        return connections[-1]
+
+    database = Database.__new__(Database)
+    database._pool = ConnectionPool(connect, size=1)
+    database.connections = connections
+    return database
+
+
+def _statements(server, prefix):
+    return [(sql, params) for sql, params in server.statements if sql.startswith(prefix)]
+
+
+def _archive_rows(*names):
+    return [(name, "Наивный Байес", "Приказ", 0.9, f"hash-{name}", "v1") for name in names]
+
+
+def test_archive_rows_are_inserted_with_one_statement_per_table(db, server):
+    ids = db.create_archive_classifications(1, 7, _archive_rows("a.txt", "b.txt", "c.txt"))
+
+    assert ids == [1, 2, 3]
+    assert len(_statements(server, "INSERT INTO documents")) == 1
+    assert len(_statements(server, "INSERT INTO classifications")) == 1
+    assert [row["id_document"] for row in server.tables["classifications"].values()] == [1, 2, 3]
+    assert [row["content_hash"] for row in server.tables["documents"].values()] == [
+        "hash-a.txt", "hash-b.txt", "hash-c.txt"
+    ]
+    assert _statements(server, "UPDATE folders_zip")[0][1] == (3, 7)
+    assert db.connections[0].commits == 1
+
+
+def test_inserted_ids_follow_auto_increment_increment(db, server):
+    server.step = 2
+    ids = db.create_archive_classifications(1, 7, _archive_rows("a.txt", "b.txt"))
+
+    assert ids == [1, 3]
+    assert [row["id_document"] for row in server.tables["classifications"].values()] == [1, 3]
+
+
+def test_non_consecutive_ids_are_detected_and_rolled_back(db, server, monkeypatch):
+    monkeypatch.setattr("database.db_operations.st.error", lambda message: None)
+    server.interleave = {"documents": 1}
+
+    assert db.create_archive_classifications(1, 7, _archive_rows("a.txt", "b.txt")) is None
+    assert db.connections[0].rollbacks == 1
+    assert db.connections[0].commits == 0
+
+
+def test_inserted_ids_raise_on_mismatch(server):
+    cursor = FakeCursor(server)
+    server.tables["documents"] = {1: {"filename": "a.txt"}, 2: {"filename": "другой.txt"}}
+    with pytest.raises(pymysql.err.InternalError):
+        Database._inserted_ids(cursor, 1, "documents", "filename", ["a.txt", "b.txt"])
+
+
+def test_write_behind_rows_are_inserted_in_bulk(db, server):
+    ids = db.insert_classifications([
+        (1, "a.txt", "Наивный Байес", "Приказ", 0.9, "hash-a", "v1"),
+        (2, "b.txt", "Случайный лес", "Письмо", 0.7, "hash-b", "v2"),
+    ])
+    assert ids == [1, 2]
+    assert db.insert_ratings([(ids[0], 1, 5, ""), (ids[1], 2, 4, "ok")]) == 2
+    assert [row["id_classification"] for row in server.tables["ratings"].values()] == [1, 2]
+    assert len(_statements(server, "INSERT INTO ratings")) == 1
+    assert [row["content_hash"] for row in server.tables["documents"].values()] == ["hash-a", "hash-b"]
+    assert [row["model_version"] for row in server.tables["classifications"].values()] == ["v1", "v2"]
+
+
+def test_single_classification_keeps_hash_and_model_version(db, server):
+    classification_id = db.create_classification(1, "a.txt", "Наивный Байес", "Приказ", 0.9, "hash-a", "v1")
+
+    assert classification_id == 1
+    assert server.tables["documents"][1]["content_hash"] == "hash-a"
+    assert server.tables["classifications"][1]["model_version"] == "v1"
+
+
+def test_filters_build_where_and_params():
+    where, params = Database._classification_filters({
+        "date_from": "2024-01-01", "date_to": "2024-01-31", "search": "50%_о\\тчет",
+        "classes": ["Order", "Letters"], "models": [], "rating_range": (3, 5),
+    })
+    assert where == (
+        "WHERE c.created_at >= %s AND c.created_at < %s + INTERVAL 1 DAY AND d.filename LIKE %s"
+        " AND c.predicted_class IN (%s, %s) AND FALSE"
+        " AND (r.rating IS NULL OR r.rating BETWEEN %s AND %s)"
+    )
+    assert params == ["2024-01-01", "2024-01-31", "%50\\%\\_о\\\\тчет%", "Order", "Letters", 3, 5]
+
+    where, params = Database._classification_filters({"rating_range": (1, 2), "rated_only": True})
+    assert (where, params) == ("WHERE r.rating BETWEEN %s AND %s", [1, 2])
+    assert Database._classification_filters({"classes": None}) == ("", [])
+
+
+def test_page_after_cursor_adds_keyset_condition(db, server):
+    db.get_classifications_page({}, limit=20, after=("2024-01-02 10:00:00", 42))
+    db.get_classifications_page({"models": ["Наивный Байес"]}, limit=20, after=("2024-01-02 10:00:00", 42))
+
+    (first, first_params), (second, second_params) = _statements(server, "SELECT c.id,")
+    keyset = "(c.created_at < %s OR (c.created_at = %s AND c.id < %s))"
+    assert f"WHERE {keyset} ORDER BY c.created_at DESC, c.id DESC LIMIT %s" in first
+    assert first_params == ["2024-01-02 10:00:00", "2024-01-02 10:00:00", 42, 20]
+    assert f"WHERE c.model_used IN (%s) AND {keyset}" in second
+    assert second_params == ["Наивный Байес", "2024-01-02 10:00:00", "2024-01-02 10:00:00", 42, 20]
+
+
+def test_filter_options_are_read_from_rollups(db, server):
+    assert db.get_classification_filter_options() is None
+    db.fetch_one = lambda query, params=None: {"min_date": "2024-01-01", "max_date": "2024-02-01", "has_ratings": 1}
+    db.get_classification_filter_options()
+
+    queries = [sql for sql, _ in server.statements]
+    assert queries and all("FROM classification_rollups" in sql for sql in queries)
+    assert not any("FROM classifications" in sql for sql in queries)
+
+
+class FailingCursor(FakeCursor):
+    """Курсор, на котором падает запрос с заданным началом"""
+
+    def __init__(self, server, fail_on):
+        super().__init__(server)
+        self.fail_on = fail_on
+
+    def execute(self, sql, params=None):
+        super().execute(sql, params)
+        if self.server.statements[-1][0].startswith(self.fail_on):
+            raise pymysql.err.OperationalError("сбой")
+
+
+def test_rollups_are_updated_for_inserted_rows_only(db, server):
+    ids = db.insert_classifications([
+        (1, "a.txt", "Наивный Байес", "Приказ", 0.9, "hash-a", "v1"),
+        (2, "b.txt", "Случайный лес", "Письмо", 0.7, "hash-b", "v2"),
+    ])
+    db.insert_ratings([(ids[1], 2, 4, "")])
+
+    rollups = _statements(server, "INSERT INTO classification_rollups")
+    assert len(rollups) == 2
+    (classifications_sql, classifications_params), (ratings_sql, ratings_params) = rollups
+    assert "FROM classifications WHERE id IN (%s, %s) GROUP BY" in classifications_sql
+    assert classifications_params == ids
+    assert "WHERE r.id IN (%s) GROUP BY" in ratings_sql
+    assert ratings_params == [1]
+    # Агрегаты обновляются в транзакции вставки, до ее фиксации
+    order = [sql.split(" (")[0] for sql, _ in server.statements if sql.startswith(("INSERT", "COMMIT"))]
+    assert order == [
+        "INSERT INTO documents", "INSERT INTO classifications", "INSERT INTO classification_rollups", "COMMIT",
+        "INSERT INTO ratings", "INSERT INTO classification_rollups", "COMMIT",
+    ]
+
+
+def test_rebuild_rollups_replaces_everything_under_table_locks(server):
+    cursor = FakeCursor(server)
+    Database._rebuild_rollups_locked(cursor)
+
+    statements = [sql.split(" (")[0] if sql.startswith("INSERT") else sql for sql, _ in server.statements]
+    assert statements[0] == "SET autocommit = 0"
+    assert statements[1].startswith("LOCK TABLES classification_rollups WRITE")
+    assert statements[2:] == [
+        "DELETE FROM classification_rollups",
+        "INSERT INTO classification_rollups",
+        "INSERT INTO classification_rollups",
+        "COMMIT",
+        "UNLOCK TABLES",
+        "SET autocommit = 1",
+    ]
+    # Полный пересчет идет без условия по id
+    assert all(params == [] for sql, params in _statements(server, "INSERT INTO classification_rollups"))
+
+
+def test_failed_rebuild_rolls_back_and_unlocks(server):
+    cursor = FailingCursor(server, "INSERT INTO classification_rollups")
+    with pytest.raises(pymysql.err.OperationalError):
+        Database._rebuild_rollups_locked(cursor)
+
+    assert [sql for sql, _ in server.statements][-3:] == ["ROLLBACK", "UNLOCK TABLES", "SET autocommit = 1"]
+    assert "COMMIT" not in [sql for sql, _ in server.statements]
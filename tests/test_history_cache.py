@@ -0,0 +1,131 @@
+from datetime import datetime, timedelta
+
+import pandas as pd
+
+from database.history_cache import HistoryCache
+
+COLUMNS = [
+    "id", "login", "filename", "model_used", "predicted_class",
+    "confidence", "created_at", "rating", "comment", "rated_at",
+]
+START = datetime(2025, 1, 1, 12, 0, 0)
+
+
+class FakeDatabase:
+    """Таблица истории в памяти с теми же выборками, что у Database"""
+
+    def __init__(self):
+        self.rows = {}
+        self.queries = []
+
+    def add(self, id, minutes, id_user=1, rating=None, rated_minutes=None):
+        self.rows[id] = {
+            "id": id, "login": f"user{id_user}", "filename": f"{id}.txt", "model_used": "Наивный Байес",
+            "predicted_class": "Приказ", "confidence": 0.9, "created_at": START + timedelta(minutes=minutes),
+            "rating": rating, "comment": None,
+            "rated_at": START + timedelta(minutes=rated_minutes) if rated_minutes is not None else None,
+            "id_user": id_user,
+        }
+
+    def rate(self, id, rating, minutes):
+        self.rows[id].update(rating=rating, rated_at=START + timedelta(minutes=minutes))
+
+    def _frame(self, rows):
+        frame = pd.DataFrame([{column: row[column] for column in COLUMNS} for row in rows], columns=COLUMNS)
+        frame["created_at"] = pd.to_datetime(frame["created_at"])
+        frame["rated_at"] = pd.to_datetime(frame["rated_at"])
+        return frame
+
+    def _rows(self, id_user):
+        return [row for row in self.rows.values() if id_user is None or row["id_user"] == id_user]
+
+    def get_history_rows(self, id_user=None, after_id=0, created_since=None):
+        self.queries.append(("rows", after_id, created_since))
+        return self._frame([
+            row for row in self._rows(id_user)
+            if row["id"] > after_id or (created_since is not None and row["created_at"] >= created_since)
+        ])
+
+    def get_history_rating_changes(self, id_user=None, since=None):
+        self.queries.append(("ratings", since))
+        return self._frame([
+            row for row in self._rows(id_user) if row["rated_at"] is not None and row["rated_at"] >= since
+        ])
+
+
+def _cache(**kwargs):
+    kwargs.setdefault("refresh_seconds", 3600)
+    kwargs.setdefault("lag_seconds", 120)
+    return HistoryCache(**kwargs)
+
+
+def test_new_rows_are_appended_newest_first():
+    db = FakeDatabase()
+    db.add(1, 0)
+    cache = _cache()
+    assert cache.get(db, 1)["id"].tolist() == [1]
+
+    db.add(2, 5)
+    cache.invalidate(1)
+    assert cache.get(db, 1)["id"].tolist() == [2, 1]
+    assert db.queries[-2][1] == 1  # дочитываются только id больше загруженного
+
+
+def test_cached_history_is_reused_until_invalidated():
+    db = FakeDatabase()
+    db.add(1, 0)
+    cache = _cache()
+    cache.get(db, 1)
+    db.add(2, 5)
+    assert cache.get(db, 1)["id"].tolist() == [1]
+
+
+def test_row_committed_late_with_smaller_id_is_picked_up():
+    db = FakeDatabase()
+    db.add(1, 0)
+    db.add(3, 10)
+    cache = _cache()
+    cache.get(db, 1)
+
+    # Транзакция с id 2 зафиксирована после строки 3, но в пределах окна
+    db.add(2, 9)
+    cache.invalidate(1)
+    history = cache.get(db, 1)
+    assert history["id"].tolist() == [3, 2, 1]
+    assert not history["id"].duplicated().any()
+
+
+def test_rating_of_old_row_is_updated():
+    db = FakeDatabase()
+    db.add(1, 0, rating=3, rated_minutes=1)
+    db.add(2, 5)
+    cache = _cache()
+    cache.get(db, 1)
+
+    db.rate(2, 5, 20)
+    db.rate(1, 4, 21)
+    cache.invalidate(1)
+    history = cache.get(db, 1).set_index("id")
+    assert history.loc[1, "rating"] == 4
+    assert history.loc[2, "rating"] == 5
+
+
+def test_user_and_overall_history_are_cached_separately():
+    db = FakeDatabase()
+    db.add(1, 0, id_user=1)
+    db.add(2, 1, id_user=2)
+    cache = _cache()
+    assert cache.get(db, 1)["id"].tolist() == [1]
+    assert cache.get(db, None)["id"].tolist() == [2, 1]
+
+
+def test_least_recently_used_users_are_evicted():
+    db = FakeDatabase()
+    for id_user in (1, 2, 3):
+        db.add(id_user, id_user, id_user=id_user)
+    cache = _cache(max_users=2)
+    cache.get(db, 1)
+    cache.get(db, 2)
+    cache.get(db, 1)
+    cache.get(db, 3)
+    assert set(cache._entries) == {1, 3}
@@ -0,0 +1,97 @@
+import threading
+
+import pytest
+
+from utils import job_utils
+from utils.archive_utils import ArchiveResult
+from utils.job_utils import ArchiveJob, ArchiveJobManager
+
+
+@pytest.fixture
+def runs(monkeypatch):
+    """Подменяет classify_archive: записывает id заданий и ждет release"""
+    calls = []
+    release = threading.Event()
+
+    def classify_archive(source_path, model_name, vectorizer, db, **kwargs):
+        calls.append(kwargs["id_folder_zip"])
+        release.wait(5)
+        return ArchiveResult()
+
+    monkeypatch.setattr(job_utils, "classify_archive", classify_archive)
+    monkeypatch.setattr(job_utils, "Database", lambda: None)
+    return calls, release
+
+
+def _interrupted_job(jobs_dir, id_folder_zip):
+    """Задание, которое процесс не успел завершить"""
+    workdir = jobs_dir / str(id_folder_zip)
+    workdir.mkdir()
+    (workdir / "source.zip").write_bytes(b"zip")
+    job = ArchiveJob(id_folder_zip, 1, "docs.zip", "Наивный Байес", str(workdir))
+    job.status = "running"
+    job.save()
+    return job
+
+
+def _wait(*managers):
+    for manager in managers:
+        if manager._executor is not None:
+            manager._executor.shutdown(wait=True)
+
+
+def test_interrupted_job_is_resumed(tmp_path, runs):
+    calls, release = runs
+    _interrupted_job(tmp_path, 7)
+    release.set()
+    manager = ArchiveJobManager(jobs_dir=str(tmp_path), workers=1)
+    manager.resume_pending(vectorizer=None)
+    _wait(manager)
+
+    assert calls == [7]
+    assert manager.get(7).status == "done"
+    assert ArchiveJob.load(str(tmp_path / "7")).status == "done"
+
+
+def test_two_managers_never_run_the_same_job(tmp_path, runs):
+    calls, release = runs
+    for id_folder_zip in (7, 8):
+        _interrupted_job(tmp_path, id_folder_zip)
+    first = ArchiveJobManager(jobs_dir=str(tmp_path), workers=2)
+    second = ArchiveJobManager(jobs_dir=str(tmp_path), workers=2)
+
+    first.resume_pending(vectorizer=None)
+    # Первый менеджер держит блокировки обоих заданий, пока они выполняются
+    second.resume_pending(vectorizer=None)
+    release.set()
+    _wait(first, second)
+
+    assert sorted(calls) == [7, 8]
+    assert second.get(7) is None and second.get(8) is None
+
+
+def test_finished_job_is_not_rerun_after_lease_is_released(tmp_path, runs):
+    calls, release = runs
+    release.set()
+    _interrupted_job(tmp_path, 7)
+    first = ArchiveJobManager(jobs_dir=str(tmp_path), workers=1)
+    first.resume_pending(vectorizer=None)
+    _wait(first)
+
+    second = ArchiveJobManager(jobs_dir=str(tmp_path), workers=1)
+    second.resume_pending(vectorizer=None)
+    _wait(second)
+    assert calls == [7]
+    assert second.get(7).status == "done"
+
+
+def test_submitted_job_is_not_taken_by_another_manager(tmp_path, runs):
+    calls, release = runs
+    first = ArchiveJobManager(jobs_dir=str(tmp_path), workers=1)
+    first.submit(9, 1, "docs.zip", b"zip", "Наивный Байес", vectorizer=None)
+    second = ArchiveJobManager(jobs_dir=str(tmp_path), workers=1)
+    second.resume_pending(vectorizer=None)
+    release.set()
+    _wait(first, second)
+
+    assert calls == [9]
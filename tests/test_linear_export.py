@@ -0,0 +1,65 @@
+import numpy as np
+import pytest
+import scipy.sparse as sp
+from sklearn.linear_model import LogisticRegression
+from sklearn.naive_bayes import MultinomialNB
+from sklearn.preprocessing import normalize
+from sklearn.svm import LinearSVC
+
+from utils.linear_export import FusedLinearModels, export_linear, linear_scorer, load_linear
+
+
+def _data(n_classes):
+    X = normalize(sp.random(200, 50, density=0.2, format="csr", random_state=0))
+    y = np.array(["приказ", "письмо", "договор"])[np.arange(200) % n_classes]
+    return X, y
+
+
+MODELS = [
+    lambda: MultinomialNB(),
+    lambda: LogisticRegression(max_iter=1000),
+    lambda: LogisticRegression(solver="liblinear"),
+    lambda: LinearSVC(),
+]
+
+
+@pytest.mark.parametrize("n_classes", [2, 3])
+@pytest.mark.parametrize("make_model", MODELS)
+def test_exported_scorer_matches_model(tmp_path, make_model, n_classes):
+    X, y = _data(n_classes)
+    model = make_model().fit(X, y)
+    path = tmp_path / "model.npz"
+    export_linear(model, path, "0" * 64)
+    scorer = load_linear(path)
+
+    assert np.array_equal(scorer.predict(X), model.predict(X))
+    if hasattr(model, "predict_proba"):
+        assert np.allclose(scorer.predict_proba(X), model.predict_proba(X))
+    else:
+        assert np.allclose(scorer.decision_function(X), model.decision_function(X))
+
+
+def test_export_stores_source_hash(tmp_path):
+    X, y = _data(3)
+    path = tmp_path / "model.npz"
+    export_linear(MultinomialNB().fit(X, y), path, "ab" * 32)
+    with np.load(path, allow_pickle=False) as data:
+        assert str(data["source_sha256"]) == "ab" * 32
+
+
+def test_fused_models_match_separate_models():
+    X, y = _data(3)
+    models = {
+        "nb": MultinomialNB().fit(X, y),
+        "lr": LogisticRegression(max_iter=1000).fit(X, y),
+        "svc": LinearSVC().fit(X, y),
+    }
+    results = FusedLinearModels({name: linear_scorer(model) for name, model in models.items()}).score(X)
+
+    for name, model in models.items():
+        predictions, proba, decision = results[name]
+        assert np.array_equal(predictions, model.predict(X))
+        if proba is not None:
+            assert np.allclose(proba, model.predict_proba(X))
+        else:
+            assert np.allclose(decision, model.decision_function(X))
@@ -0,0 +1,60 @@
+import threading
+import time
+
+import joblib
+import pytest
+
+from config import Config
+from utils.ml_utils import artifact_version, load_artifact
+from utils.model_registry import ModelRegistry, file_sha256, registry
+
+
+@pytest.fixture
+def no_exports(monkeypatch):
+    for flag in ("LINEAR_EXPORT", "COMPILED_FOREST", "MODEL_MMAP"):
+        monkeypatch.setattr(Config, flag, False)
+
+
+def test_replaced_pickle_is_reloaded(tmp_path, no_exports):
+    path = tmp_path / "model.pkl"
+    joblib.dump({"classes": ["Приказ"]}, path)
+    assert load_artifact(path) == {"classes": ["Приказ"]}
+    version = artifact_version(path)
+    assert version == file_sha256(str(path))[:16]
+
+    joblib.dump({"classes": ["Приказ", "Письмо"]}, path)
+    # Версия описывает загруженный объект, пока он не перезагружен
+    assert artifact_version(path) == version
+
+    assert load_artifact(path) == {"classes": ["Приказ", "Письмо"]}
+    assert artifact_version(path) == file_sha256(str(path))[:16] != version
+    assert registry.version(str(path)) == artifact_version(path)
+
+
+def test_concurrent_sessions_load_a_model_once(tmp_path):
+    path = str(tmp_path / "model.pkl")
+    joblib.dump({"classes": ["Приказ"]}, path)
+    loads = []
+
+    def slow_load(model_path):
+        loads.append(model_path)
+        time.sleep(0.05)
+        return joblib.load(model_path)
+
+    models = ModelRegistry(loader=slow_load)
+    start = threading.Barrier(16)
+    results = []
+
+    def session():
+        start.wait()
+        results.append(models.get(path))
+
+    threads = [threading.Thread(target=session) for _ in range(16)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert loads == [path]
+    assert len(results) == 16 and all(model is results[0] for model in results)
+    assert [row["path"] for row in models.stats()] == [path]
@@ -0,0 +1,55 @@
+import numpy as np
+import pytest
+import scipy.sparse as sp
+from sklearn.metrics import pairwise_distances
+from sklearn.naive_bayes import MultinomialNB
+from sklearn.neighbors import KNeighborsClassifier
+from sklearn.preprocessing import normalize
+
+from config import Config
+from utils.ml_utils import AnomalyAwareClassifier
+from utils.neighbor_index import MIN_INDEX_SIZE, NeighborIndex
+
+
+def _data(seed=0):
+    """Опорный набор размера индекса и запросы: копии опорных документов с шумом и случайные тексты"""
+    rng = np.random.default_rng(seed)
+    X = normalize(sp.random(MIN_INDEX_SIZE + 200, 300, density=0.05, format="csr", random_state=rng))
+    noise = sp.random(100, 300, density=0.02, format="csr", random_state=rng)
+    Q = sp.vstack([X[:100] + noise, sp.random(100, 300, density=0.05, format="csr", random_state=rng)])
+    return X, normalize(sp.csr_matrix(Q))
+
+
+@pytest.mark.parametrize("metric", ["euclidean", "cosine"])
+def test_index_never_underestimates_the_nearest_distance(metric):
+    X, Q = _data()
+    # Мало компонент и кандидатов: индекс заведомо ошибается в части запросов
+    index = NeighborIndex(X, metric=metric, n_components=8, n_candidates=4)
+
+    distances, indices = index.query(Q)
+
+    true = pairwise_distances(Q, X, metric=metric)
+    assert np.all(distances >= true.min(axis=1) - 1e-9)
+    # Найденный сосед - реальный опорный документ с тем же расстоянием
+    assert np.allclose(distances, true[np.arange(Q.shape[0]), indices])
+
+
+def test_anomaly_decisions_match_brute_force(monkeypatch):
+    monkeypatch.setattr(Config, "ANOMALY_INDEX_COMPONENTS", 8)
+    monkeypatch.setattr(Config, "ANOMALY_INDEX_CANDIDATES", 4)
+    X, Q = _data(seed=1)
+    labels = np.arange(X.shape[0]) % 4
+    knn = KNeighborsClassifier(n_neighbors=1, algorithm="brute").fit(X, labels)
+    true = pairwise_distances(Q, X).min(axis=1)
+    threshold = float(np.median(true))
+
+    model = AnomalyAwareClassifier(knn, MultinomialNB().fit(X, labels), vectorizer=None, threshold=threshold)
+
+    assert model._index is not None
+    expected = true > threshold
+    assert 0 < expected.sum() < Q.shape[0]
+    assert np.array_equal(model.is_anomaly_batch(Q), expected)
+    # Расстояния ниже порога подтверждены индексом, выше - полным перебором
+    distances = model.nearest_distances(Q)
+    assert np.allclose(distances[expected], true[expected])
+    assert np.all(distances >= true - 1e-9)
@@ -0,0 +1,87 @@
+import pymysql
+import pytest
+
+from database.pool import ConnectionPool, PoolTimeout
+
+
+class FakeConnection:
+    def __init__(self):
+        self.open = True
+        self.pings = 0
+        self.rollbacks = 0
+
+    def ping(self, reconnect=True):
+        self.pings += 1
+
+    def rollback(self):
+        self.rollbacks += 1
+
+    def close(self):
+        self.open = False
+
+
+def _pool(**kwargs):
+    created = []
+
+    def connect():
+        created.append(FakeConnection())
+        return created[-1]
+
+    return ConnectionPool(connect, **kwargs), created
+
+
+def test_connection_is_reused():
+    pool, created = _pool(size=2)
+    with pool.connection() as first:
+        pass
+    with pool.connection() as second:
+        pass
+    assert first is second
+    assert len(created) == 1
+    assert pool.metrics()["checkouts"] == 2
+
+
+def test_checkout_waits_and_times_out_when_pool_is_exhausted():
+    pool, _ = _pool(size=1, timeout=0.05)
+    with pool.connection():
+        with pytest.raises(PoolTimeout):
+            with pool.connection():
+                pass
+    metrics = pool.metrics()
+    assert metrics["waits"] == 1
+    assert metrics["in_use"] == 0
+    assert metrics["idle"] == 1
+
+
+def test_failed_request_rolls_back_and_returns_connection():
+    pool, created = _pool(size=1)
+    with pytest.raises(ValueError):
+        with pool.connection():
+            raise ValueError
+    assert created[0].rollbacks == 1
+    with pool.connection() as conn:
+        assert conn is created[0]
+
+
+def test_closed_connection_is_replaced():
+    pool, created = _pool(size=1)
+    with pool.connection() as conn:
+        conn.close()
+    assert pool.metrics()["created"] == 0
+    with pool.connection() as conn:
+        assert conn is created[1]
+
+
+def test_idle_connection_is_pinged_and_reconnected_on_error():
+    pool, created = _pool(size=1, health_check_after=0.0)
+    with pool.connection():
+        pass
+
+    def broken_ping(reconnect=True):
+        raise pymysql.err.OperationalError(2006, "MySQL server has gone away")
+
+    created[0].ping = broken_ping
+    with pool.connection() as conn:
+        assert conn is created[1]
+    assert pool.metrics()["reconnects"] == 1
+    assert not created[0].open
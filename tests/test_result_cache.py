@@ -0,0 +1,50 @@
+from utils import result_cache as result_cache_module
+from utils.result_cache import ResultCache, content_key
+
+
+def test_lru_eviction():
+    cache = ResultCache(maxsize=2, ttl=60)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert cache.get("a") == 1
+    cache.put("c", 3)
+
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+    assert cache.stats()["evictions"] == 1
+
+
+def test_expired_entry_is_a_miss(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(result_cache_module.time, "monotonic", lambda: now[0])
+    cache = ResultCache(maxsize=10, ttl=60)
+    cache.put("a", 1)
+    now[0] += 30
+    assert cache.get("a") == 1
+    now[0] += 61
+    assert cache.get("a") is None
+    assert cache.stats()["size"] == 0
+
+
+def test_disabled_cache_stores_nothing():
+    cache = ResultCache(maxsize=0)
+    cache.put("a", 1)
+    assert cache.get("a") is None
+
+
+def test_stats_count_hits_and_misses():
+    cache = ResultCache(maxsize=10)
+    cache.put("a", 1)
+    cache.get("a")
+    cache.get("b")
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["hit_rate"]) == (1, 1, 0.5)
+
+
+def test_key_depends_on_content_model_and_version():
+    key = content_key(b"document", "Наивный Байес", "v1")
+    assert key == content_key(b"document", "Наивный Байес", "v1")
+    assert key != content_key(b"document 2", "Наивный Байес", "v1")
+    assert key != content_key(b"document", "Случайный лес", "v1")
+    assert key != content_key(b"document", "Наивный Байес", "v2")
@@ -0,0 +1,121 @@
+import json
+
+import pymysql
+import pytest
+
+from database.write_behind import PendingClassification, PendingRating, WriteBehindQueue
+
+
+class FakeDatabase:
+    """insert_classifications и insert_ratings; *_errors - исход каждого вызова (None - успех)"""
+
+    def __init__(self):
+        self.classifications = []
+        self.ratings = []
+        self.classification_errors = []
+        self.rating_errors = []
+        self.bad_filenames = set()
+
+    def insert_classifications(self, rows):
+        if not rows:
+            return []
+        error = self.classification_errors.pop(0) if self.classification_errors else None
+        if error is not None:
+            raise error
+        if any(row[1] in self.bad_filenames for row in rows):
+            raise pymysql.err.IntegrityError(1406, "Data too long for column 'filename'")
+        ids = []
+        for row in rows:
+            self.classifications.append(row)
+            ids.append(len(self.classifications))
+        return ids
+
+    def insert_ratings(self, rows):
+        if not rows:
+            return 0
+        error = self.rating_errors.pop(0) if self.rating_errors else None
+        if error is not None:
+            raise error
+        self.ratings.extend(rows)
+        return len(rows)
+
+
+def _gone_away():
+    return pymysql.err.OperationalError(2006, "MySQL server has gone away")
+
+
+@pytest.fixture
+def make_queue(tmp_path):
+    queues = []
+
+    def make(db, **kwargs):
+        kwargs.setdefault("retry_delay", 0.0)
+        kwargs.setdefault("flush_interval", 0.01)
+        kwargs.setdefault("dead_letter_path", str(tmp_path / "dead_letter.jsonl"))
+        queues.append(WriteBehindQueue(db, **kwargs))
+        return queues[-1]
+
+    yield make
+    for queue in queues:
+        queue.close(timeout=5)
+
+
+def _dead_letters(queue):
+    with open(queue.dead_letter_path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f]
+
+
+def test_rating_refers_to_written_classification(make_queue):
+    db = FakeDatabase()
+    queue = make_queue(db)
+    pending = queue.submit_classification(1, "a.txt", "Наивный Байес", "Приказ", 0.9)
+    queue.submit_rating(pending, 1, 5, "верно")
+    assert queue.flush(timeout=5)
+
+    assert pending.result(timeout=1) == 1
+    assert db.ratings == [(1, 1, 5, "верно")]
+
+
+def test_retried_batch_does_not_duplicate_rows(make_queue):
+    db = FakeDatabase()
+    queue = make_queue(db)
+    first = PendingClassification(1, "a.txt", "Наивный Байес", "Приказ", 0.9)
+    second = PendingClassification(1, "b.txt", "Наивный Байес", "Письмо", 0.8)
+    batch = [first, PendingRating(first, 1, 4, ""), second, PendingRating(second, 1, 5, "")]
+    # Вторая группа классификаций падает, когда первая классификация и ее оценка уже записаны
+    db.classification_errors = [None, _gone_away()]
+
+    assert queue._with_retries(lambda: queue._write(batch)) is None
+    assert [row[1] for row in db.classifications] == ["a.txt", "b.txt"]
+    assert db.ratings == [(1, 1, 4, ""), (2, 1, 5, "")]
+
+
+def test_retries_are_bounded_and_failed_rows_are_dead_lettered(make_queue):
+    db = FakeDatabase()
+    db.classification_errors = [_gone_away()] * 3
+    queue = make_queue(db, max_retries=2)
+    pending = queue.submit_classification(1, "a.txt", "Наивный Байес", "Приказ", 0.9)
+    queue.submit_rating(pending, 1, 5)
+    assert queue.flush(timeout=5)
+
+    assert pending.result(timeout=1) is None
+    assert db.classifications == [] and db.ratings == []
+    assert queue.dead_letters == 2
+    assert [record["type"] for record in _dead_letters(queue)] == ["classification", "rating"]
+
+
+def test_data_error_does_not_block_other_rows(make_queue):
+    db = FakeDatabase()
+    db.bad_filenames = {"bad.txt"}
+    queue = make_queue(db, batch_size=10)
+    good = PendingClassification(1, "a.txt", "Наивный Байес", "Приказ", 0.9)
+    bad = PendingClassification(1, "bad.txt", "Наивный Байес", "Письмо", 0.8)
+    queue._queue.put(good)
+    queue._queue.put(bad)
+    assert queue.flush(timeout=5)
+
+    assert good.result(timeout=1) == 1
+    assert bad.result(timeout=1) is None
+    assert [row[1] for row in db.classifications] == ["a.txt"]
+    assert queue.dead_letters == 1
+    assert _dead_letters(queue)[0]["row"][1] == "bad.txt"